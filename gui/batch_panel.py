@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 批量处理面板
+
+提供选择输入、输出目录，在后台并行批量处理，并显示进度、处理速度、剩余时间和失败文件的界面。
+支持暂停、继续和取消，已完成的文件会立即保存。
+"""
+
+import os
+import threading
+
+from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QSpinBox, QProgressBar, QListWidget, QFileDialog, QMessageBox)
+from PyQt5.QtCore import pyqtSignal
+
+from modules.batch import BatchControl
+
+
+def _format_seconds(seconds):
+    """
+    将秒数格式化为"分:秒"
+
+    参数:
+        seconds (float): 秒数
+
+    返回:
+        str: 格式化后的时间
+    """
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class BatchPanel(QGroupBox):
+    """批量处理面板类"""
+
+    # 后台线程发出的进度（BatchProgress）
+    _progress = pyqtSignal(object)
+    # 后台线程结束（成功数量, 错误信息）
+    _finished = pyqtSignal(int, object)
+
+    def __init__(self, build_batch_job, parent=None):
+        """
+        初始化批量处理面板
+
+        参数:
+            build_batch_job (callable): 根据主窗口当前的功能和参数构建批处理任务的函数，
+                调用方式为 build_batch_job(input_dir, output_dir, max_workers, progress_callback, control)，
+                返回一个无参数的函数，运行后返回成功处理的数量
+            parent (QWidget): 父部件
+        """
+        super().__init__("批量处理", parent)
+
+        self.build_batch_job = build_batch_job
+        self.input_dir = None
+        self.output_dir = None
+        self.control = None
+        self.thread = None
+
+        self._init_ui()
+
+        # 跨线程信号，在主线程中更新界面
+        self._progress.connect(self._on_progress)
+        self._finished.connect(self._on_finished)
+
+    def _init_ui(self):
+        """初始化用户界面"""
+        layout = QVBoxLayout(self)
+
+        # 输入目录
+        self.input_btn = QPushButton("选择输入目录")
+        self.input_btn.clicked.connect(self._on_select_input)
+        self.input_label = QLabel("未选择输入目录")
+        self.input_label.setWordWrap(True)
+        layout.addWidget(self.input_btn)
+        layout.addWidget(self.input_label)
+
+        # 输出目录
+        self.output_btn = QPushButton("选择输出目录")
+        self.output_btn.clicked.connect(self._on_select_output)
+        self.output_label = QLabel("未选择输出目录")
+        self.output_label.setWordWrap(True)
+        layout.addWidget(self.output_btn)
+        layout.addWidget(self.output_label)
+
+        # 并行线程数
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("并行线程数:"))
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.workers_spinbox.setValue(max(1, min(4, os.cpu_count() or 1)))
+        workers_layout.addWidget(self.workers_spinbox)
+        layout.addLayout(workers_layout)
+
+        # 开始、暂停、取消按钮
+        buttons_layout = QHBoxLayout()
+        self.start_btn = QPushButton("开始")
+        self.start_btn.clicked.connect(self._on_start)
+        self.pause_btn = QPushButton("暂停")
+        self.pause_btn.clicked.connect(self._on_pause)
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.clicked.connect(self._on_cancel)
+        self.cancel_btn.setEnabled(False)
+        buttons_layout.addWidget(self.start_btn)
+        buttons_layout.addWidget(self.pause_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addLayout(buttons_layout)
+
+        # 进度条与统计信息
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        self.stats_label = QLabel("就绪")
+        self.stats_label.setWordWrap(True)
+        layout.addWidget(self.stats_label)
+
+        # 失败文件列表
+        self.failures_list = QListWidget()
+        self.failures_list.setMaximumHeight(80)
+        self.failures_list.hide()
+        layout.addWidget(self.failures_list)
+
+    def _on_select_input(self):
+        """选择输入目录"""
+        directory = QFileDialog.getExistingDirectory(self, "选择输入目录")
+        if directory:
+            self.input_dir = directory
+            self.input_label.setText(directory)
+
+    def _on_select_output(self):
+        """选择输出目录"""
+        directory = QFileDialog.getExistingDirectory(self, "选择输出目录")
+        if directory:
+            self.output_dir = directory
+            self.output_label.setText(directory)
+
+    def is_running(self):
+        """
+        是否有批处理任务正在运行
+
+        返回:
+            bool: 正在运行则返回True
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def _on_start(self):
+        """开始批量处理"""
+        if not self.input_dir or not self.output_dir:
+            QMessageBox.warning(self, "警告", "请先选择输入目录和输出目录！")
+            return
+
+        # 根据主窗口当前的功能和参数构建任务（在主线程中读取参数）
+        self.control = BatchControl()
+        job = self.build_batch_job(
+            self.input_dir, self.output_dir, self.workers_spinbox.value(),
+            self._progress.emit, self.control
+        )
+
+        # 重置界面
+        self.progress_bar.setValue(0)
+        self.failures_list.clear()
+        self.failures_list.hide()
+        self.stats_label.setText("正在处理...")
+        self._set_running(True)
+
+        # 在后台线程中运行
+        def run():
+            try:
+                self._finished.emit(job(), None)
+            except Exception as e:
+                self._finished.emit(0, str(e))
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def _on_pause(self):
+        """暂停或继续"""
+        if self.control is None:
+            return
+
+        if self.control.is_paused:
+            self.control.resume()
+            self.pause_btn.setText("暂停")
+        else:
+            self.control.pause()
+            self.pause_btn.setText("继续")
+            self.stats_label.setText(self.stats_label.text() + "\n已暂停（正在处理的文件会继续完成）")
+
+    def _on_cancel(self):
+        """取消批量处理"""
+        if self.control is not None:
+            self.control.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.pause_btn.setEnabled(False)
+            self.stats_label.setText("正在取消，等待处理中的文件完成...")
+
+    def cancel_and_wait(self, timeout=None):
+        """
+        取消批量处理并等待后台线程结束
+
+        参数:
+            timeout (float): 最长等待时间（秒）
+        """
+        if self.control is not None:
+            self.control.cancel()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _set_running(self, running):
+        """
+        根据运行状态启用或禁用按钮
+
+        参数:
+            running (bool): 是否正在运行
+        """
+        self.start_btn.setEnabled(not running)
+        self.input_btn.setEnabled(not running)
+        self.output_btn.setEnabled(not running)
+        self.workers_spinbox.setEnabled(not running)
+        self.pause_btn.setEnabled(running)
+        self.pause_btn.setText("暂停")
+        self.cancel_btn.setEnabled(running)
+
+    def _on_progress(self, progress):
+        """
+        更新进度显示
+
+        参数:
+            progress (BatchProgress): 当前进度
+        """
+        self.progress_bar.setMaximum(progress.total)
+        self.progress_bar.setValue(progress.finished)
+
+        self.stats_label.setText(
+            f"进度: {progress.finished}/{progress.total}  失败: {progress.failed}\n"
+            f"速度: {progress.rate:.2f} 张/秒  剩余时间: {_format_seconds(progress.eta)}\n"
+            f"最近完成: {progress.current_file}"
+        )
+
+        if progress.error is not None:
+            self.failures_list.show()
+            self.failures_list.addItem(f"{progress.current_file}: {progress.error}")
+
+    def _on_finished(self, count, error):
+        """
+        批量处理结束
+
+        参数:
+            count (int): 成功处理的数量
+            error (str): 错误信息，正常结束时为None
+        """
+        self._set_running(False)
+
+        if error is not None:
+            self.stats_label.setText("批量处理失败")
+            QMessageBox.critical(self, "错误", f"批量处理时出错: {error}")
+            return
+
+        status = "已取消" if self.control is not None and self.control.is_cancelled else "处理完成"
+        self.stats_label.setText(f"{status}，成功处理 {count} 张图片\n" + self.stats_label.text())
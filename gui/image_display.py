@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 图片显示模块
+
+负责将PIL图片转换为Qt可显示的格式，并构建缓存的预览金字塔。
+窗口缩放和重绘时只从金字塔中选取最接近的层级进行缩放，不再读取磁盘或复制全分辨率数据。
+"""
+
+from PIL import Image
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt
+
+from modules.image_io import normalize_orientation
+
+
+# PIL模式与QImage格式、每像素字节数的对应关系
+_QIMAGE_FORMATS = {
+    "RGB": (QImage.Format_RGB888, 3),
+    "RGBA": (QImage.Format_RGBA8888, 4),
+    "L": (QImage.Format_Grayscale8, 1),
+}
+
+
+def pil_to_qimage(image):
+    """
+    将PIL图片转换为QImage（显式指定每行字节数，避免行对齐错位）
+
+    参数:
+        image (PIL.Image): 输入图片
+
+    返回:
+        QImage: 转换后的图片（已持有自己的数据）
+    """
+    image = _to_display_mode(image)
+    qformat, channels = _QIMAGE_FORMATS[image.mode]
+
+    data = image.tobytes("raw", image.mode)
+    qimage = QImage(data, image.width, image.height, image.width * channels, qformat)
+
+    # QImage不持有外部缓冲区，复制一份以免data被回收后访问无效内存
+    return qimage.copy()
+
+
+def _to_display_mode(image):
+    """
+    将图片转换为可直接显示的模式（RGB、RGBA或L）
+
+    参数:
+        image (PIL.Image): 输入图片
+
+    返回:
+        PIL.Image: 转换后的图片
+    """
+    if image.mode in _QIMAGE_FORMATS:
+        return image
+
+    # 带透明信息的模式转换为RGBA，其余转换为RGB
+    if image.mode in ("LA", "PA", "RGBa", "La") or "transparency" in image.info:
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+
+class DisplayPyramid:
+    """预览金字塔类"""
+
+    def __init__(self, image, max_size=4096, min_size=256):
+        """
+        初始化预览金字塔
+
+        参数:
+            image (PIL.Image): 需要显示的图片
+            max_size (int): 顶层预览的最大边长，超过时先缩小
+            min_size (int): 底层预览的最小边长
+        """
+        # 非显示模式（如调色板模式）无法直接缩小，先转换
+        if image.mode not in _QIMAGE_FORMATS:
+            image = _to_display_mode(image)
+
+        self.source_size = image.size
+
+        # 顶层：不超过max_size，使用整数倍reduce快速缩小
+        factor = 1
+        while max(image.width, image.height) // factor > max_size:
+            factor *= 2
+        level = image.reduce(factor) if factor > 1 else image
+
+        # 逐层减半构建金字塔（只在小图上进行转换）
+        self.levels = [QPixmap.fromImage(pil_to_qimage(level))]
+        while max(level.width, level.height) // 2 >= min_size:
+            level = level.reduce(2)
+            self.levels.append(QPixmap.fromImage(pil_to_qimage(level)))
+
+        # 最近一次缩放结果缓存
+        self._cached_key = None
+        self._cached_pixmap = None
+
+    @classmethod
+    def from_path(cls, image_path, max_size=4096, min_size=256):
+        """
+        从文件构建预览金字塔（JPEG使用草稿模式按缩小比例解码）
+
+        参数:
+            image_path (str): 图片路径
+            max_size (int): 顶层预览的最大边长
+            min_size (int): 底层预览的最小边长
+
+        返回:
+            DisplayPyramid: 预览金字塔
+        """
+        with Image.open(image_path) as image:
+            # JPEG可以在解码阶段直接按1/2、1/4、1/8缩小
+            image.draft("RGB", (max_size, max_size))
+            image.load()
+            # 缩小解码后再按EXIF方向摆正
+            return cls(normalize_orientation(image), max_size, min_size)
+
+    def pixmap_for(self, width, height):
+        """
+        获取适应指定区域的预览图
+
+        参数:
+            width (int): 显示区域宽度
+            height (int): 显示区域高度
+
+        返回:
+            QPixmap: 保持宽高比缩放后的预览图
+        """
+        width = max(1, width)
+        height = max(1, height)
+
+        key = (width, height)
+        if key == self._cached_key:
+            return self._cached_pixmap
+
+        # 选择仍不小于显示区域的最小层级，缩放量不超过两倍
+        level = self.levels[0]
+        for candidate in self.levels:
+            if candidate.width() >= width or candidate.height() >= height:
+                level = candidate
+            else:
+                break
+
+        pixmap = level.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        self._cached_key = key
+        self._cached_pixmap = pixmap
+        return pixmap
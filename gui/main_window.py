@@ -14,13 +14,18 @@ from PyQt5.QtWidgets import (QMainWindow, QAction, QFileDialog, QLabel,
                              QPushButton, QVBoxLayout, QHBoxLayout, QWidget, 
                              QGroupBox, QSlider, QSpinBox, QComboBox, QMessageBox,
                              QSplitter, QScrollArea, QSizePolicy, QCheckBox, QLineEdit)
-from PyQt5.QtGui import QPixmap, QImage, QIcon
+from PyQt5.QtGui import QPixmap, QIcon
 from PyQt5.QtCore import Qt, QSize
 
 # 导入功能模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from modules.background_remover import BackgroundRemover
 from modules.image_processor import ImageProcessor
+from modules.image_io import save_image
+from modules.mask_utils import apply_mask, threshold_mask
+from gui.image_display import DisplayPyramid
+from gui.preview import PreviewWorker, make_preview_proxy
+from gui.batch_panel import BatchPanel
 
 
 class MainWindow(QMainWindow):
@@ -32,9 +37,20 @@ class MainWindow(QMainWindow):
         # 初始化成员变量
         self.current_image_path = None
         self.processed_image = None
+        self.display_pyramid = None  # 当前显示图片的预览金字塔
+        self.preview_proxy = None    # 用于实时预览的低分辨率代理图片
+        self.preview_scale = 1.0     # 代理图片相对原图的缩放比例
+        self.preview_masks = {}      # 代理图片的蒙版缓存（模型名称 -> 蒙版）
         self.background_remover = BackgroundRemover()
         self.image_processor = ImageProcessor()
         
+        # 后台预览与执行任务
+        self.preview_worker = PreviewWorker(parent=self)
+        self.preview_worker.preview_ready.connect(self._on_preview_ready)
+        self.preview_worker.result_ready.connect(self._on_result_ready)
+        self.preview_worker.failed.connect(self._on_job_failed)
+        self.preview_worker.cancelled.connect(self._on_job_cancelled)
+        
         # 设置窗口属性
         self.setWindowTitle("刘东升的图片处理工具")
         self.setMinimumSize(1000, 700)
@@ -144,6 +160,10 @@ class MainWindow(QMainWindow):
         # 添加操作按钮组到左侧布局
         left_layout.addWidget(operation_group)
         
+        # 添加批量处理面板（使用当前选择的功能和参数）
+        self.batch_panel = BatchPanel(self._build_batch_job)
+        left_layout.addWidget(self.batch_panel)
+        
         # 添加弹性空间
         left_layout.addStretch()
         
@@ -222,6 +242,7 @@ class MainWindow(QMainWindow):
         self.model_combo.addItem("u2net_human_seg")
         self.model_combo.addItem("silueta")
         self.model_combo.addItem("isnet-general-use")
+        self.model_combo.currentIndexChanged.connect(self._schedule_preview)
         self.params_layout.addWidget(model_label)
         self.params_layout.addWidget(self.model_combo)
         
@@ -232,6 +253,7 @@ class MainWindow(QMainWindow):
         self.alpha_slider.setValue(0)
         self.alpha_value = QLabel("0")
         self.alpha_slider.valueChanged.connect(lambda v: self.alpha_value.setText(str(v)))
+        self.alpha_slider.valueChanged.connect(self._schedule_preview)
         
         alpha_layout = QHBoxLayout()
         alpha_layout.addWidget(self.alpha_slider)
@@ -250,6 +272,7 @@ class MainWindow(QMainWindow):
         self.width_spinbox = QSpinBox()
         self.width_spinbox.setRange(1, 10000)
         self.width_spinbox.setValue(100)
+        self.width_spinbox.valueChanged.connect(self._schedule_preview)
         self.params_layout.addWidget(width_label)
         self.params_layout.addWidget(self.width_spinbox)
         
@@ -258,12 +281,14 @@ class MainWindow(QMainWindow):
         self.height_spinbox = QSpinBox()
         self.height_spinbox.setRange(1, 10000)
         self.height_spinbox.setValue(100)
+        self.height_spinbox.valueChanged.connect(self._schedule_preview)
         self.params_layout.addWidget(height_label)
         self.params_layout.addWidget(self.height_spinbox)
         
         # 添加保持宽高比选项
         self.keep_aspect_ratio = QCheckBox("保持宽高比")
         self.keep_aspect_ratio.setChecked(True)
+        self.keep_aspect_ratio.stateChanged.connect(self._schedule_preview)
         self.params_layout.addWidget(self.keep_aspect_ratio)
     
     def _init_resize_params(self):
@@ -277,6 +302,7 @@ class MainWindow(QMainWindow):
         self.resize_mode_combo.addItem("按尺寸缩放")
         self.resize_mode_combo.addItem("按文件大小缩放")
         self.resize_mode_combo.currentIndexChanged.connect(self._on_resize_mode_changed)
+        self.resize_mode_combo.currentIndexChanged.connect(self._schedule_preview)
         self.params_layout.addWidget(mode_label)
         self.params_layout.addWidget(self.resize_mode_combo)
         
@@ -289,6 +315,7 @@ class MainWindow(QMainWindow):
         self.resize_width_spinbox = QSpinBox()
         self.resize_width_spinbox.setRange(1, 10000)
         self.resize_width_spinbox.setValue(800)
+        self.resize_width_spinbox.valueChanged.connect(self._schedule_preview)
         size_layout.addWidget(width_label)
         size_layout.addWidget(self.resize_width_spinbox)
         
@@ -297,12 +324,14 @@ class MainWindow(QMainWindow):
         self.resize_height_spinbox = QSpinBox()
         self.resize_height_spinbox.setRange(1, 10000)
         self.resize_height_spinbox.setValue(600)
+        self.resize_height_spinbox.valueChanged.connect(self._schedule_preview)
         size_layout.addWidget(height_label)
         size_layout.addWidget(self.resize_height_spinbox)
         
         # 添加保持宽高比选项
         self.resize_keep_aspect_ratio = QCheckBox("保持宽高比")
         self.resize_keep_aspect_ratio.setChecked(True)
+        self.resize_keep_aspect_ratio.stateChanged.connect(self._schedule_preview)
         size_layout.addWidget(self.resize_keep_aspect_ratio)
         
         # 添加尺寸设置到参数布局
@@ -317,6 +346,7 @@ class MainWindow(QMainWindow):
         self.filesize_spinbox = QSpinBox()
         self.filesize_spinbox.setRange(1, 10000)
         self.filesize_spinbox.setValue(500)
+        self.filesize_spinbox.valueChanged.connect(self._schedule_preview)
         filesize_layout.addWidget(filesize_label)
         filesize_layout.addWidget(self.filesize_spinbox)
         
@@ -327,6 +357,7 @@ class MainWindow(QMainWindow):
         self.quality_slider.setValue(85)
         self.quality_value = QLabel("85")
         self.quality_slider.valueChanged.connect(lambda v: self.quality_value.setText(str(v)))
+        self.quality_slider.valueChanged.connect(self._schedule_preview)
         
         quality_layout = QHBoxLayout()
         quality_layout.addWidget(self.quality_slider)
@@ -370,6 +401,9 @@ class MainWindow(QMainWindow):
             self._init_crop_params()
         elif index == 2:  # 图像缩放
             self._init_resize_params()
+        
+        # 功能切换后刷新预览
+        self._schedule_preview()
     
     def _on_select_image(self):
         """选择图片按钮点击处理函数"""
@@ -382,6 +416,12 @@ class MainWindow(QMainWindow):
             # 更新当前图片路径
             self.current_image_path = file_path
             
+            # 作废旧图片的任务，构建新的预览代理图片
+            self.preview_worker.cancel()
+            self.preview_proxy, self.preview_scale = make_preview_proxy(file_path)
+            self.preview_masks = {}
+            self.processed_image = None
+            
             # 显示图片
             self._display_image(file_path)
             
@@ -402,112 +442,204 @@ class MainWindow(QMainWindow):
     def _display_image(self, image_path=None, image=None):
         """显示图片"""
         if image_path and not image:
-            # 从文件加载图片
-            pixmap = QPixmap(image_path)
+            # 从文件构建预览金字塔（只在选择图片时读取一次磁盘）
+            self.display_pyramid = DisplayPyramid.from_path(image_path)
         elif image:
-            # 从PIL的Image对象转换为QImage
             if hasattr(image, 'mode'):  # 检查是否为PIL Image对象
-                # 将PIL Image转换为QImage
-                data = image.tobytes("raw", "RGBA" if image.mode == "RGBA" else "RGB")
-                qimage = QImage(
-                    data,
-                    image.width,
-                    image.height,
-                    QImage.Format_RGBA8888 if image.mode == "RGBA" else QImage.Format_RGB888
-                )
-                pixmap = QPixmap.fromImage(qimage)
+                # 从PIL的Image对象构建预览金字塔
+                self.display_pyramid = DisplayPyramid(image)
             else:
                 # 假设已经是QImage对象
-                pixmap = QPixmap.fromImage(image)
+                self.image_label.setPixmap(QPixmap.fromImage(image).scaled(
+                    self.image_scroll_area.width() - 20,
+                    self.image_scroll_area.height() - 20,
+                    Qt.KeepAspectRatio,
+                    Qt.SmoothTransformation
+                ))
+                self.display_pyramid = None
+                return
         else:
             return
         
+        self._refresh_display()
+    
+    def _refresh_display(self):
+        """从预览金字塔中选取合适层级，刷新显示"""
+        if self.display_pyramid is None:
+            return
+        
         # 调整图片大小以适应显示区域
-        pixmap = pixmap.scaled(
+        pixmap = self.display_pyramid.pixmap_for(
             self.image_scroll_area.width() - 20,
-            self.image_scroll_area.height() - 20,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
+            self.image_scroll_area.height() - 20
         )
         
         # 显示图片
         self.image_label.setPixmap(pixmap)
     
+    def _schedule_preview(self, *args):
+        """参数变化时，安排在低分辨率代理图片上生成预览（防抖）"""
+        if self.preview_proxy is None:
+            return
+        
+        self.preview_worker.schedule(self._build_job(preview=True))
+    
+    def _build_job(self, preview=False):
+        """
+        根据当前功能和参数构建单张图片的处理任务
+        
+        参数在主线程中读取，任务在后台线程中运行。
+        
+        参数:
+            preview (bool): 是否为预览任务（在代理图片上运行）
+            
+        返回:
+            callable: 无参数的处理函数，返回PIL.Image
+        """
+        if preview:
+            # 预览任务作用于代理图片，尺寸参数按比例缩放，去背景复用缓存的蒙版
+            source = self.preview_proxy
+            operation = self._build_operation(self.preview_scale, self.preview_masks)
+        else:
+            source = self.current_image_path
+            operation = self._build_operation()
+        
+        return lambda: operation(source)
+    
+    def _build_operation(self, scale=1.0, mask_cache=None):
+        """
+        根据当前功能和参数构建处理函数
+        
+        参数:
+            scale (float): 尺寸参数的缩放比例（预览时为代理图片相对原图的比例）
+            mask_cache (dict): 去背景的蒙版缓存（模型名称 -> 蒙版），为None时执行完整的去背景
+            
+        返回:
+            callable: 处理函数，参数为图片路径或图片对象，返回PIL.Image
+        """
+        def scaled(value):
+            return max(1, round(value * scale))
+        
+        # 获取当前选择的功能
+        current_function = self.function_combo.currentIndex()
+        
+        if current_function == 0:  # 自动去背景
+            # 获取参数
+            model = self.model_combo.currentText()
+            alpha_threshold = self.alpha_slider.value()
+            remover = self.background_remover
+            
+            if mask_cache is None:
+                return lambda source: remover.remove_background(source, model, alpha_threshold)
+            
+            # 预览复用缓存的蒙版，只重新应用透明度阈值
+            def preview_operation(source):
+                mask = mask_cache.get(model)
+                if mask is None:
+                    mask = remover.predict_mask(source, model)
+                    mask_cache[model] = mask
+                return apply_mask(source, threshold_mask(mask, alpha_threshold))
+            
+            return preview_operation
+        
+        processor = self.image_processor
+        
+        if current_function == 1:  # 图像剪裁
+            # 获取参数
+            width = scaled(self.width_spinbox.value())
+            height = scaled(self.height_spinbox.value())
+            keep_aspect_ratio = self.keep_aspect_ratio.isChecked()
+            
+            return lambda source: processor.crop_image(source, width, height, keep_aspect_ratio)
+        
+        # 图像缩放
+        if self.resize_mode_combo.currentIndex() == 0:  # 按尺寸缩放
+            # 获取参数
+            width = scaled(self.resize_width_spinbox.value())
+            height = scaled(self.resize_height_spinbox.value())
+            keep_aspect_ratio = self.resize_keep_aspect_ratio.isChecked()
+            
+            return lambda source: processor.resize_image(source, width, height, keep_aspect_ratio)
+        
+        # 按文件大小缩放（预览时目标大小按面积比例缩放）
+        target_size = max(1, round(self.filesize_spinbox.value() * scale * scale))  # KB
+        quality = self.quality_slider.value()
+        
+        return lambda source: processor.resize_to_filesize(source, target_size, quality)
+    
+    def _build_batch_job(self, input_dir, output_dir, max_workers, progress_callback, control):
+        """
+        根据当前功能和参数构建批量处理任务
+        
+        参数:
+            input_dir (str): 输入图片目录
+            output_dir (str): 输出图片目录
+            max_workers (int): 并行线程数
+            progress_callback (callable): 进度回调函数
+            control (BatchControl): 暂停、继续和取消控制
+            
+        返回:
+            callable: 无参数的批处理函数，返回成功处理的图片数量
+        """
+        if self.function_combo.currentIndex() == 0:  # 自动去背景
+            model = self.model_combo.currentText()
+            alpha_threshold = self.alpha_slider.value()
+            return lambda: self.background_remover.remove_background_batch(
+                input_dir, output_dir, model, alpha_threshold,
+                max_workers=max_workers, progress_callback=progress_callback, control=control
+            )
+        
+        operation = self._build_operation()
+        return lambda: self.image_processor.batch_process(
+            input_dir, output_dir, operation,
+            max_workers=max_workers, progress_callback=progress_callback, control=control
+        )
+    
     def _on_execute(self):
         """执行按钮点击处理函数"""
         if not self.current_image_path:
             QMessageBox.warning(self, "警告", "请先选择图片！")
             return
         
-        # 获取当前选择的功能
-        current_function = self.function_combo.currentIndex()
-        
-        try:
-            # 根据不同功能执行相应处理
-            if current_function == 0:  # 自动去背景
-                # 获取参数
-                model = self.model_combo.currentText()
-                alpha_threshold = self.alpha_slider.value()
-                
-                # 执行去背景
-                self.statusBar().showMessage("正在处理图片，请稍候...")
-                self.processed_image = self.background_remover.remove_background(
-                    self.current_image_path, model, alpha_threshold
-                )
-                
-            elif current_function == 1:  # 图像剪裁
-                # 获取参数
-                width = self.width_spinbox.value()
-                height = self.height_spinbox.value()
-                keep_aspect_ratio = self.keep_aspect_ratio.isChecked()
-                
-                # 执行剪裁
-                self.statusBar().showMessage("正在处理图片，请稍候...")
-                self.processed_image = self.image_processor.crop_image(
-                    self.current_image_path, width, height, keep_aspect_ratio
-                )
-                
-            elif current_function == 2:  # 图像缩放
-                # 获取缩放模式
-                resize_mode = self.resize_mode_combo.currentIndex()
-                
-                if resize_mode == 0:  # 按尺寸缩放
-                    # 获取参数
-                    width = self.resize_width_spinbox.value()
-                    height = self.resize_height_spinbox.value()
-                    keep_aspect_ratio = self.resize_keep_aspect_ratio.isChecked()
-                    
-                    # 执行缩放
-                    self.statusBar().showMessage("正在处理图片，请稍候...")
-                    self.processed_image = self.image_processor.resize_image(
-                        self.current_image_path, width, height, keep_aspect_ratio
-                    )
-                    
-                else:  # 按文件大小缩放
-                    # 获取参数
-                    target_size = self.filesize_spinbox.value()  # KB
-                    quality = self.quality_slider.value()
-                    
-                    # 执行缩放
-                    self.statusBar().showMessage("正在处理图片，请稍候...")
-                    self.processed_image = self.image_processor.resize_to_filesize(
-                        self.current_image_path, target_size, quality
-                    )
+        # 在后台运行全分辨率任务
+        self.statusBar().showMessage("正在处理图片，请稍候...")
+        self.execute_btn.setEnabled(False)
+        self.preview_worker.run(self._build_job())
+    
+    def _on_preview_ready(self, image):
+        """预览完成时的处理函数"""
+        self._display_image(image=image)
+        self.statusBar().showMessage("预览（低分辨率），点击执行生成完整结果")
+    
+    def _on_result_ready(self, image):
+        """全分辨率任务完成时的处理函数"""
+        self.processed_image = image
+        self.execute_btn.setEnabled(True)
+        
+        # 显示处理结果
+        if self.processed_image:
+            self._display_image(image=self.processed_image)
             
-            # 显示处理结果
-            if self.processed_image:
-                self._display_image(image=self.processed_image)
-                
-                # 启用保存按钮
-                self.save_btn.setEnabled(True)
-                self.save_action.setEnabled(True)
-                
-                # 更新状态栏
-                self.statusBar().showMessage("处理完成")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"处理图片时出错: {str(e)}")
+            # 启用保存按钮
+            self.save_btn.setEnabled(True)
+            self.save_action.setEnabled(True)
+            
+            # 更新状态栏
+            self.statusBar().showMessage("处理完成")
+    
+    def _on_job_failed(self, message, is_commit):
+        """任务失败时的处理函数"""
+        if is_commit:
+            self.execute_btn.setEnabled(True)
+            QMessageBox.critical(self, "错误", f"处理图片时出错: {message}")
             self.statusBar().showMessage("处理失败")
+        else:
+            self.statusBar().showMessage(f"预览失败: {message}")
+    
+    def _on_job_cancelled(self):
+        """正式执行被取消（如切换了图片）时的处理函数"""
+        self.execute_btn.setEnabled(bool(self.current_image_path))
+        self.statusBar().showMessage("已取消处理")
     
     def _on_save_result(self):
         """保存结果按钮点击处理函数"""
@@ -522,8 +654,8 @@ class MainWindow(QMainWindow):
         
         if file_path:
             try:
-                # 保存图片
-                self.processed_image.save(file_path)
+                # 保存图片（保留ICC色彩配置和选定的EXIF标签）
+                save_image(self.processed_image, file_path)
                 
                 # 更新状态栏
                 self.statusBar().showMessage(f"结果已保存至: {os.path.basename(file_path)}")
@@ -547,13 +679,16 @@ class MainWindow(QMainWindow):
         
         QMessageBox.about(self, "关于", about_text)
     
+    def closeEvent(self, event):
+        """窗口关闭事件处理函数"""
+        self.preview_worker.shutdown()
+        self.batch_panel.cancel_and_wait(timeout=5)
+        super().closeEvent(event)
+    
     def resizeEvent(self, event):
         """窗口大小改变事件处理函数"""
         super().resizeEvent(event)
         
-        # 如果有图片，则重新调整图片大小以适应新的显示区域
+        # 如果有图片，则从缓存的预览金字塔重新调整图片大小以适应新的显示区域
         if self.image_label.pixmap():
-            if self.processed_image:
-                self._display_image(image=self.processed_image)
-            elif self.current_image_path:
-                self._display_image(image_path=self.current_image_path)
\ No newline at end of file
+            self._refresh_display()
\ No newline at end of file
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 实时预览模块
+
+在后台线程中运行图片处理任务。参数调整时的预览任务经过防抖后提交，
+参数再次变化时旧任务自动作废；正式执行的全分辨率任务也在同一线程中运行，
+与预览任务串行，避免界面卡顿。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from modules.image_io import normalize_orientation
+
+
+def make_preview_proxy(image_path, max_size=1024):
+    """
+    构建用于预览的低分辨率代理图片
+
+    参数:
+        image_path (str): 图片路径
+        max_size (int): 代理图片的最大边长
+
+    返回:
+        tuple: (代理图片, 代理图片相对原图的缩放比例)
+    """
+    image = Image.open(image_path)
+    original_width = image.width
+
+    # JPEG在解码阶段直接缩小；thumbnail原地缩小，保留图片格式信息
+    image.draft("RGB", (max_size, max_size))
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    scale = image.width / original_width
+
+    # 缩小后再按EXIF方向摆正，与正式处理的结果方向一致
+    return normalize_orientation(image), scale
+
+
+class PreviewWorker(QObject):
+    """后台预览任务类"""
+
+    # 预览结果（PIL.Image）
+    preview_ready = pyqtSignal(object)
+    # 正式执行结果（PIL.Image）
+    result_ready = pyqtSignal(object)
+    # 任务失败（错误信息, 是否为正式执行）
+    failed = pyqtSignal(str, bool)
+    # 未完成的正式执行被取消（其结果将被丢弃）
+    cancelled = pyqtSignal()
+
+    # 工作线程完成任务后发出（任务编号, 结果, 错误信息, 是否为正式执行）
+    _finished = pyqtSignal(int, object, object, bool)
+
+    def __init__(self, delay_ms=250, parent=None):
+        """
+        初始化预览任务管理器
+
+        参数:
+            delay_ms (int): 防抖延迟（毫秒），参数停止变化超过该时间后才提交预览
+            parent (QObject): 父对象
+        """
+        super().__init__(parent)
+
+        # 单个工作线程，预览和正式执行串行运行
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        # 任务编号，每次参数变化或取消时递增，旧编号的任务即为过期任务
+        # 预览任务和正式执行任务分别编号，参数变化不会作废正在进行的正式执行
+        self._generation = 0
+        self._commit_generation = 0
+        self._commit_active = False
+        self._pending_job = None
+
+        # 防抖定时器
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._submit_pending)
+
+        # 跨线程信号，结果在主线程中处理
+        self._finished.connect(self._on_finished)
+
+    def schedule(self, job):
+        """
+        安排一个预览任务（防抖）
+
+        参数:
+            job (callable): 无参数的处理函数，返回PIL.Image
+        """
+        self._generation += 1
+        self._pending_job = job
+        self._timer.start()
+
+    def run(self, job):
+        """
+        立即运行正式执行任务，并作废所有未完成的预览任务
+
+        参数:
+            job (callable): 无参数的处理函数，返回PIL.Image
+        """
+        self._invalidate()
+        self._commit_active = True
+        self._executor.submit(self._run_job, self._commit_generation, job, True)
+
+    def cancel(self):
+        """作废所有未完成的任务，有未完成的正式执行时发出cancelled信号"""
+        self._invalidate()
+        if self._commit_active:
+            self._commit_active = False
+            self.cancelled.emit()
+
+    def shutdown(self):
+        """停止后台线程（不等待正在运行的任务）"""
+        self._invalidate()
+        self._commit_active = False
+        self._executor.shutdown(wait=False)
+
+    def _invalidate(self):
+        """递增任务编号，作废所有未完成的任务"""
+        self._generation += 1
+        self._commit_generation += 1
+        self._pending_job = None
+        self._timer.stop()
+
+    def _submit_pending(self):
+        """防抖时间到，提交等待中的预览任务"""
+        if self._pending_job is None:
+            return
+        job = self._pending_job
+        self._pending_job = None
+        self._executor.submit(self._run_job, self._generation, job, False)
+
+    def _current_generation(self, is_commit):
+        """
+        获取当前有效的任务编号
+
+        参数:
+            is_commit (bool): 是否为正式执行
+
+        返回:
+            int: 任务编号
+        """
+        return self._commit_generation if is_commit else self._generation
+
+    def _run_job(self, generation, job, is_commit):
+        """
+        在工作线程中运行任务
+
+        参数:
+            generation (int): 提交时的任务编号
+            job (callable): 处理函数
+            is_commit (bool): 是否为正式执行
+        """
+        # 开始前参数已经变化，直接跳过过期任务
+        if generation != self._current_generation(is_commit):
+            return
+
+        try:
+            result = job()
+            self._finished.emit(generation, result, None, is_commit)
+        except Exception as e:
+            self._finished.emit(generation, None, str(e), is_commit)
+
+    def _on_finished(self, generation, result, error, is_commit):
+        """
+        在主线程中处理任务结果，丢弃过期任务的结果
+
+        参数:
+            generation (int): 任务编号
+            result (PIL.Image): 处理结果
+            error (str): 错误信息，成功时为None
+            is_commit (bool): 是否为正式执行
+        """
+        if generation != self._current_generation(is_commit):
+            return
+        if is_commit:
+            self._commit_active = False
+
+        if error is not None:
+            self.failed.emit(error, is_commit)
+        elif is_commit:
+            self.result_ready.emit(result)
+        else:
+            self.preview_ready.emit(result)
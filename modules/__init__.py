@@ -4,6 +4,21 @@
 # 导入所有功能模块，方便外部直接使用
 from .background_remover import BackgroundRemover
 from .image_processor import ImageProcessor
+from .pipeline import Pipeline
+from .service import ProcessingService
+from .animation import AnimatedImage, is_animated, map_frames
+from .batch import BatchControl, BatchProgress, list_image_files, natural_sort_key, run_batch
+from .dedup import Deduplicator, HashIndex
+from .encoder import PROFILES, encode_stats
+from .fast_path import get_passthrough, write_result
+from .geometry import GeometryPlan, plan_crop, plan_resize, apply_plan
+from .image_io import check_source, load_image, encode_image, save_image, normalize_orientation
+from .io_overlap import Prefetcher, WriteBehind
+from .mask_utils import downscale_for_inference, guided_upsample_mask
+from .model_registry import ModelRegistry, quantize_model
+from .report import JobReport
+from .scheduler import CostScheduler
+from .shm_transport import FrameRing, FrameHandle
 from .utils import (
     get_supported_formats,
     is_valid_image,
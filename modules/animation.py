@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 动画图片模块
+
+支持多帧的GIF、WebP等动画图片：逐帧延迟解码，多线程并行处理各帧，
+内容完全相同的帧只处理一次（如去背景时复用同一个蒙版），
+处理结果重新编码为动画GIF（调色板优化）或动画WebP，保留每帧时长和循环次数。
+"""
+
+import io
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import ImageSequence
+
+
+# 支持保存为动画的格式及对应的文件扩展名
+ANIMATION_FORMATS = {
+    "GIF": ".gif",
+    "WEBP": ".webp",
+    "PNG": ".png",
+}
+
+# 没有时长信息的帧默认显示时间（毫秒）
+_DEFAULT_DURATION = 100
+
+
+def is_animated(image):
+    """
+    判断图片是否为多帧动画
+
+    参数:
+        image (PIL.Image): 图片对象
+
+    返回:
+        bool: 是多帧动画时返回True
+    """
+    return getattr(image, "is_animated", False) and getattr(image, "n_frames", 1) > 1
+
+
+def iter_frames(image):
+    """
+    逐帧读取动画（每次只解码一帧）
+
+    参数:
+        image (PIL.Image): 动画图片
+
+    返回:
+        generator: 依次产生 (RGBA帧, 显示时长（毫秒）)
+    """
+    for frame in ImageSequence.Iterator(image):
+        # 转换为RGBA得到合成后的完整画面，帧对象之间互不影响
+        yield frame.convert("RGBA"), frame.info.get("duration", _DEFAULT_DURATION)
+
+
+class AnimatedImage:
+    """动画图片类（处理后的帧序列）"""
+
+    def __init__(self, frames, durations, loop=0, format="GIF"):
+        """
+        初始化动画图片
+
+        参数:
+            frames (list): 帧列表（PIL.Image）
+            durations (list): 每帧的显示时长（毫秒）
+            loop (int): 循环次数，0表示无限循环，为None时只播放一次（源GIF没有循环设置）
+            format (str): 源图片格式，作为默认的保存格式
+        """
+        if not frames:
+            raise ValueError("动画至少需要一帧")
+        if len(frames) != len(durations):
+            raise ValueError(f"帧数与时长数量不一致: {len(frames)} != {len(durations)}")
+
+        self.frames = frames
+        self.durations = durations
+        self.loop = loop
+        self.format = format if format in ANIMATION_FORMATS else "GIF"
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __repr__(self):
+        return f"AnimatedImage(frames={len(self.frames)}, size={self.size}, format={self.format})"
+
+    @property
+    def size(self):
+        """画面尺寸 (宽, 高)"""
+        return self.frames[0].size
+
+    @property
+    def extension(self):
+        """默认保存格式对应的文件扩展名"""
+        return ANIMATION_FORMATS[self.format]
+
+    def save(self, fp, format=None, **params):
+        """
+        保存动画
+
+        参数:
+            fp (str | file): 输出路径或文件对象
+            format (str): 输出格式（GIF、WEBP、PNG），为None时使用源图片格式
+            **params: 传递给编码器的其他参数
+        """
+        format = (format or self.format).upper()
+        if format not in ANIMATION_FORMATS:
+            raise ValueError(f"不支持保存为动画的格式: {format}，可用格式: {', '.join(ANIMATION_FORMATS)}")
+
+        options = {"save_all": True, "append_images": self.frames[1:], "duration": list(self.durations)}
+        if self.loop is not None:
+            options["loop"] = self.loop
+        elif format != "GIF":
+            # GIF不写循环设置即只播放一次，WebP和APNG需要明确指定播放一次
+            options["loop"] = 1
+        if format == "GIF":
+            # 每帧画面完整，显示下一帧前清除；优化调色板，去掉未使用的颜色
+            options.update(disposal=2, optimize=True)
+        elif format == "WEBP":
+            # 保留透明通道，不做有损压缩时使用无损模式
+            options.update(lossless=params.pop("lossless", "quality" not in params))
+        options.update(params)
+
+        self.frames[0].save(fp, format=format, **options)
+
+    def encode(self, format=None, **params):
+        """
+        将动画编码为字节数据
+
+        参数:
+            format (str): 输出格式，为None时使用源图片格式
+            **params: 传递给编码器的其他参数
+
+        返回:
+            bytes: 编码后的动画数据
+        """
+        buffer = io.BytesIO()
+        self.save(buffer, format, **params)
+        return buffer.getvalue()
+
+
+def _frame_key(frame):
+    """
+    计算帧内容的摘要，用于识别完全相同的帧
+
+    参数:
+        frame (PIL.Image): 帧
+
+    返回:
+        tuple: (尺寸, 摘要)
+    """
+    return frame.size, hashlib.blake2b(frame.tobytes(), digest_size=16).digest()
+
+
+def map_frames(image, func, max_workers=4, reuse_identical=True):
+    """
+    对动画的每一帧执行处理函数（多线程并行，同时在处理中的帧数有上限）
+
+    参数:
+        image (PIL.Image): 动画图片
+        func (callable): 处理单帧的函数，参数和返回值都是PIL.Image
+        max_workers (int): 并行线程数
+        reuse_identical (bool): 内容完全相同的帧是否复用第一次的处理结果
+
+    返回:
+        AnimatedImage: 处理后的动画
+    """
+    if max_workers < 1:
+        raise ValueError(f"线程数必须大于0，当前值: {max_workers}")
+
+    # GIF没有循环设置时只播放一次，保留这一点而不是改成无限循环
+    loop = image.info.get("loop")
+    format = image.format
+
+    futures = []
+    durations = []
+    results_by_key = {}
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for frame, duration in iter_frames(image):
+            durations.append(duration)
+            key = _frame_key(frame) if reuse_identical else None
+            if key is not None and key in results_by_key:
+                futures.append(results_by_key[key])
+                continue
+
+            # 限制同时在处理中的帧数，避免一次解码全部帧
+            if len(in_flight) >= max_workers * 2:
+                in_flight.popleft().result()
+
+            future = executor.submit(func, frame)
+            futures.append(future)
+            in_flight.append(future)
+            if key is not None:
+                results_by_key[key] = future
+
+        frames = [future.result() for future in futures]
+
+    return AnimatedImage(frames, durations, loop, format)
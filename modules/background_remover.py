@@ -9,149 +9,853 @@
 """
 
 import os
+import copy
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-from rembg import remove, new_session
+from rembg import remove
+
+from .animation import AnimatedImage, is_animated, map_frames
+from .batch import BatchProgress, list_image_files, run_batch
+from .image_io import check_source, load_image, encode_image, save_image, copy_metadata
+from .mask_utils import (
+    downscale_for_inference, guided_upsample_mask, apply_mask, frame_signature, estimate_shift,
+    frame_difference, shift_mask, blend_masks,
+)
+from .model_registry import AUTO_MODEL, ModelRegistry, load_validation_set
+from .report import JobReport
+
+
+# 近似重复图片复用代表图片蒙版时允许的宽高比相对差异，超出时单独处理
+_MASK_ASPECT_TOLERANCE = 0.01
+
+
+def _same_aspect(size, other):
+    """
+    判断两个尺寸的宽高比是否在允许的差异之内
+
+    参数:
+        size (tuple): 宽度和高度
+        other (tuple): 宽度和高度
+
+    返回:
+        bool: 宽高比相同时为True
+    """
+    ratio = size[0] * other[1] / (size[1] * other[0])
+    return abs(ratio - 1) <= _MASK_ASPECT_TOLERANCE
 
 
 class BackgroundRemover:
     """自动去背景类"""
     
-    def __init__(self):
-        """初始化背景移除器"""
-        # 可用的模型列表
-        self.available_models = [
-            "u2net",            # 通用模型
-            "u2netp",           # 轻量级模型
-            "u2net_human_seg",  # 人像分割模型
-            "silueta",          # 轮廓模型
-            "isnet-general-use" # 高精度通用模型
-        ]
-        
-        # 当前会话和模型
+    def __init__(self, max_concurrency=2, model_dir=None, validation_dir=None, quality_floor=0.9):
+        """
+        初始化背景移除器
+        
+        同一个实例可以由多个线程同时使用：每个模型只创建一个会话，
+        ONNX Runtime的会话支持多线程同时推理，每个会话同时推理的数量受max_concurrency限制。
+        
+        参数:
+            max_concurrency (int): 每个模型会话同时进行的推理数量上限
+            model_dir (str): 本地ONNX模型目录（INT8量化、缩小输入尺寸的模型变体），为None时只用rembg自带的模型
+            validation_dir (str): 验证集目录（images和masks子目录），model='auto'时用于选择模型
+            quality_floor (float): model='auto'时要求的验证集平均蒙版IoU下限（0-1）
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"推理并发数必须大于0，当前值: {max_concurrency}")
+        
+        # 模型注册表（rembg自带的模型和本地模型变体）
+        self.registry = ModelRegistry(model_dir)
+        
+        # 自动选择模型的验证集、质量下限、选择结果和各模型的测试结果
+        self.validation_dir = validation_dir
+        self.quality_floor = quality_floor
+        self.last_benchmark = None
+        self._auto_model = None
+        self._auto_lock = threading.Lock()
+        
+        # 最近使用的会话和模型（保留以兼容旧代码，处理时按参数中的模型取会话，不依赖这两个属性）
         self.current_model = None
         self.session = None
+        
+        # 各模型的会话、会话创建锁和推理并发限制
+        self.max_concurrency = max_concurrency
+        self._sessions = {}
+        self._session_locks = {}
+        self._session_slots = {}
+        self._lock = threading.Lock()
+        
+        # 各模型是否支持多张图片合并推理（首次失败后记为False）
+        self._batch_inference = {}
+        
+        # 处理动画时并行处理的帧数
+        self.frame_workers = 4
+        
+        # 最近一次序列处理的统计（总帧数、推理帧数、复用蒙版的帧数）
+        self.last_sequence_stats = None
+        
+        # 最近一次批量处理或序列处理的报告（JobReport）
+        self.last_report = None
+    
+    @property
+    def available_models(self):
+        """可用的模型名称列表（另外可以使用'auto'自动选择）"""
+        return self.registry.names()
     
-    def remove_background(self, image_path, model="u2net", alpha_threshold=0):
+    def _resolve_model(self, model):
+        """
+        检查模型名称，'auto'时返回自动选择的模型
+        
+        参数:
+            model (str): 模型名称
+            
+        返回:
+            str: 实际使用的模型名称
+        """
+        if model == AUTO_MODEL:
+            with self._auto_lock:
+                if self._auto_model is None:
+                    self.select_model()
+                return self._auto_model
+        
+        if model not in self.registry:
+            raise ValueError(f"不支持的模型: {model}，可用模型: {', '.join(self.available_models)}")
+        return model
+    
+    def select_model(self, validation_dir=None, quality_floor=None, models=None):
+        """
+        在验证集上测试各模型，选出达到质量下限的最快模型，作为model='auto'使用的模型
+        
+        参数:
+            validation_dir (str): 验证集目录，为None时使用初始化时的目录
+            quality_floor (float): 平均蒙版IoU下限，为None时使用初始化时的下限
+            models (list): 候选模型，为None时测试所有模型
+            
+        返回:
+            str: 选出的模型名称（各模型的测试结果见self.last_benchmark）
+        """
+        validation_dir = validation_dir or self.validation_dir
+        if validation_dir is None:
+            raise ValueError("自动选择模型需要验证集目录（validation_dir）")
+        
+        pairs = load_validation_set(validation_dir)
+        model, results = self.registry.select(
+            lambda image, name: self.predict_mask(image, name), pairs,
+            self.quality_floor if quality_floor is None else quality_floor, models
+        )
+        self._auto_model = model
+        self.last_benchmark = results
+        return model
+    
+    def remove_background(self, image_path, model="u2net", alpha_threshold=0, working_size=None,
+                          output_format=None, all_frames=False):
         """
         移除图片背景
         
         参数:
-            image_path (str): 输入图片路径
-            model (str): 使用的模型名称
+            image_path (str | bytes | file | PIL.Image | numpy.ndarray): 输入图片路径，
+                也可以是字节数据、memoryview、mmap、文件对象或已解码的图片
+            model (str): 使用的模型名称，'auto'时使用在验证集上自动选择的模型
             alpha_threshold (int): 透明度阈值，0-255之间
+            working_size (int): 工作分辨率（长边像素数）。设置后先将图片缩小到该分辨率推理，
+                再将蒙版边缘感知地上采样并合成到原图上，适合超大图片；为None时使用原图分辨率
+            output_format (str): 输出格式，如'PNG'。设置后返回编码后的字节数据
+            all_frames (bool): 是否处理动画的所有帧（内容相同的帧复用同一结果）。为False时只处理第一帧
             
         返回:
-            PIL.Image: 处理后的图片对象
+            PIL.Image | AnimatedImage | bytes: 处理后的图片对象（处理所有帧的动画为AnimatedImage）；
+                设置output_format时为编码后的字节数据
         """
-        # 检查模型是否有效
-        if model not in self.available_models:
-            raise ValueError(f"不支持的模型: {model}，可用模型: {', '.join(self.available_models)}")
+        # 检查模型是否有效（'auto'时使用自动选择的模型）
+        model = self._resolve_model(model)
         
         # 检查透明度阈值是否有效
         if not 0 <= alpha_threshold <= 255:
             raise ValueError(f"透明度阈值必须在0-255之间，当前值: {alpha_threshold}")
         
         # 检查图片是否存在
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"图片文件不存在: {image_path}")
+        check_source(image_path)
         
-        # 如果模型发生变化，创建新会话
-        if self.current_model != model or self.session is None:
-            self.session = new_session(model)
-            self.current_model = model
+        # 检查工作分辨率是否有效
+        if working_size is not None and working_size <= 0:
+            raise ValueError(f"工作分辨率必须大于0，当前值: {working_size}")
+        
+        # 确保模型的会话已创建（首次使用时加载模型）
+        self._ensure_session(model)
         
         try:
             # 加载图片
-            input_image = Image.open(image_path)
+            input_image = load_image(image_path)
             
-            # 移除背景
-            output_image = remove(
-                input_image,
-                session=self.session,
-                alpha_matting=alpha_threshold > 0,
-                alpha_matting_foreground_threshold=alpha_threshold,
-                alpha_matting_background_threshold=alpha_threshold,
-                alpha_matting_erode_size=10
-            )
+            # 移除背景（动画逐帧并行处理）
+            if all_frames and is_animated(input_image):
+                output_image = self._remove_frames(input_image, model, alpha_threshold, working_size)
+            else:
+                output_image = self._remove(input_image, model, alpha_threshold, working_size)
+            
+            # 需要时直接返回编码后的字节数据
+            if isinstance(output_image, AnimatedImage):
+                return output_image.encode(output_format) if output_format is not None else output_image
+            if output_format is not None:
+                return encode_image(output_image, output_format)
             
             return output_image
             
         except Exception as e:
             raise RuntimeError(f"处理图片时出错: {str(e)}")
     
-    def remove_background_batch(self, input_dir, output_dir, model="u2net", alpha_threshold=0):
+    def _remove_frames(self, input_image, model, alpha_threshold, working_size=None):
         """
-        批量移除图片背景
+        移除动画所有帧的背景
         
         参数:
-            input_dir (str): 输入图片目录
-            output_dir (str): 输出图片目录
+            input_image (PIL.Image): 动画图片
             model (str): 使用的模型名称
             alpha_threshold (int): 透明度阈值，0-255之间
+            working_size (int): 工作分辨率（长边像素数）
             
         返回:
-            int: 成功处理的图片数量
+            AnimatedImage: 处理后的动画
         """
-        # 检查输入目录是否存在
-        if not os.path.exists(input_dir) or not os.path.isdir(input_dir):
-            raise FileNotFoundError(f"输入目录不存在: {input_dir}")
+        return map_frames(
+            input_image, lambda frame: self._remove(frame, model, alpha_threshold, working_size),
+            self.frame_workers
+        )
+    
+    def _get_session(self, model):
+        """
+        获取模型的会话，首次使用时创建（多个线程同时请求时也只创建一次）
         
-        # 确保输出目录存在
-        os.makedirs(output_dir, exist_ok=True)
+        参数:
+            model (str): 使用的模型名称
+            
+        返回:
+            rembg会话
+        """
+        session = self._sessions.get(model)
+        if session is not None:
+            return session
         
-        # 支持的图片格式
-        supported_formats = [".jpg", ".jpeg", ".png", ".bmp", ".gif"]
+        with self._lock:
+            creation_lock = self._session_locks.setdefault(model, threading.Lock())
         
-        # 获取所有图片文件
-        image_files = [
-            f for f in os.listdir(input_dir) 
-            if os.path.isfile(os.path.join(input_dir, f)) and 
-            any(f.lower().endswith(ext) for ext in supported_formats)
-        ]
-        
-        # 如果没有图片文件
-        if not image_files:
-            raise ValueError(f"输入目录中没有支持的图片文件: {input_dir}")
-        
-        # 处理计数
-        processed_count = 0
-        
-        # 如果模型发生变化，创建新会话
-        if self.current_model != model or self.session is None:
-            self.session = new_session(model)
+        # 只锁住该模型的创建，加载其他模型的线程不受影响
+        with creation_lock:
+            session = self._sessions.get(model)
+            if session is None:
+                session = self.registry.create_session(model)
+                self._session_slots[model] = threading.BoundedSemaphore(self.max_concurrency)
+                self._sessions[model] = session
+        return session
+    
+    def _ensure_session(self, model):
+        """
+        确保模型的会话已创建，并记为最近使用的会话
+        
+        参数:
+            model (str): 使用的模型名称
+            
+        返回:
+            rembg会话
+        """
+        session = self._get_session(model)
+        with self._lock:
+            self.session = session
             self.current_model = model
+        return session
+    
+    @contextmanager
+    def _inference(self, model):
+        """
+        占用模型会话的一个推理名额，超过并发上限时等待
         
-        # 批量处理图片
-        for image_file in image_files:
-            try:
-                # 构建完整路径
-                input_path = os.path.join(input_dir, image_file)
-                
-                # 构建输出路径（保持原文件名，但扩展名改为png以支持透明度）
-                output_filename = os.path.splitext(image_file)[0] + ".png"
-                output_path = os.path.join(output_dir, output_filename)
-                
-                # 加载图片
-                input_image = Image.open(input_path)
-                
-                # 移除背景
+        参数:
+            model (str): 使用的模型名称
+            
+        返回:
+            rembg会话（在with语句中使用）
+        """
+        session = self._get_session(model)
+        with self._session_slots[model]:
+            yield session
+    
+    def _remove(self, input_image, model, alpha_threshold, working_size=None):
+        """
+        使用指定模型的会话移除背景
+        
+        参数:
+            input_image (PIL.Image): 输入图片
+            model (str): 使用的模型名称
+            alpha_threshold (int): 透明度阈值，0-255之间
+            working_size (int): 工作分辨率（长边像素数），为None时使用原图分辨率推理
+            
+        返回:
+            PIL.Image: 处理后的图片对象
+        """
+        # 原图不超过工作分辨率时，直接全分辨率处理
+        if working_size is None or max(input_image.size) <= working_size:
+            with self._inference(model) as session:
                 output_image = remove(
                     input_image,
-                    session=self.session,
+                    session=session,
                     alpha_matting=alpha_threshold > 0,
                     alpha_matting_foreground_threshold=alpha_threshold,
                     alpha_matting_background_threshold=alpha_threshold,
                     alpha_matting_erode_size=10
                 )
+            # rembg生成的新图片不带元数据，从原图复制ICC色彩配置和EXIF
+            return copy_metadata(input_image, output_image)
+        
+        # 低分辨率推理：只在缩小后的图片上计算蒙版
+        small_image = downscale_for_inference(input_image, working_size)
+        with self._inference(model) as session:
+            if alpha_threshold > 0:
+                # 透明度抠图只输出合成结果，从中取出透明通道作为蒙版
+                small_mask = remove(
+                    small_image,
+                    session=session,
+                    alpha_matting=True,
+                    alpha_matting_foreground_threshold=alpha_threshold,
+                    alpha_matting_background_threshold=alpha_threshold,
+                    alpha_matting_erode_size=max(1, round(10 * working_size / max(input_image.size)))
+                ).getchannel("A")
+            else:
+                small_mask = remove(small_image, session=session, only_mask=True)
+        
+        # 以原图为引导，对蒙版做边缘感知上采样
+        mask = guided_upsample_mask(small_mask, input_image)
+        
+        # 将蒙版合成到原图上
+        return apply_mask(input_image, mask)
+    
+    def predict_mask(self, image_path, model="u2net", working_size=None):
+        """
+        预测图片的前景蒙版（不做透明度抠图和合成）
+        
+        蒙版可以缓存下来，配合不同的透明度阈值快速生成预览。
+        
+        参数:
+            image_path (str | bytes | file | PIL.Image | numpy.ndarray): 输入图片路径，
+                也可以是字节数据、memoryview、mmap、文件对象或已解码的图片
+            model (str): 使用的模型名称，'auto'时使用在验证集上自动选择的模型
+            working_size (int): 工作分辨率（长边像素数），为None时使用原图分辨率推理
+            
+        返回:
+            PIL.Image: 与原图同尺寸的蒙版（L模式）
+        """
+        # 检查模型是否有效（'auto'时使用自动选择的模型）
+        model = self._resolve_model(model)
+        
+        # 检查图片是否存在
+        check_source(image_path)
+        
+        # 确保模型的会话已创建（首次使用时加载模型）
+        self._ensure_session(model)
+        
+        try:
+            # 加载图片
+            input_image = load_image(image_path)
+            
+            # 原图不超过工作分辨率时，直接全分辨率推理
+            if working_size is None or max(input_image.size) <= working_size:
+                with self._inference(model) as session:
+                    return remove(input_image, session=session, only_mask=True)
+            
+            # 低分辨率推理后上采样蒙版
+            small_image = downscale_for_inference(input_image, working_size)
+            with self._inference(model) as session:
+                small_mask = remove(small_image, session=session, only_mask=True)
+            return guided_upsample_mask(small_mask, input_image)
+            
+        except Exception as e:
+            raise RuntimeError(f"处理图片时出错: {str(e)}")
+    
+    def remove_background_many(self, image_paths, model="u2net", alpha_threshold=0, working_size=None,
+                               output_format=None):
+        """
+        一次移除多张图片的背景（模型支持时合并为一次推理）
+        
+        参数:
+            image_paths (list): 输入图片列表，每项可以是路径、字节数据、文件对象或已解码的图片
+            model (str): 使用的模型名称，'auto'时使用在验证集上自动选择的模型
+            alpha_threshold (int): 透明度阈值，0-255之间。大于0时需要逐张做透明度抠图
+            working_size (int): 工作分辨率（长边像素数），为None时使用原图分辨率推理
+            output_format (str): 输出格式，如'PNG'。设置后结果为编码后的字节数据
+            
+        返回:
+            list: 与输入一一对应的结果列表，处理失败的项为异常对象
+        """
+        # 检查模型是否有效（'auto'时使用自动选择的模型）
+        model = self._resolve_model(model)
+        
+        # 检查透明度阈值是否有效
+        if not 0 <= alpha_threshold <= 255:
+            raise ValueError(f"透明度阈值必须在0-255之间，当前值: {alpha_threshold}")
+        
+        # 检查工作分辨率是否有效
+        if working_size is not None and working_size <= 0:
+            raise ValueError(f"工作分辨率必须大于0，当前值: {working_size}")
+        
+        # 确保模型的会话已创建（首次使用时加载模型）
+        self._ensure_session(model)
+        
+        results = [None] * len(image_paths)
+        
+        # 加载图片，单张失败不影响其他图片
+        loaded = []
+        for index, image_path in enumerate(image_paths):
+            try:
+                check_source(image_path)
+                loaded.append((index, load_image(image_path)))
+            except Exception as e:
+                results[index] = RuntimeError(f"处理图片时出错: {str(e)}")
+        
+        if alpha_threshold > 0:
+            # 透明度抠图需要逐张处理
+            outputs = []
+            for index, input_image in loaded:
+                try:
+                    outputs.append((index, self._remove(input_image, model, alpha_threshold, working_size)))
+                except Exception as e:
+                    results[index] = RuntimeError(f"处理图片时出错: {str(e)}")
+        else:
+            # 缩小到工作分辨率后合并推理
+            small_images = [
+                downscale_for_inference(image, working_size) if working_size else image
+                for _, image in loaded
+            ]
+            masks = self._predict_masks(small_images, model)
+            
+            outputs = []
+            for (index, input_image), small_image, mask in zip(loaded, small_images, masks):
+                try:
+                    # 低分辨率推理的蒙版需要上采样到原图尺寸
+                    if small_image is not input_image:
+                        mask = guided_upsample_mask(mask, input_image)
+                    outputs.append((index, apply_mask(input_image, mask)))
+                except Exception as e:
+                    results[index] = RuntimeError(f"处理图片时出错: {str(e)}")
+        
+        # 需要时编码为字节数据
+        for index, output_image in outputs:
+            try:
+                results[index] = encode_image(output_image, output_format) if output_format else output_image
+            except Exception as e:
+                results[index] = RuntimeError(f"处理图片时出错: {str(e)}")
+        
+        return results
+    
+    def _predict_masks(self, images, model):
+        """
+        使用指定模型的会话为多张图片预测蒙版
+        
+        模型输入的批大小可变时，将所有图片合并为一次推理；否则逐张推理。
+        
+        参数:
+            images (list): 图片列表
+            model (str): 使用的模型名称
+            
+        返回:
+            list: 与输入一一对应的蒙版列表（L模式）
+        """
+        session = self._get_session(model)
+        inputs = self.registry.model_inputs(model)
+        can_batch = (
+            len(images) > 1 and
+            self._batch_inference.get(model, True) and
+            hasattr(session, "inner_session") and hasattr(session, "normalize")
+        )
+        
+        if can_batch:
+            try:
+                mean, std, size = inputs
                 
-                # 保存结果
-                output_image.save(output_path)
+                # 与rembg相同的预处理，沿批维度拼接
+                feeds = [session.normalize(image, mean, std, size) for image in images]
+                input_name = next(iter(feeds[0]))
+                batch = np.concatenate([feed[input_name] for feed in feeds], axis=0)
+                with self._inference(model):
+                    predictions = session.inner_session.run(None, {input_name: batch})[0][:, 0]
                 
-                # 增加计数
-                processed_count += 1
+                # 与rembg相同的后处理：归一化后缩放回原图尺寸
+                masks = []
+                for image, prediction in zip(images, predictions):
+                    low, high = prediction.min(), prediction.max()
+                    prediction = (prediction - low) / max(high - low, 1e-8)
+                    mask = Image.fromarray((prediction * 255).astype(np.uint8))
+                    masks.append(mask.resize(image.size, Image.LANCZOS))
+                return masks
                 
+            except Exception:
+                # 模型输入的批大小固定，之后对该模型逐张推理
+                self._batch_inference[model] = False
+        
+        masks = []
+        for image in images:
+            with self._inference(model):
+                masks.append(remove(image, session=session, only_mask=True))
+        return masks
+    
+    def remove_background_batch(self, input_dir, output_dir, model="u2net", alpha_threshold=0,
+                                working_size=None, max_workers=1, progress_callback=None,
+                                control=None, scheduler=None, deduplicator=None, all_frames=False):
+        """
+        批量移除图片背景
+        
+        参数:
+            input_dir (str): 输入图片目录
+            output_dir (str): 输出图片目录
+            model (str): 使用的模型名称，'auto'时使用在验证集上自动选择的模型
+            alpha_threshold (int): 透明度阈值，0-255之间
+            working_size (int): 工作分辨率（长边像素数），为None时使用原图分辨率
+            max_workers (int): 并行线程数
+            progress_callback (callable): 进度回调函数，参数为BatchProgress
+            control (BatchControl): 暂停、继续和取消控制
+            scheduler (CostScheduler): 调度器，设置后大图片优先处理并受内存上限限制；
+                调度器设置了像素预算且不做透明度抠图时，小图片按预算打包合并推理
+            deduplicator (Deduplicator): 重复图片检测，设置后每组重复图片只推理代表图片，
+                内容相同的图片直接复制结果，宽高比相同的近似重复图片复用缩放后的蒙版（进度只统计代表图片）；
+                代表图片处理失败时，同组的图片逐张单独处理
+            all_frames (bool): 是否处理动画的所有帧，动画结果按源格式保存（如.gif）
+            
+        返回:
+            int: 成功处理的图片数量（每个文件的状态和耗时见self.last_report，包括重复图片）
+        """
+        # 检查模型是否有效（'auto'时使用自动选择的模型）
+        model = self._resolve_model(model)
+        
+        # 检查工作分辨率是否有效
+        if working_size is not None and working_size <= 0:
+            raise ValueError(f"工作分辨率必须大于0，当前值: {working_size}")
+        
+        # 支持的图片格式
+        supported_formats = [".jpg", ".jpeg", ".png", ".bmp", ".gif"]
+        
+        # 获取所有图片文件
+        image_files = list_image_files(input_dir, supported_formats)
+        
+        # 确保输出目录存在
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 确保模型的会话已创建（首次使用时加载模型）
+        self._ensure_session(model)
+        
+        # 报告包括所有图片，重复图片在分发结果时记录
+        report = JobReport(image_files)
+        self.last_report = report
+        
+        # 重复图片分组，只处理每组的代表图片
+        groups = {}
+        if deduplicator is not None:
+            groups = {
+                group.representative: group
+                for group in deduplicator.group(image_files, lambda f: os.path.join(input_dir, f))
+            }
+            image_files = [image_file for image_file in image_files if image_file in groups]
+        fanned_out = []
+        
+        def process_file(image_file):
+            # 构建完整路径
+            input_path = os.path.join(input_dir, image_file)
+            
+            # 加载图片
+            with report.stage(image_file, "load"):
+                input_image = load_image(input_path)
+            
+            # 动画逐帧处理，按源格式保存所有帧
+            if all_frames and is_animated(input_image):
+                with report.stage(image_file, "process"):
+                    animation = self._remove_frames(input_image, model, alpha_threshold, working_size)
+                with report.stage(image_file, "save"):
+                    animation.save(output_path(image_file, animation.extension))
+                record_output(image_file, animation)
+                fan_out(image_file, animation)
+                return
+            
+            # 移除背景
+            with report.stage(image_file, "process"):
+                output_image = self._remove(input_image, model, alpha_threshold, working_size)
+            
+            # 保存结果（保留ICC色彩配置和选定的EXIF标签）
+            with report.stage(image_file, "save"):
+                save_image(output_image, output_path(image_file))
+            record_output(image_file, output_image)
+            fan_out(image_file, output_image)
+        
+        def process_files(batch_files):
+            # 一批图片合并推理，逐张保存
+            start = time.perf_counter()
+            outputs = self.remove_background_many(
+                [os.path.join(input_dir, image_file) for image_file in batch_files],
+                model, alpha_threshold, working_size
+            )
+            # 读取和推理合并进行，耗时平均分摊到每张图片
+            for image_file in batch_files:
+                report.add_time(image_file, "process", (time.perf_counter() - start) / len(batch_files))
+            errors = []
+            for image_file, output_image in zip(batch_files, outputs):
+                if isinstance(output_image, Exception):
+                    errors.append(output_image)
+                    process_members(image_file)
+                    continue
+                try:
+                    with report.stage(image_file, "save"):
+                        save_image(output_image, output_path(image_file))
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+                    process_members(image_file)
+                    continue
+                record_output(image_file, output_image)
+                fan_out(image_file, output_image)
+            return errors
+        
+        def process_representative(image_file):
+            try:
+                process_file(image_file)
+            except Exception:
+                # 代表图片失败时没有可分发的结果，同组的重复图片逐张单独处理
+                process_members(image_file)
+                raise
+        
+        def process_members(image_file):
+            # 逐张单独处理同组的重复图片（重复图片不经过run_batch，在这里记录到报告）
+            group = groups.get(image_file)
+            if group is None:
+                return
+            for member in group.members:
+                started = time.perf_counter()
+                try:
+                    process_file(member)
+                    fanned_out.append(member)
+                    report.finish(member, None, started, time.perf_counter())
+                except Exception as e:
+                    print(f"处理图片 {member} 时出错: {str(e)}")
+                    report.finish(member, str(e), started, time.perf_counter())
+        
+        def fan_out(image_file, output_image):
+            # 将代表图片的结果分发给同组的重复图片
+            group = groups.get(image_file)
+            if group is None:
+                return
+            extension = output_image.extension if isinstance(output_image, AnimatedImage) else ".png"
+            for member in group.members:
+                started = time.perf_counter()
+                try:
+                    if member in group.exact:
+                        # 内容完全相同，直接复制结果文件
+                        shutil.copyfile(output_path(image_file, extension), output_path(member, extension))
+                    elif isinstance(output_image, AnimatedImage):
+                        # 近似重复的动画无法复用单个蒙版，单独处理
+                        process_file(member)
+                    else:
+                        member_image = load_image(os.path.join(input_dir, member))
+                        if _same_aspect(member_image.size, output_image.size):
+                            # 近似重复，将代表图片的蒙版缩放到该图片的尺寸
+                            mask = output_image.getchannel("A").resize(member_image.size, Image.BILINEAR)
+                            save_image(apply_mask(member_image, mask), output_path(member))
+                        else:
+                            # 宽高比不同（如剪裁过的副本），缩放蒙版会错位，单独处理
+                            process_file(member)
+                    record_output(member, output_image)
+                    fanned_out.append(member)
+                    report.finish(member, None, started, time.perf_counter())
+                except Exception as e:
+                    print(f"处理图片 {member} 时出错: {str(e)}")
+                    report.finish(member, str(e), started, time.perf_counter())
+        
+        def record_output(image_file, output_image):
+            # 记录输入输出大小和输出尺寸
+            extension = output_image.extension if isinstance(output_image, AnimatedImage) else ".png"
+            report.set_input(image_file, os.path.getsize(os.path.join(input_dir, image_file)))
+            report.set_output(image_file, os.path.getsize(output_path(image_file, extension)), output_image.size)
+        
+        def output_path(image_file, extension=".png"):
+            # 保持原文件名，但扩展名改为png以支持透明度（动画使用源格式）
+            return os.path.join(output_dir, os.path.splitext(image_file)[0] + extension)
+        
+        # 批量处理图片（透明度抠图和动画需要逐张处理，不打包）
+        completed = run_batch(image_files, process_representative, max_workers, progress_callback, control,
+                              scheduler=scheduler, item_path=lambda f: os.path.join(input_dir, f),
+                              process_batch=process_files if alpha_threshold == 0 and not all_frames else None,
+                              job_report=report)
+        
+        # 成功数量包括重复图片（分发了结果或单独处理成功）
+        return completed + len(fanned_out)
+    
+    def remove_background_sequence(self, input_dir, output_dir, model="u2net", working_size=None,
+                                   diff_threshold=3.0, max_reuse=4, batch_size=8, smoothing=0.0,
+                                   progress_callback=None, control=None):
+        """
+        移除编号帧序列（如360度转台拍摄、视频拆帧）的背景
+        
+        按自然顺序逐帧读取，边处理边写出。与上一关键帧相比变化很小的帧不做推理，
+        用相位相关估计平移后复用关键帧的蒙版；其余关键帧攒够一批后合并推理。
+        可选的时间域平滑可以减少相邻帧蒙版的闪烁。序列模式只输出蒙版合成结果，不做透明度抠图。
+        
+        参数:
+            input_dir (str): 帧序列目录
+            output_dir (str): 输出目录（每帧保存为同名PNG）
+            model (str): 使用的模型名称，'auto'时使用在验证集上自动选择的模型
+            working_size (int): 工作分辨率（长边像素数），为None时使用原图分辨率推理
+            diff_threshold (float): 对齐后缩略图的平均差异（0-255）低于该值时复用蒙版，为0时每帧都推理
+            max_reuse (int): 连续复用同一关键帧蒙版的最大帧数，避免误差累积
+            batch_size (int): 每批合并推理的关键帧数量
+            smoothing (float): 时间域平滑时上一帧蒙版的权重（0-1），为0时不平滑
+            progress_callback (callable): 进度回调函数，参数为BatchProgress
+            control (BatchControl): 暂停、继续和取消控制
+            
+        返回:
+            int: 成功写出的帧数量
+        """
+        # 检查模型是否有效（'auto'时使用自动选择的模型）
+        model = self._resolve_model(model)
+        
+        # 检查参数是否有效
+        if working_size is not None and working_size <= 0:
+            raise ValueError(f"工作分辨率必须大于0，当前值: {working_size}")
+        if batch_size < 1:
+            raise ValueError(f"批大小必须大于0，当前值: {batch_size}")
+        if not 0 <= smoothing < 1:
+            raise ValueError(f"平滑权重必须在0-1之间（不含1），当前值: {smoothing}")
+        
+        # 按自然顺序获取所有帧
+        frame_files = list_image_files(input_dir, [".jpg", ".jpeg", ".png", ".bmp"], natural=True)
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 确保模型的会话已创建（首次使用时加载模型）
+        self._ensure_session(model)
+        
+        progress = BatchProgress(len(frame_files))
+        job_report = JobReport(frame_files)
+        self.last_report = job_report
+        start_time = time.perf_counter()
+        state = {"keyframe": None, "reused": 0, "previous_mask": None, "inferred": 0, "reused_total": 0}
+        pending = []
+        
+        def report(frame_file, error, started):
+            # 更新报告和进度并回调
+            job_report.finish(frame_file, error, started, time.perf_counter())
+            if error is None:
+                progress.completed += 1
+            else:
+                progress.failed += 1
+                print(f"处理图片 {frame_file} 时出错: {error}")
+            progress.current_file = frame_file
+            progress.error = error
+            progress.elapsed = time.perf_counter() - start_time
+            if progress_callback is not None:
+                progress_callback(copy.copy(progress))
+        
+        def flush(writer):
+            # 合并推理待处理的关键帧，再按顺序得到每帧的蒙版并写出
+            keyframes = [entry for entry in pending if entry["keyframe"] is None]
+            if keyframes:
+                small_images = [
+                    downscale_for_inference(entry["image"], working_size) if working_size else entry["image"]
+                    for entry in keyframes
+                ]
+                start = time.perf_counter()
+                for entry, small_image, mask in zip(keyframes, small_images, self._predict_masks(small_images, model)):
+                    if small_image is not entry["image"]:
+                        mask = guided_upsample_mask(mask, entry["image"])
+                    entry["mask"] = mask
+                # 合并推理的耗时平均分摊到每个关键帧
+                for entry in keyframes:
+                    job_report.add_time(entry["file"], "process", (time.perf_counter() - start) / len(keyframes))
+                state["inferred"] += len(keyframes)
+            
+            for entry in pending:
+                if entry["keyframe"] is not None:
+                    # 复用关键帧的蒙版，按估计的平移量对齐
+                    keyframe = entry["keyframe"]
+                    scale = entry["image"].width / entry["signature"].shape[1]
+                    dx, dy = entry["shift"]
+                    entry["mask"] = shift_mask(keyframe["mask"], dx * scale, dy * scale)
+                    state["reused_total"] += 1
+                
+                mask = blend_masks(state["previous_mask"], entry["mask"], smoothing)
+                state["previous_mask"] = mask
+                output_path = os.path.join(output_dir, os.path.splitext(entry["file"])[0] + ".png")
+                writer.submit(write, entry["file"], apply_mask(entry["image"], mask), output_path, entry["started"])
+            
+            # 只保留最后一个关键帧（后续帧可能复用它的蒙版），释放其余帧的图片
+            for entry in pending:
+                if entry is not state["keyframe"]:
+                    entry["image"] = None
+            pending.clear()
+        
+        def write(frame_file, output_image, output_path, started):
+            # 在写出线程中保存结果并记录
+            try:
+                with job_report.stage(frame_file, "save"):
+                    save_image(output_image, output_path)
+                job_report.set_output(frame_file, os.path.getsize(output_path), output_image.size)
+            except Exception as e:
+                report(frame_file, str(e), started)
+                return
+            report(frame_file, None, started)
+        
+        def safe_flush(writer):
+            # 推理失败时本批所有帧记为失败，下一帧重新作为关键帧
+            try:
+                flush(writer)
             except Exception as e:
-                print(f"处理图片 {image_file} 时出错: {str(e)}")
+                for entry in pending:
+                    writer.submit(report, entry["file"], f"处理图片时出错: {str(e)}", entry["started"])
+                pending.clear()
+                state["keyframe"] = None
+        
+        # 单线程写出，编码与推理重叠进行，同时保证写出顺序
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            for frame_file in frame_files:
+                if control is not None and not control.wait_if_paused():
+                    break
+                
+                started = time.perf_counter()
+                try:
+                    frame_path = os.path.join(input_dir, frame_file)
+                    with job_report.stage(frame_file, "load"):
+                        image = load_image(frame_path)
+                        signature = frame_signature(image, 128)
+                    job_report.set_input(frame_file, os.path.getsize(frame_path))
+                except Exception as e:
+                    # 进度统计都在写出线程中更新
+                    writer.submit(report, frame_file, f"处理图片时出错: {str(e)}", started)
+                    continue
+                
+                entry = {"file": frame_file, "image": image, "signature": signature, "keyframe": None,
+                         "started": started}
+                keyframe = state["keyframe"]
+                if (keyframe is not None and diff_threshold > 0 and state["reused"] < max_reuse and
+                        keyframe["signature"].shape == signature.shape and keyframe["image"].size == image.size):
+                    shift = estimate_shift(keyframe["signature"], signature)
+                    if frame_difference(keyframe["signature"], signature, shift) < diff_threshold:
+                        entry["keyframe"] = keyframe
+                        entry["shift"] = shift
+                
+                if entry["keyframe"] is None:
+                    state["keyframe"] = entry
+                    state["reused"] = 0
+                else:
+                    state["reused"] += 1
+                pending.append(entry)
+                
+                # 关键帧攒够一批时合并推理
+                if sum(1 for item in pending if item["keyframe"] is None) >= batch_size:
+                    safe_flush(writer)
+            
+            if pending:
+                safe_flush(writer)
         
-        return processed_count
\ No newline at end of file
+        # 记录推理和复用的帧数
+        self.last_sequence_stats = {
+            "frames": progress.finished,
+            "inferred": state["inferred"],
+            "reused": state["reused_total"],
+        }
+        return progress.completed
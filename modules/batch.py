@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 批量处理模块
+
+提供批量处理的公共实现：收集图片文件、多线程并行处理、进度统计（速度和剩余时间），
+以及暂停、继续和取消控制。每个文件处理完成后立即保存，取消或暂停不会丢失已完成的结果。
+指定调度器时按图片代价从大到小处理，并受内存上限限制（见scheduler模块）。
+传入JobReport时逐个文件记录状态、耗时和输入大小（见report模块）。
+处理函数可以返回后台写出任务（Future），写出完成后才计为完成；传入预读对象时按处理顺序预读文件
+（见io_overlap模块）。
+"""
+
+import os
+import re
+import copy
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def natural_sort_key(name):
+    """
+    自然排序的键：文件名中的数字按数值比较（frame2排在frame10之前）
+
+    参数:
+        name (str): 文件名
+
+    返回:
+        list: 排序键
+    """
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part.lower())
+            for part in re.split(r"(\d+)", name) if part]
+
+
+def list_image_files(input_dir, supported_formats, natural=False):
+    """
+    获取目录中所有支持的图片文件
+
+    参数:
+        input_dir (str): 输入图片目录
+        supported_formats (list): 支持的图片扩展名列表
+        natural (bool): 是否按自然顺序排序（用于编号的帧序列）
+
+    返回:
+        list: 图片文件名列表（按文件名排序）
+    """
+    # 检查输入目录是否存在
+    if not os.path.exists(input_dir) or not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"输入目录不存在: {input_dir}")
+
+    # 获取所有图片文件
+    image_files = sorted(
+        (f for f in os.listdir(input_dir)
+         if os.path.isfile(os.path.join(input_dir, f)) and
+         any(f.lower().endswith(ext) for ext in supported_formats)),
+        key=natural_sort_key if natural else None
+    )
+
+    # 如果没有图片文件
+    if not image_files:
+        raise ValueError(f"输入目录中没有支持的图片文件: {input_dir}")
+
+    return image_files
+
+
+class BatchControl:
+    """批量处理控制类（暂停、继续、取消）"""
+
+    def __init__(self):
+        """初始化控制状态"""
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    def pause(self):
+        """暂停（正在处理的文件会继续完成，不再开始新文件）"""
+        self._running.clear()
+
+    def resume(self):
+        """继续"""
+        self._running.set()
+
+    def cancel(self):
+        """取消（正在处理的文件会继续完成并保存）"""
+        self._cancelled.set()
+        self._running.set()
+
+    @property
+    def is_paused(self):
+        """是否处于暂停状态"""
+        return not self._running.is_set()
+
+    @property
+    def is_cancelled(self):
+        """是否已取消"""
+        return self._cancelled.is_set()
+
+    def wait_if_paused(self):
+        """
+        暂停时阻塞，直到继续或取消
+
+        返回:
+            bool: 如果可以继续处理则返回True，已取消则返回False
+        """
+        self._running.wait()
+        return not self.is_cancelled
+
+
+class BatchProgress:
+    """批量处理进度类"""
+
+    def __init__(self, total):
+        """
+        初始化进度
+
+        参数:
+            total (int): 文件总数
+        """
+        self.total = total          # 文件总数
+        self.completed = 0          # 成功数量
+        self.failed = 0             # 失败数量
+        self.current_file = None    # 最近完成的文件
+        self.error = None           # 最近完成文件的错误信息，成功时为None
+        self.elapsed = 0.0          # 已用处理时间（秒，不含暂停时间）
+
+    @property
+    def finished(self):
+        """已完成数量（包括失败）"""
+        return self.completed + self.failed
+
+    @property
+    def rate(self):
+        """处理速度（张/秒）"""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.finished / self.elapsed
+
+    @property
+    def eta(self):
+        """预计剩余时间（秒），无法估计时为None"""
+        if self.rate <= 0:
+            return None
+        return (self.total - self.finished) / self.rate
+
+
+def _run_unit(items, process_item, process_batch):
+    """
+    处理一个调度单元
+
+    参数:
+        items (list): 单元中的文件列表
+        process_item (callable): 处理单个文件的函数
+        process_batch (callable): 处理多个文件的函数，返回与输入对应的异常列表（成功的项为None）
+
+    返回:
+        list: 与输入对应的错误信息列表，成功的项为None，结果仍在后台写出的项为写出任务（Future）
+    """
+    if len(items) > 1:
+        try:
+            errors = process_batch(items)
+        except Exception as e:
+            errors = [e] * len(items)
+        return [None if error is None else str(error) for error in errors]
+
+    try:
+        result = process_item(items[0])
+    except Exception as e:
+        return [str(e)]
+    return [result if isinstance(result, Future) else None]
+
+
+def run_batch(items, process_item, max_workers=1, progress_callback=None, control=None,
+              scheduler=None, item_path=None, process_batch=None, job_report=None, prefetcher=None):
+    """
+    并行处理一批文件
+
+    参数:
+        items (list): 待处理的文件列表
+        process_item (callable): 处理单个文件的函数，失败时抛出异常
+        max_workers (int): 并行线程数
+        progress_callback (callable): 进度回调函数，每完成一个文件调用一次，参数为BatchProgress
+        control (BatchControl): 暂停、继续和取消控制
+        scheduler (CostScheduler): 调度器，为None时按原顺序逐个处理
+        item_path (callable): 由文件项得到图片路径的函数（使用调度器时需要）
+        process_batch (callable): 批处理函数，提供时调度器可以按像素预算把多个文件打包处理
+        job_report (JobReport): 处理报告，提供时记录每个文件的状态、总耗时和输入字节数
+            （阶段耗时和输出信息由处理函数记录）
+        prefetcher (Prefetcher): 预读对象，提供时按处理顺序预读文件（需要item_path），处理完成后关闭；
+            处理函数通过prefetcher.get(路径)取得文件内容
+
+    返回:
+        int: 成功处理的文件数量
+    """
+    # 检查线程数是否有效
+    if max_workers < 1:
+        raise ValueError(f"线程数必须大于0，当前值: {max_workers}")
+
+    # 生成调度单元，未指定调度器时每个文件单独处理
+    if scheduler is not None:
+        units = scheduler.schedule(items, item_path or (lambda item: item), process_batch is not None)
+        unit_items = [unit.items for unit in units]
+    else:
+        units = None
+        unit_items = [[item] for item in items]
+
+    # 按处理顺序预读
+    if prefetcher is not None and item_path is not None:
+        prefetcher.start([item_path(item) for unit in unit_items for item in unit])
+
+    progress = BatchProgress(len(items))
+    paused_time = 0.0
+    start_time = time.perf_counter()
+
+    def run_unit(index):
+        # 处理一个调度单元，记录开始和结束时间
+        items = unit_items[index]
+        if job_report is not None and item_path is not None:
+            for item in items:
+                try:
+                    job_report.set_input(item, os.path.getsize(item_path(item)))
+                except OSError:
+                    pass
+        started = time.perf_counter()
+        errors = _run_unit(items, process_item, process_batch)
+        return errors, started, time.perf_counter()
+
+    def report(item, error):
+        # 更新进度并回调
+        if error is None:
+            progress.completed += 1
+        else:
+            progress.failed += 1
+            print(f"处理图片 {item} 时出错: {error}")
+        progress.current_file = item
+        progress.error = error
+        progress.elapsed = time.perf_counter() - start_time - paused_time
+        if progress_callback is not None:
+            # 传递快照，回调可能在其他线程中稍后读取
+            progress_callback(copy.copy(progress))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            writing = {}    # 后台写出任务 -> (文件, 开始时间)
+            next_index = 0
+            exhausted = False
+            memory_in_flight = 0
+
+            while True:
+                # 补充任务，同时在处理中的任务不超过线程数，便于及时响应暂停和取消
+                while not exhausted and len(pending) < max_workers:
+                    if next_index >= len(unit_items):
+                        exhausted = True
+                        break
+                    # 内存上限不允许时，等正在处理的任务完成后再开始
+                    if units is not None and not scheduler.admits(units[next_index], memory_in_flight, bool(pending)):
+                        break
+                    if control is not None:
+                        if control.is_paused and (pending or writing):
+                            break
+                        pause_start = time.perf_counter()
+                        can_continue = control.wait_if_paused()
+                        paused_time += time.perf_counter() - pause_start
+                        if not can_continue:
+                            exhausted = True
+                            break
+                    future = executor.submit(run_unit, next_index)
+                    pending[future] = next_index
+                    if units is not None:
+                        memory_in_flight += units[next_index].memory
+                    next_index += 1
+
+                if not pending and not writing:
+                    break
+
+                # 等待至少一个任务完成
+                done, _ = wait(list(pending) + list(writing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in writing:
+                        # 后台写出完成
+                        item, started = writing.pop(future)
+                        error = None if future.exception() is None else str(future.exception())
+                        if job_report is not None:
+                            job_report.finish(item, error, started, time.perf_counter())
+                        report(item, error)
+                        continue
+                    index = pending.pop(future)
+                    if units is not None:
+                        memory_in_flight -= units[index].memory
+                    errors, started, ended = future.result()
+                    for item, error in zip(unit_items[index], errors):
+                        if isinstance(error, Future):
+                            writing[error] = (item, started)
+                            continue
+                        if job_report is not None:
+                            job_report.finish(item, error, started, ended)
+                        report(item, error)
+    finally:
+        # 出错时也停止预读，释放读取线程和已缓存的数据
+        if prefetcher is not None:
+            prefetcher.close()
+    return progress.completed
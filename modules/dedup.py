@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 重复图片检测模块
+
+批量处理前找出内容完全相同（SHA-256）和近似重复（感知哈希的汉明距离不超过阈值，
+如重新编码、轻微缩放的副本）的图片并分组，每组只处理一张代表图片，
+结果再分发给组内其他图片。哈希值可以保存到JSON索引文件，文件未修改时下次直接复用。
+"""
+
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .image_io import normalize_orientation
+
+
+# 索引文件格式版本
+_INDEX_VERSION = 1
+
+# 计算内容哈希时每次读取的字节数
+_CHUNK_SIZE = 1024 * 1024
+
+# 每个字节值中1的位数
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+
+def file_digest(path):
+    """
+    计算文件内容的SHA-256
+
+    参数:
+        path (str): 文件路径
+
+    返回:
+        str: 十六进制哈希值
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image, hash_size=8):
+    """
+    计算图片的差值哈希（dHash）：缩小为灰度小图后比较相邻像素的亮度
+
+    参数:
+        image (PIL.Image): 图片对象
+        hash_size (int): 哈希边长，哈希位数为 hash_size * hash_size
+
+    返回:
+        str: 十六进制哈希值
+    """
+    # JPEG在解码阶段直接缩小
+    image.draft("L", (hash_size * 4, hash_size * 4))
+    small = normalize_orientation(image).convert("L").resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits.ravel()).tobytes().hex()
+
+
+def _pairs_within(packed, members, threshold, block_size):
+    """
+    在一组候选哈希之间逐块计算汉明距离
+
+    参数:
+        packed (numpy.ndarray): 全部哈希的字节数组
+        members (numpy.ndarray): 候选下标（升序）
+        threshold (int): 汉明距离阈值
+        block_size (int): 每块比较的行数
+
+    返回:
+        list: 下标对 (i, j) 的列表，i < j
+    """
+    candidates = packed[members]
+    pairs = []
+    for start in range(0, len(members), block_size):
+        rows = candidates[start:start + block_size]
+        # 按字节异或后查表统计不同的位数
+        distances = _POPCOUNT[rows[:, None, :] ^ candidates[None, :, :]].sum(axis=2)
+        for i, j in zip(*np.nonzero(distances <= threshold)):
+            if start + i < j:
+                pairs.append((int(members[start + i]), int(members[j])))
+    return pairs
+
+
+def near_duplicate_pairs(hashes, threshold, block_size=256):
+    """
+    找出汉明距离不超过阈值的哈希对
+
+    按鸽巢原理把哈希的位分成 threshold + 1 段：距离不超过阈值的两个哈希至少有一段完全相同，
+    因此只需比较至少一段相同的候选哈希。内容各不相同的图片通常落在很小的桶里，
+    比较次数和内存接近线性；大量图片彼此相似（同一个桶很大）时仍会退化为桶内两两比较，
+    每块的内存为 block_size × 桶大小 × 哈希字节数。
+
+    参数:
+        hashes (list): 等长的十六进制哈希值列表
+        threshold (int): 汉明距离阈值
+        block_size (int): 每块比较的行数
+
+    返回:
+        list: 下标对 (i, j) 的列表，i < j，按下标排序
+    """
+    if len(hashes) < 2:
+        return []
+
+    packed = np.array([np.frombuffer(bytes.fromhex(value), dtype=np.uint8) for value in hashes])
+    bits = np.unpackbits(packed, axis=1)
+    if threshold >= bits.shape[1]:
+        # 阈值不小于哈希位数时任意两张图片都近似重复
+        buckets = [np.arange(len(hashes))]
+    else:
+        buckets = []
+        for band in np.array_split(np.arange(bits.shape[1]), threshold + 1):
+            members = {}
+            for index, key in enumerate(np.packbits(bits[:, band], axis=1)):
+                members.setdefault(key.tobytes(), []).append(index)
+            buckets.extend(np.array(indices) for indices in members.values() if len(indices) > 1)
+
+    # 同一对哈希可能在多段中都相同，去重后返回
+    pairs = set()
+    for members in buckets:
+        pairs.update(_pairs_within(packed, members, threshold, block_size))
+    return sorted(pairs)
+
+
+class HashIndex:
+    """持久化的图片哈希索引类"""
+
+    def __init__(self, path=None):
+        """
+        初始化哈希索引
+
+        参数:
+            path (str): 索引文件路径，为None时只保存在内存中
+        """
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        """从索引文件加载（文件损坏或版本不符时忽略）"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == _INDEX_VERSION:
+            self._entries = data.get("entries", {})
+
+    def lookup(self, path):
+        """
+        查找文件的哈希记录（文件大小或修改时间变化时视为无效）
+
+        参数:
+            path (str): 文件路径
+
+        返回:
+            dict: 哈希记录，没有有效记录时为None
+        """
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry
+        return None
+
+    def compute(self, path, hash_size=8):
+        """
+        获取文件的哈希记录，没有有效记录时计算并加入索引
+
+        参数:
+            path (str): 文件路径
+            hash_size (int): 感知哈希边长
+
+        返回:
+            dict: 哈希记录（sha256、phash、width、height等）
+        """
+        entry = self.lookup(path)
+        if entry is not None and entry.get("hash_size") == hash_size:
+            return entry
+
+        stat = os.stat(path)
+        with Image.open(path) as image:
+            width, height = image.size
+            phash = perceptual_hash(image, hash_size)
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(path),
+            "phash": phash,
+            "hash_size": hash_size,
+            "width": width,
+            "height": height,
+        }
+        with self._lock:
+            self._entries[os.path.abspath(path)] = entry
+            self._dirty = True
+        return entry
+
+    def save(self):
+        """保存索引文件（先写临时文件再替换，中断时不会损坏原索引）"""
+        if self.path is None or not self._dirty:
+            return
+
+        with self._lock:
+            data = {"version": _INDEX_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+class DuplicateGroup:
+    """重复图片组类"""
+
+    def __init__(self, representative, exact, similar):
+        """
+        初始化重复图片组
+
+        参数:
+            representative: 代表图片（组内分辨率最高的图片）
+            exact (list): 与代表图片内容完全相同的图片
+            similar (list): 与代表图片近似重复（感知哈希距离不超过阈值）的图片
+        """
+        self.representative = representative
+        self.exact = exact
+        self.similar = similar
+
+    def __repr__(self):
+        return f"DuplicateGroup({self.representative!r}, exact={self.exact!r}, similar={self.similar!r})"
+
+    @property
+    def members(self):
+        """除代表图片外的组内图片"""
+        return self.exact + self.similar
+
+
+class Deduplicator:
+    """重复图片检测类"""
+
+    def __init__(self, threshold=4, index_path=None, hash_size=8, max_workers=4):
+        """
+        初始化重复图片检测
+
+        参数:
+            threshold (int): 近似重复的汉明距离阈值（64位哈希中不同的位数），为None时只检测完全相同的图片
+            index_path (str): 哈希索引文件路径，为None时不保存
+            hash_size (int): 感知哈希边长
+            max_workers (int): 计算哈希的并行线程数
+        """
+        if threshold is not None and threshold < 0:
+            raise ValueError(f"汉明距离阈值不能小于0，当前值: {threshold}")
+
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.max_workers = max_workers
+        self.index = HashIndex(index_path)
+
+    def group(self, items, item_path=None):
+        """
+        对图片分组
+
+        参数:
+            items (list): 文件项列表（通常是文件名）
+            item_path (callable): 由文件项得到图片路径的函数，为None时文件项即为路径
+
+        返回:
+            list: DuplicateGroup列表，顺序与每组第一张图片在输入中的顺序一致；
+                无法读取的图片单独成组，由后续处理报告错误
+        """
+        item_path = item_path or (lambda item: item)
+
+        def compute(item):
+            try:
+                return self.index.compute(item_path(item), self.hash_size)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            entries = list(executor.map(compute, items))
+        self.index.save()
+
+        # 内容完全相同
+        by_digest = {}
+        for index, entry in enumerate(entries):
+            if entry is not None:
+                by_digest.setdefault(entry["sha256"], []).append(index)
+        unique = [indices[0] for indices in by_digest.values()]
+
+        # 近似重复：只需比较内容不同的图片
+        neighbours = {index: [] for index in unique}
+        if self.threshold is not None and len(unique) > 1:
+            hashes = [entries[index]["phash"] for index in unique]
+            for a, b in near_duplicate_pairs(hashes, self.threshold):
+                neighbours[unique[a]].append(unique[b])
+                neighbours[unique[b]].append(unique[a])
+
+        # 按分辨率从高到低选代表图片，每张图片只归入与它本身距离不超过阈值的代表图片
+        # （相似关系不传递：A与B、B与C相似时A与C可能相差很大）
+        def area(index):
+            return entries[index]["width"] * entries[index]["height"]
+
+        owner = {}
+        for index in sorted(unique, key=lambda index: (-area(index), index)):
+            if index in owner:
+                continue
+            owner[index] = index
+            for other in neighbours[index]:
+                owner.setdefault(other, index)
+
+        # 整理分组，内容完全相同的图片跟随同内容的第一张
+        members = {}
+        for index, entry in enumerate(entries):
+            key = owner[by_digest[entry["sha256"]][0]] if entry is not None else index
+            members.setdefault(key, []).append(index)
+
+        groups = []
+        for representative, indices in members.items():
+            digest = entries[representative]["sha256"] if entries[representative] else None
+            exact = [items[index] for index in indices
+                     if index != representative and entries[index]["sha256"] == digest]
+            similar = [items[index] for index in indices
+                       if index != representative and entries[index]["sha256"] != digest]
+            groups.append(DuplicateGroup(items[representative], exact, similar))
+        return groups
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 编码配置模块
+
+将常用的编码器参数整理为命名配置，按需在CPU时间和文件大小之间取舍：
+    fast       编码最快，文件较大
+    balanced   优化霍夫曼表等，文件明显变小，编码稍慢（默认）
+    smallest   渐进式JPEG、最高压缩级别，文件最小，编码最慢
+同时按配置和格式统计编码次数、耗时和输出大小，便于比较不同配置的实际代价。
+"""
+
+import threading
+
+
+# 各配置在不同格式下的Pillow编码参数
+PROFILES = {
+    "fast": {
+        "JPEG": {"optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "PNG": {"compress_level": 1},
+        "WEBP": {"method": 0},
+    },
+    "balanced": {
+        "JPEG": {"optimize": True, "progressive": False, "subsampling": "4:2:0"},
+        "PNG": {"compress_level": 6},
+        "WEBP": {"method": 4},
+    },
+    "smallest": {
+        "JPEG": {"optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "PNG": {"optimize": True},
+        "WEBP": {"method": 6},
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+
+def profile_params(profile, format):
+    """
+    获取编码配置在指定格式下的编码参数
+
+    参数:
+        profile (str): 配置名称（fast、balanced、smallest），为None时不添加参数
+        format (str): 图片格式，如'JPEG'
+
+    返回:
+        dict: 编码参数（格式没有对应参数时为空字典）
+    """
+    if profile is None:
+        return {}
+    if profile not in PROFILES:
+        raise ValueError(f"不支持的编码配置: {profile}，可用配置: {', '.join(PROFILES)}")
+    return dict(PROFILES[profile].get(format.upper(), {}))
+
+
+class EncodeStats:
+    """编码统计类（按配置和格式统计，线程安全）"""
+
+    def __init__(self):
+        """初始化统计"""
+        self._lock = threading.Lock()
+        # (配置, 格式) -> [编码次数, 总耗时（秒）, 总字节数]
+        self._totals = {}
+
+    def record(self, profile, format, seconds, size):
+        """
+        记录一次编码
+
+        参数:
+            profile (str): 配置名称
+            format (str): 图片格式
+            seconds (float): 编码耗时（秒）
+            size (int): 输出字节数
+        """
+        with self._lock:
+            totals = self._totals.setdefault((profile, format), [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += size
+
+    def summary(self):
+        """
+        获取统计摘要
+
+        返回:
+            dict: {配置: {格式: {count, total_ms, mean_ms, mean_bytes}}}
+        """
+        with self._lock:
+            items = [(key, list(totals)) for key, totals in self._totals.items()]
+
+        summary = {}
+        for (profile, format), (count, seconds, size) in items:
+            summary.setdefault(profile, {})[format] = {
+                "count": count,
+                "total_ms": round(seconds * 1000, 2),
+                "mean_ms": round(seconds * 1000 / count, 2),
+                "mean_bytes": round(size / count),
+            }
+        return summary
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._totals.clear()
+
+
+# 全局编码统计
+encode_stats = EncodeStats()
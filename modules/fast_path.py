@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 无损快速通道模块
+
+在解码和重新编码之前先检查源文件：文件大小和格式已经满足要求时直接沿用原始数据，
+按MCU对齐的JPEG纯剪裁在DCT域中无损完成（需要系统安装jpegtran）。
+沿用原始数据的结果图片会带有标记，批量处理时直接写出原始数据，不再重新编码。
+"""
+
+import io
+import os
+import shutil
+import subprocess
+
+from PIL import Image
+
+from .image_io import _BUFFER_TYPES, _BufferReader, _preserved_exif
+
+
+# 结果图片上记录原始数据的属性名（不放在info中，避免resize等操作把标记带到新图片上）
+_PASSTHROUGH_ATTR = "_passthrough_source"
+
+# 各格式原样写出时使用的文件扩展名
+PASSTHROUGH_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "BMP": ".bmp",
+    "GIF": ".gif",
+}
+
+# jpegtran无损剪裁的超时时间（秒）
+_JPEGTRAN_TIMEOUT = 30
+
+# JPEG标记段的最大数据长度，以及ICC配置分段存放在APP2段中的标识和每段最大长度
+_JPEG_SEGMENT_MAX = 65533
+_ICC_MARKER = b"ICC_PROFILE\0"
+_ICC_CHUNK_SIZE = _JPEG_SEGMENT_MAX - len(_ICC_MARKER) - 2
+
+
+def source_size(source):
+    """
+    获取图片输入的字节数（不读取文件内容）
+
+    参数:
+        source: 图片输入
+
+    返回:
+        int: 字节数；无法直接获得（如已解码图片、文件对象）时为None
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if isinstance(source, _BUFFER_TYPES):
+        return memoryview(source).nbytes
+    return None
+
+
+def read_source_bytes(source):
+    """
+    读取图片输入的原始数据
+
+    参数:
+        source: 图片输入
+
+    返回:
+        bytes: 原始数据；已解码图片和文件对象返回None
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if isinstance(source, _BUFFER_TYPES):
+        return bytes(memoryview(source).cast("B"))
+    return None
+
+
+def open_source(source):
+    """
+    只读取文件头打开图片输入（不解码像素、不摆正方向）
+
+    参数:
+        source: 图片输入（文件路径或内存数据）
+
+    返回:
+        PIL.Image: 延迟解码的图片对象
+    """
+    if isinstance(source, _BUFFER_TYPES):
+        return Image.open(_BufferReader(source))
+    return Image.open(source)
+
+
+def mark_passthrough(image, data, format):
+    """
+    标记图片可以直接使用原始数据写出
+
+    参数:
+        image (PIL.Image): 结果图片
+        data (bytes): 与图片内容一致的已编码数据
+        format (str): 数据的格式，如'JPEG'
+
+    返回:
+        PIL.Image: 结果图片本身
+    """
+    setattr(image, _PASSTHROUGH_ATTR, (data, format))
+    return image
+
+
+def get_passthrough(image):
+    """
+    获取图片上标记的原始数据
+
+    参数:
+        image (PIL.Image): 图片对象
+
+    返回:
+        tuple: (原始数据, 格式)；没有标记时为None
+    """
+    return getattr(image, _PASSTHROUGH_ATTR, None)
+
+
+def result_data(result):
+    """
+    获取可以直接写出的处理结果数据：带原始数据标记的图片和已编码数据
+
+    参数:
+        result (PIL.Image | bytes): 处理结果
+
+    返回:
+        tuple: (数据, 扩展名)；结果需要由调用方编码时为None
+    """
+    if isinstance(result, (bytes, bytearray)):
+        data = result
+        format = sniff_format(data)
+    else:
+        passthrough = get_passthrough(result)
+        if passthrough is None:
+            return None
+        data, format = passthrough
+    return data, PASSTHROUGH_EXTENSIONS.get(format, ".bin")
+
+
+def write_result(result, output_path):
+    """
+    写出处理结果：带原始数据标记的图片和已编码数据直接写出，其他图片由调用方保存
+
+    参数:
+        result (PIL.Image | bytes): 处理结果
+        output_path (str): 不含扩展名的输出路径
+
+    返回:
+        str: 写出的文件路径；结果需要由调用方编码保存时为None
+    """
+    prepared = result_data(result)
+    if prepared is None:
+        return None
+
+    data, extension = prepared
+    output_path += extension
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return output_path
+
+
+def sniff_format(data):
+    """
+    根据文件头识别编码格式
+
+    参数:
+        data (bytes): 已编码的图片数据
+
+    返回:
+        str: 格式名称，无法识别时为None
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.format
+    except Exception:
+        return None
+
+
+def passthrough_for_filesize(source, target_size_kb):
+    """
+    检查源文件是否已经满足按文件大小缩放的要求
+
+    与resize_to_filesize的输出格式规则一致：带透明通道的PNG保持PNG，其余输出JPEG。
+    源文件已是对应格式且不超过目标大小时，无需解码和重新编码。
+
+    参数:
+        source: 图片输入
+        target_size_kb (int): 目标文件大小（KB）
+
+    返回:
+        tuple: (原始数据, 格式)；不满足要求时为None
+    """
+    size = source_size(source)
+    if size is None or size > target_size_kb * 1024:
+        return None
+
+    with open_source(source) as image:
+        format, mode = image.format, image.mode
+        animated = getattr(image, "is_animated", False)
+    # 动画PNG的结果只有第一帧，不能沿用整个文件
+    if animated or (format != "JPEG" and not (format == "PNG" and mode == "RGBA")):
+        return None
+
+    return read_source_bytes(source), format
+
+
+def is_identity_plan(plan, size):
+    """
+    判断几何变换计划是否不改变图片
+
+    参数:
+        plan (GeometryPlan): 几何变换计划
+        size (tuple): 图片尺寸 (宽, 高)
+
+    返回:
+        bool: 源区域为整张图片且输出尺寸不变时返回True
+    """
+    return tuple(plan.box) == (0, 0, size[0], size[1]) and tuple(plan.size) == tuple(size)
+
+
+def _mcu_size(image):
+    """
+    获取JPEG图片的MCU尺寸
+
+    参数:
+        image (PIL.Image): JPEG图片
+
+    返回:
+        tuple: MCU的宽和高（像素）
+    """
+    layers = getattr(image, "layer", None) or [(None, 1, 1, None)]
+    return 8 * max(layer[1] for layer in layers), 8 * max(layer[2] for layer in layers)
+
+
+def jpegtran_available():
+    """检查系统是否安装了jpegtran"""
+    return shutil.which("jpegtran") is not None
+
+
+def lossless_jpeg_crop(source, image, plan):
+    """
+    尝试在DCT域中无损剪裁JPEG
+
+    只处理不缩放的纯剪裁，且源区域的左上角必须与MCU边界对齐；
+    条件不满足或jpegtran不可用时返回None，由调用方走常规的解码和重采样。
+
+    参数:
+        source: 图片输入（文件路径或内存数据）
+        image (PIL.Image): 已打开（尚未解码）的原始方向图片
+        plan (GeometryPlan): 几何变换计划
+
+    返回:
+        bytes: 剪裁后的JPEG数据；无法无损剪裁时为None
+    """
+    if image.format != "JPEG" or source_size(source) is None or not jpegtran_available():
+        return None
+
+    left, top, right, bottom = plan.box
+    width, height = plan.size
+    if not all(float(value).is_integer() for value in plan.box):
+        return None
+    if (right - left, bottom - top) != (width, height):
+        return None
+
+    mcu_width, mcu_height = _mcu_size(image)
+    if left % mcu_width or top % mcu_height:
+        return None
+
+    # 不复制原文件的标记段（GPS、过期的缩略图等），元数据由_insert_jpeg_metadata按save_image的规则写回
+    command = [
+        "jpegtran", "-copy", "none",
+        "-crop", f"{int(width)}x{int(height)}+{int(left)}+{int(top)}",
+    ]
+    try:
+        result = subprocess.run(command, input=read_source_bytes(source), capture_output=True,
+                                timeout=_JPEGTRAN_TIMEOUT, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    if not result.stdout:
+        return None
+    return _insert_jpeg_metadata(result.stdout, image)
+
+
+def _jpeg_segment(marker, payload):
+    # 组装JPEG标记段（标记、包含自身的两字节长度、数据）
+    return bytes((0xFF, marker)) + (len(payload) + 2).to_bytes(2, "big") + payload
+
+
+def _insert_jpeg_metadata(data, image):
+    """
+    将源图片的ICC色彩配置和选定的EXIF标签写入JPEG数据（与image_io.save_image保留的元数据一致）
+
+    参数:
+        data (bytes): 不含元数据的JPEG数据
+        image (PIL.Image): 源图片
+
+    返回:
+        bytes: 写入元数据后的JPEG数据
+    """
+    segments = []
+    exif = _preserved_exif(image)
+    if exif and len(exif) <= _JPEG_SEGMENT_MAX:
+        segments.append(_jpeg_segment(0xE1, exif))
+
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        chunks = [icc_profile[i:i + _ICC_CHUNK_SIZE] for i in range(0, len(icc_profile), _ICC_CHUNK_SIZE)]
+        for index, chunk in enumerate(chunks, 1):
+            segments.append(_jpeg_segment(0xE2, _ICC_MARKER + bytes((index, len(chunks))) + chunk))
+
+    if not segments:
+        return data
+
+    # 元数据段放在SOI和JFIF(APP0)段之后
+    position = 2
+    while data[position:position + 2] == b"\xff\xe0":
+        position += 2 + int.from_bytes(data[position + 2:position + 4], "big")
+    return data[:position] + b"".join(segments) + data[position:]
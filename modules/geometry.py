@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 几何变换模块
+
+将剪裁、缩放等几何操作统一描述为“原图上的源区域 + 输出尺寸”，
+多个操作可以合并为一个，最终只调用一次带box参数的resize完成剪裁和缩放，
+不产生中间图片。支持选择重采样滤波器和reducing_gap预缩小，
+JPEG图片还会在解码阶段按比例缩小（draft模式）。
+
+带EXIF方向的图片不必先整张旋转：源区域换算到原始方向的坐标系，
+缩小后只对输出图片做一次转置。
+"""
+
+import math
+from PIL import Image
+
+from .image_io import apply_orientation, orientation_swaps_axes
+
+
+# 重采样滤波器名称与Pillow常量的对应关系
+RESAMPLE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "box": Image.BOX,
+    "bilinear": Image.BILINEAR,
+    "hamming": Image.HAMMING,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS,
+}
+
+
+def get_resample_filter(resample):
+    """
+    获取重采样滤波器
+
+    参数:
+        resample (str | int): 滤波器名称（如'lanczos'、'bicubic'）或Pillow常量
+
+    返回:
+        int: Pillow重采样滤波器常量
+    """
+    if isinstance(resample, str):
+        if resample.lower() not in RESAMPLE_FILTERS:
+            raise ValueError(f"不支持的重采样滤波器: {resample}，可用滤波器: {', '.join(RESAMPLE_FILTERS)}")
+        return RESAMPLE_FILTERS[resample.lower()]
+    return resample
+
+
+class GeometryPlan:
+    """几何变换计划类（原图上的源区域和输出尺寸）"""
+
+    def __init__(self, box, size):
+        """
+        初始化几何变换计划
+
+        参数:
+            box (tuple): 原图上的源区域 (左, 上, 右, 下)，可以是小数
+            size (tuple): 输出尺寸 (宽, 高)
+        """
+        self.box = tuple(box)
+        self.size = tuple(size)
+
+    def __repr__(self):
+        return f"GeometryPlan(box={self.box}, size={self.size})"
+
+    def then(self, inner):
+        """
+        在本计划的输出上继续执行另一个计划，合并为一个计划
+
+        参数:
+            inner (GeometryPlan): 以本计划输出为坐标系的计划
+
+        返回:
+            GeometryPlan: 合并后以原图为坐标系的计划
+        """
+        scale_x = (self.box[2] - self.box[0]) / self.size[0]
+        scale_y = (self.box[3] - self.box[1]) / self.size[1]
+        box = (
+            self.box[0] + inner.box[0] * scale_x,
+            self.box[1] + inner.box[1] * scale_y,
+            self.box[0] + inner.box[2] * scale_x,
+            self.box[1] + inner.box[3] * scale_y,
+        )
+        return GeometryPlan(box, inner.size)
+
+
+def _check_size(width, height):
+    """
+    检查宽高是否有效
+
+    参数:
+        width (int): 目标宽度
+        height (int): 目标高度
+    """
+    if width <= 0 or height <= 0:
+        raise ValueError(f"宽度和高度必须大于0，当前值: 宽度={width}, 高度={height}")
+
+
+def plan_crop(size, width, height, keep_aspect_ratio=True):
+    """
+    计算剪裁操作：保持宽高比时先居中剪裁到目标宽高比，再缩放到目标尺寸
+
+    参数:
+        size (tuple): 当前图片尺寸 (宽, 高)
+        width (int): 目标宽度
+        height (int): 目标高度
+        keep_aspect_ratio (bool): 是否保持宽高比
+
+    返回:
+        GeometryPlan: 几何变换计划
+    """
+    _check_size(width, height)
+    image_width, image_height = size
+    box = (0, 0, image_width, image_height)
+
+    if keep_aspect_ratio:
+        # 计算原始宽高比
+        original_ratio = image_width / image_height
+        target_ratio = width / height
+
+        if original_ratio > target_ratio:
+            # 原图更宽，需要裁剪宽度
+            new_width = int(image_height * target_ratio)
+            left = (image_width - new_width) // 2
+            box = (left, 0, left + new_width, image_height)
+        else:
+            # 原图更高，需要裁剪高度
+            new_height = int(image_width / target_ratio)
+            top = (image_height - new_height) // 2
+            box = (0, top, image_width, top + new_height)
+
+    return GeometryPlan(box, (width, height))
+
+
+def plan_resize(size, width, height, keep_aspect_ratio=True):
+    """
+    计算缩放操作：保持宽高比时缩放到目标区域内
+
+    参数:
+        size (tuple): 当前图片尺寸 (宽, 高)
+        width (int): 目标宽度
+        height (int): 目标高度
+        keep_aspect_ratio (bool): 是否保持宽高比
+
+    返回:
+        GeometryPlan: 几何变换计划
+    """
+    _check_size(width, height)
+    image_width, image_height = size
+    box = (0, 0, image_width, image_height)
+
+    if keep_aspect_ratio:
+        # 计算原始宽高比
+        original_ratio = image_width / image_height
+        target_ratio = width / height
+
+        if original_ratio > target_ratio:
+            # 原图更宽，以宽度为基准调整高度
+            return GeometryPlan(box, (width, max(1, int(width / original_ratio))))
+        # 原图更高，以高度为基准调整宽度
+        return GeometryPlan(box, (max(1, int(height * original_ratio)), height))
+
+    return GeometryPlan(box, (width, height))
+
+
+def _draft_for_plan(image, plan, reducing_gap):
+    """
+    JPEG图片在解码阶段按比例缩小（只在图片尚未解码时有效）
+
+    参数:
+        image (PIL.Image): 输入图片
+        plan (GeometryPlan): 几何变换计划
+        reducing_gap (float): 预缩小系数
+
+    返回:
+        GeometryPlan: 换算到缩小后图片坐标系的计划
+    """
+    # 已解码的图片没有待解码的数据块，无法再按比例解码
+    if getattr(image, "format", None) != "JPEG" or not getattr(image, "tile", None):
+        return plan
+
+    # 解码后源区域至少保留reducing_gap倍的输出分辨率
+    scale = min(
+        (plan.box[2] - plan.box[0]) / plan.size[0],
+        (plan.box[3] - plan.box[1]) / plan.size[1],
+    ) / reducing_gap
+    if scale < 2:
+        return plan
+
+    original_size = image.size
+    requested = (math.ceil(original_size[0] / scale), math.ceil(original_size[1] / scale))
+    image.draft(image.mode, requested)
+    if image.size == original_size:
+        return plan
+
+    # 将源区域换算到缩小后的坐标系
+    scale_x = image.size[0] / original_size[0]
+    scale_y = image.size[1] / original_size[1]
+    box = (plan.box[0] * scale_x, plan.box[1] * scale_y, plan.box[2] * scale_x, plan.box[3] * scale_y)
+    return GeometryPlan(box, plan.size)
+
+
+def _raw_plan(plan, raw_size, orientation):
+    """
+    将摆正后坐标系中的计划换算到原始方向的坐标系
+
+    参数:
+        plan (GeometryPlan): 以摆正后图片为坐标系的计划
+        raw_size (tuple): 原始方向的图片尺寸 (宽, 高)
+        orientation (int): EXIF方向值
+
+    返回:
+        GeometryPlan: 以原始方向图片为坐标系的计划（输出尺寸为转置前的尺寸）
+    """
+    if orientation not in range(2, 9):
+        return plan
+
+    raw_width, raw_height = raw_size
+    left, top, right, bottom = plan.box
+
+    # 摆正后的坐标 (x, y) 对应的原始坐标
+    mappings = {
+        2: lambda x, y: (raw_width - x, y),
+        3: lambda x, y: (raw_width - x, raw_height - y),
+        4: lambda x, y: (x, raw_height - y),
+        5: lambda x, y: (y, x),
+        6: lambda x, y: (y, raw_height - x),
+        7: lambda x, y: (raw_width - y, raw_height - x),
+        8: lambda x, y: (raw_width - y, x),
+    }
+    corners = [mappings[orientation](x, y) for x, y in ((left, top), (right, bottom))]
+    xs = [corner[0] for corner in corners]
+    ys = [corner[1] for corner in corners]
+    box = (min(xs), min(ys), max(xs), max(ys))
+
+    size = plan.size
+    if orientation_swaps_axes(orientation):
+        size = (size[1], size[0])
+    return GeometryPlan(box, size)
+
+
+def apply_plan(image, plan, resample="lanczos", reducing_gap=None, orientation=1):
+    """
+    执行几何变换计划（剪裁和缩放一次完成，只分配一次输出图片）
+
+    参数:
+        image (PIL.Image): 输入图片
+        plan (GeometryPlan): 几何变换计划
+        resample (str | int): 重采样滤波器名称或Pillow常量
+        reducing_gap (float): 预缩小系数。设置后先用整数倍快速缩小（JPEG在解码阶段缩小），
+            再做精细重采样，速度更快；为None时直接精细重采样，质量最好
+        orientation (int): 输入图片的EXIF方向值。不为1时image是原始方向的图片，
+            plan以摆正后的图片为坐标系，缩小后再摆正输出图片
+
+    返回:
+        PIL.Image: 处理后的图片
+    """
+    resample = get_resample_filter(resample)
+    plan = _raw_plan(plan, image.size, orientation)
+
+    if reducing_gap is not None:
+        if reducing_gap < 1:
+            raise ValueError(f"reducing_gap必须不小于1，当前值: {reducing_gap}")
+        plan = _draft_for_plan(image, plan, reducing_gap)
+
+    result = image.resize(plan.size, resample, box=plan.box, reducing_gap=reducing_gap)
+    return apply_orientation(result, orientation)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 图片输入输出模块
+
+统一图片的加载和编码。除文件路径外，还支持字节数据、memoryview、内存映射文件、
+文件对象以及已解码的PIL图片和NumPy数组，处理结果也可以直接编码为字节返回，
+便于服务集成和链式处理时省去临时文件。
+
+加载时按EXIF方向标签摆正图片（几何变换可以推迟到缩小之后再旋转），
+保存和编码时保留ICC色彩配置和选定的EXIF标签。
+"""
+
+import io
+import os
+import mmap
+import time
+
+import numpy as np
+from PIL import Image
+
+from .encoder import profile_params, encode_stats
+
+
+# 可直接作为内存缓冲区读取的输入类型
+_BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+# EXIF方向标签及各方向值对应的摆正操作
+ORIENTATION_TAG = 0x0112
+_ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+# 输出时保留的EXIF标签（其余标签如缩略图、方向、GPS不保留）
+PRESERVED_EXIF_TAGS = (
+    0x010F,  # Make 相机厂商
+    0x0110,  # Model 相机型号
+    0x0131,  # Software 软件
+    0x0132,  # DateTime 修改时间
+    0x013B,  # Artist 作者
+    0x8298,  # Copyright 版权
+)
+EXIF_IFD_TAG = 0x8769
+PRESERVED_EXIF_IFD_TAGS = (
+    0x9003,  # DateTimeOriginal 拍摄时间
+    0x9004,  # DateTimeDigitized 数字化时间
+    0x9010,  # OffsetTime 时区
+    0x9011,  # OffsetTimeOriginal 拍摄时区
+)
+
+# 支持写入ICC配置和EXIF的格式
+_METADATA_FORMATS = ("JPEG", "PNG", "WEBP", "TIFF")
+
+
+class _BufferReader(io.RawIOBase):
+    """只读内存缓冲区文件对象类（按需读取，不复制整个缓冲区）"""
+
+    def __init__(self, buffer):
+        """
+        初始化缓冲区读取器
+
+        参数:
+            buffer: 支持缓冲区协议的对象（bytes、memoryview、mmap等）
+        """
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def __repr__(self):
+        # 用于错误信息中描述输入来源
+        return f"<内存图片数据 {len(self._view)} 字节>"
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        # 从当前位置复制数据到目标缓冲区
+        size = min(len(target), len(self._view) - self._position)
+        if size <= 0:
+            return 0
+        target[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"无效的whence参数: {whence}")
+        if position < 0:
+            raise ValueError(f"无效的读取位置: {position}")
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        # 释放对底层缓冲区的引用，内存映射文件才能被关闭
+        self._view.release()
+        super().close()
+
+
+def check_source(source):
+    """
+    检查图片输入是否有效（文件路径必须存在）
+
+    参数:
+        source: 图片输入，可以是文件路径、字节数据、memoryview、mmap、
+            文件对象、PIL.Image或NumPy数组
+    """
+    if isinstance(source, (str, os.PathLike)):
+        # 检查图片是否存在
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"图片文件不存在: {source}")
+    elif not (isinstance(source, (Image.Image, np.ndarray) + _BUFFER_TYPES) or hasattr(source, "read")):
+        raise TypeError(f"不支持的图片输入类型: {type(source).__name__}")
+
+
+def load_image(source, apply_orientation=True):
+    """
+    加载图片
+
+    参数:
+        source: 图片输入，可以是文件路径、字节数据、memoryview、mmap、
+            文件对象、PIL.Image或NumPy数组
+        apply_orientation (bool): 是否按EXIF方向标签摆正图片。为False时返回原始方向的图片，
+            由调用方在缩小后再摆正（见get_orientation和geometry.apply_plan）
+
+    返回:
+        PIL.Image: 图片对象（已解码且无需摆正的输入直接返回，不做复制）
+    """
+    check_source(source)
+
+    if isinstance(source, Image.Image):
+        image = source
+    elif isinstance(source, np.ndarray):
+        return Image.fromarray(source)
+    elif isinstance(source, _BUFFER_TYPES):
+        # 直接从内存缓冲区解码，不写临时文件
+        image = Image.open(_BufferReader(source))
+    else:
+        # 文件路径或文件对象
+        image = Image.open(source)
+
+    if apply_orientation:
+        image = normalize_orientation(image)
+    return image
+
+
+def get_orientation(image):
+    """
+    获取图片的EXIF方向（只读取文件头，不解码像素）
+
+    参数:
+        image (PIL.Image): 图片对象
+
+    返回:
+        int: 方向值1-8，没有方向信息时为1
+    """
+    try:
+        orientation = image.getexif().get(ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+    return orientation if orientation in _ORIENTATION_TRANSPOSE else 1
+
+
+def orientation_swaps_axes(orientation):
+    """
+    判断方向是否需要交换宽高（旋转90度或270度）
+
+    参数:
+        orientation (int): EXIF方向值
+
+    返回:
+        bool: 需要交换宽高时返回True
+    """
+    return orientation in (5, 6, 7, 8)
+
+
+def oriented_size(image, orientation=None):
+    """
+    获取摆正后的图片尺寸（不解码像素）
+
+    参数:
+        image (PIL.Image): 图片对象
+        orientation (int): EXIF方向值，为None时从图片中读取
+
+    返回:
+        tuple: 摆正后的尺寸 (宽, 高)
+    """
+    if orientation is None:
+        orientation = get_orientation(image)
+    if orientation_swaps_axes(orientation):
+        return image.height, image.width
+    return image.size
+
+
+def apply_orientation(image, orientation):
+    """
+    按给定的方向摆正图片，并清除结果中的方向标签
+
+    参数:
+        image (PIL.Image): 原始方向的图片（通常已经缩小）
+        orientation (int): EXIF方向值
+
+    返回:
+        PIL.Image: 摆正后的图片
+    """
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    if method is None:
+        return image
+
+    transposed = image.transpose(method)
+    _clear_orientation(transposed)
+    return transposed
+
+
+def normalize_orientation(image):
+    """
+    按EXIF方向标签摆正图片
+
+    参数:
+        image (PIL.Image): 图片对象
+
+    返回:
+        PIL.Image: 摆正后的图片；无需摆正时返回原图
+    """
+    return apply_orientation(image, get_orientation(image))
+
+
+def _clear_orientation(image):
+    """
+    清除图片信息中的EXIF方向标签，避免再次加载时重复旋转
+
+    参数:
+        image (PIL.Image): 图片对象（原地修改info）
+    """
+    if "exif" not in image.info:
+        return
+    exif = image.getexif()
+    if ORIENTATION_TAG in exif:
+        del exif[ORIENTATION_TAG]
+        image.info["exif"] = exif.tobytes()
+
+
+def _preserved_exif(image):
+    """
+    提取需要保留的EXIF标签
+
+    参数:
+        image (PIL.Image): 图片对象
+
+    返回:
+        bytes: 编码后的EXIF数据，没有需要保留的标签时为None
+    """
+    if "exif" not in image.info:
+        return None
+
+    try:
+        exif = image.getexif()
+        preserved = Image.Exif()
+        for tag in PRESERVED_EXIF_TAGS:
+            if tag in exif:
+                preserved[tag] = exif[tag]
+
+        exif_ifd = exif.get_ifd(EXIF_IFD_TAG)
+        sub_tags = {tag: exif_ifd[tag] for tag in PRESERVED_EXIF_IFD_TAGS if tag in exif_ifd}
+        if sub_tags:
+            preserved[EXIF_IFD_TAG] = sub_tags
+    except Exception:
+        # EXIF数据损坏时不保留
+        return None
+
+    return preserved.tobytes() if len(preserved) else None
+
+
+def metadata_params(image, format):
+    """
+    获取保存图片时需要传递的元数据参数（ICC色彩配置和选定的EXIF标签）
+
+    参数:
+        image (PIL.Image): 图片对象
+        format (str): 目标格式
+
+    返回:
+        dict: 传递给Image.save的参数
+    """
+    params = {}
+    if format.upper() not in _METADATA_FORMATS:
+        return params
+
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        params["icc_profile"] = icc_profile
+
+    exif = _preserved_exif(image)
+    if exif:
+        params["exif"] = exif
+
+    return params
+
+
+def copy_metadata(source, target):
+    """
+    将源图片的ICC色彩配置和EXIF信息复制到目标图片（用于生成新图片的操作，如去背景）
+
+    参数:
+        source (PIL.Image): 源图片
+        target (PIL.Image): 目标图片（原地修改info）
+
+    返回:
+        PIL.Image: 目标图片
+    """
+    for key in ("icc_profile", "exif"):
+        if key in source.info and key not in target.info:
+            target.info[key] = source.info[key]
+    return target
+
+
+def _prepare_save(image, format, params, profile=None):
+    """
+    整理保存参数：统一格式名称，JPEG去除透明通道，补充元数据和编码配置参数
+
+    参数:
+        image (PIL.Image): 图片对象
+        format (str): 目标格式
+        params (dict): 调用方传入的编码参数（优先于元数据和编码配置参数）
+        profile (str): 编码配置名称，为None时不添加配置参数
+
+    返回:
+        tuple: (图片对象, 格式, 编码参数)
+    """
+    format = format.upper()
+    if format == "JPG":
+        format = "JPEG"
+
+    # 如果目标格式是JPEG且图片有透明通道，需要转换为RGB模式
+    if format == "JPEG" and image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGB")
+
+    return image, format, {**metadata_params(image, format), **profile_params(profile, format), **params}
+
+
+def encode_image(image, format="PNG", profile=None, **params):
+    """
+    将图片编码为字节数据（保留ICC色彩配置和选定的EXIF标签）
+
+    参数:
+        image (PIL.Image): 图片对象
+        format (str): 目标格式，如'PNG'、'JPEG'等
+        profile (str): 编码配置（fast、balanced、smallest），设置后记录编码耗时和大小
+        **params: 传递给编码器的参数，如quality
+
+    返回:
+        bytes: 编码后的图片数据
+    """
+    image, format, params = _prepare_save(image, format, params, profile)
+
+    start_time = time.perf_counter()
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    if profile is not None:
+        encode_stats.record(profile, format, time.perf_counter() - start_time, buffer.tell())
+    return buffer.getvalue()
+
+
+def save_image(image, output_path, format=None, profile=None, **params):
+    """
+    保存图片到文件（保留ICC色彩配置和选定的EXIF标签）
+
+    参数:
+        image (PIL.Image): 图片对象
+        output_path (str): 输出路径
+        format (str): 目标格式，为None时根据扩展名确定
+        profile (str): 编码配置（fast、balanced、smallest），设置后记录编码耗时和大小
+        **params: 传递给编码器的参数，如quality
+    """
+    if format is None:
+        extension = os.path.splitext(output_path)[1].lower()
+        format = Image.registered_extensions().get(extension, "PNG")
+
+    image, format, params = _prepare_save(image, format, params, profile)
+
+    start_time = time.perf_counter()
+    image.save(output_path, format=format, **params)
+    if profile is not None:
+        encode_stats.record(profile, format, time.perf_counter() - start_time, os.path.getsize(output_path))
@@ -5,12 +5,55 @@
 刘东升的图片处理工具 - 图像处理模块
 
 实现图像剪裁与缩放功能，包括按照指定尺寸剪裁和按照目标文件大小缩放图片。
+已经满足要求的图片和按MCU对齐的JPEG剪裁直接沿用或无损处理原始数据，不重新编码。
 """
 
-import os
 import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
+from .animation import AnimatedImage, is_animated, map_frames
+from .batch import list_image_files, run_batch
+from .encoder import DEFAULT_PROFILE, profile_params
+from .fast_path import (
+    passthrough_for_filesize, is_identity_plan, lossless_jpeg_crop, read_source_bytes,
+    mark_passthrough, get_passthrough, result_data, write_result,
+)
+from .geometry import plan_crop, plan_resize, apply_plan, get_resample_filter
+from .image_io import check_source, load_image, encode_image, save_image, get_orientation, oriented_size
+from .io_overlap import Prefetcher, WriteBehind
+from .report import JobReport
+from .shm_transport import FrameHandle, FrameRing, init_worker, worker_ring
+
+
+def _process_in_worker(process_func, source, kwargs):
+    """
+    在子进程中运行处理函数（batch_process多进程处理时使用）
+
+    普通图片结果写入共享内存环形缓冲区，只把句柄返回主进程，像素数据不经过pickle。
+
+    参数:
+        process_func (callable): 处理函数
+        source (str | bytes): 图片路径或字节数据
+        kwargs (dict): 传递给处理函数的参数
+
+    返回:
+        FrameHandle | PIL.Image | AnimatedImage | bytes: 共享内存中结果的句柄，
+            无法放入缓冲区的结果原样返回
+    """
+    result = process_func(source, **kwargs)
+    if isinstance(result, Image.Image):
+        passthrough = get_passthrough(result)
+        if passthrough is not None:
+            # 原始数据标记不随pickle传递，直接返回原始数据
+            return passthrough[0]
+        ring = worker_ring()
+        if ring is not None and ring.fits_image(result):
+            return ring.put_image(result)
+    return result
+
 
 class ImageProcessor:
     """图像处理类"""
@@ -19,120 +62,182 @@ class ImageProcessor:
         """初始化图像处理器"""
         # 支持的图片格式
         self.supported_formats = [".jpg", ".jpeg", ".png", ".bmp", ".gif"]
+        
+        # 处理动画时并行处理的帧数
+        self.frame_workers = 4
+        
+        # 最近一次批量处理的报告（JobReport）
+        self.last_report = None
     
-    def crop_image(self, image_path, width, height, keep_aspect_ratio=True):
+    def __getstate__(self):
+        # 多进程处理时处理函数（本实例的方法）传给子进程，报告不传递
+        state = self.__dict__.copy()
+        state["last_report"] = None
+        return state
+    
+    def crop_image(self, image_path, width, height, keep_aspect_ratio=True, output_format=None,
+                   resample="lanczos", reducing_gap=None, all_frames=False):
         """
         剪裁图片
         
+        剪裁和缩放通过一次带源区域的重采样完成，不产生中间图片。
+        
         参数:
-            image_path (str): 输入图片路径
+            image_path (str | bytes | file | PIL.Image | numpy.ndarray): 输入图片路径，
+                也可以是字节数据、memoryview、mmap、文件对象或已解码的图片
             width (int): 目标宽度
             height (int): 目标高度
             keep_aspect_ratio (bool): 是否保持宽高比
+            output_format (str): 输出格式，如'PNG'、'JPEG'等。设置后返回编码后的字节数据
+            resample (str): 重采样滤波器，如'lanczos'、'bicubic'、'bilinear'
+            reducing_gap (float): 预缩小系数，设置后先快速整数倍缩小再精细重采样（大幅缩小时更快）
+            all_frames (bool): 是否处理动画的所有帧。为False时只处理第一帧
             
         返回:
-            PIL.Image: 处理后的图片对象
+            PIL.Image | AnimatedImage | bytes: 处理后的图片对象（处理所有帧的动画为AnimatedImage）；
+                设置output_format时为编码后的字节数据
         """
-        # 检查图片是否存在
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"图片文件不存在: {image_path}")
-        
-        # 检查宽高是否有效
-        if width <= 0 or height <= 0:
-            raise ValueError(f"宽度和高度必须大于0，当前值: 宽度={width}, 高度={height}")
+        return self._transform(image_path, plan_crop, width, height, keep_aspect_ratio,
+                               output_format, resample, reducing_gap, all_frames)
+    
+    def resize_image(self, image_path, width, height, keep_aspect_ratio=True, output_format=None,
+                     resample="lanczos", reducing_gap=None, all_frames=False):
+        """
+        调整图片大小
         
-        try:
-            # 加载图片
-            image = Image.open(image_path)
-            
-            if keep_aspect_ratio:
-                # 计算原始宽高比
-                original_ratio = image.width / image.height
-                target_ratio = width / height
-                
-                if original_ratio > target_ratio:
-                    # 原图更宽，需要裁剪宽度
-                    new_width = int(image.height * target_ratio)
-                    left = (image.width - new_width) // 2
-                    right = left + new_width
-                    image = image.crop((left, 0, right, image.height))
-                else:
-                    # 原图更高，需要裁剪高度
-                    new_height = int(image.width / target_ratio)
-                    top = (image.height - new_height) // 2
-                    bottom = top + new_height
-                    image = image.crop((0, top, image.width, bottom))
-            
-            # 调整到目标尺寸
-            resized_image = image.resize((width, height), Image.LANCZOS)
-            
-            return resized_image
+        参数:
+            image_path (str | bytes | file | PIL.Image | numpy.ndarray): 输入图片路径，
+                也可以是字节数据、memoryview、mmap、文件对象或已解码的图片
+            width (int): 目标宽度
+            height (int): 目标高度
+            keep_aspect_ratio (bool): 是否保持宽高比
+            output_format (str): 输出格式，如'PNG'、'JPEG'等。设置后返回编码后的字节数据
+            resample (str): 重采样滤波器，如'lanczos'、'bicubic'、'bilinear'
+            reducing_gap (float): 预缩小系数，设置后先快速整数倍缩小再精细重采样（大幅缩小时更快）
+            all_frames (bool): 是否处理动画的所有帧。为False时只处理第一帧
             
-        except Exception as e:
-            raise RuntimeError(f"处理图片时出错: {str(e)}")
+        返回:
+            PIL.Image | AnimatedImage | bytes: 处理后的图片对象（处理所有帧的动画为AnimatedImage）；
+                设置output_format时为编码后的字节数据
+        """
+        return self._transform(image_path, plan_resize, width, height, keep_aspect_ratio,
+                               output_format, resample, reducing_gap, all_frames)
     
-    def resize_image(self, image_path, width, height, keep_aspect_ratio=True):
+    def _transform(self, image_path, plan_func, width, height, keep_aspect_ratio, output_format,
+                   resample, reducing_gap, all_frames=False):
         """
-        调整图片大小
+        按几何变换计划处理图片
         
         参数:
-            image_path (str): 输入图片路径
+            image_path: 图片输入
+            plan_func (callable): 计算几何变换计划的函数（plan_crop或plan_resize）
             width (int): 目标宽度
             height (int): 目标高度
             keep_aspect_ratio (bool): 是否保持宽高比
+            output_format (str): 输出格式，为None时返回图片对象
+            resample (str): 重采样滤波器
+            reducing_gap (float): 预缩小系数
+            all_frames (bool): 是否处理动画的所有帧
             
         返回:
-            PIL.Image: 处理后的图片对象
+            PIL.Image | AnimatedImage | bytes: 处理后的图片对象或编码后的字节数据
         """
         # 检查图片是否存在
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"图片文件不存在: {image_path}")
+        check_source(image_path)
         
         # 检查宽高是否有效
         if width <= 0 or height <= 0:
             raise ValueError(f"宽度和高度必须大于0，当前值: 宽度={width}, 高度={height}")
         
+        # 检查重采样滤波器是否有效
+        get_resample_filter(resample)
+        
         try:
-            # 加载图片
-            image = Image.open(image_path)
+            # 加载图片（只读取文件头），按EXIF方向摆正推迟到缩小之后
+            image = load_image(image_path, apply_orientation=False)
+            orientation = get_orientation(image)
             
-            if keep_aspect_ratio:
-                # 计算原始宽高比
-                original_ratio = image.width / image.height
-                target_ratio = width / height
-                
-                if original_ratio > target_ratio:
-                    # 原图更宽，以宽度为基准调整高度
-                    new_height = int(width / original_ratio)
-                    resized_image = image.resize((width, new_height), Image.LANCZOS)
-                else:
-                    # 原图更高，以高度为基准调整宽度
-                    new_width = int(height * original_ratio)
-                    resized_image = image.resize((new_width, height), Image.LANCZOS)
-            else:
-                # 直接调整到目标尺寸
-                resized_image = image.resize((width, height), Image.LANCZOS)
+            # 计算源区域和目标尺寸，一次重采样完成
+            plan = plan_func(oriented_size(image, orientation), width, height, keep_aspect_ratio)
+            
+            # 动画逐帧并行处理，所有帧使用同一个几何变换计划
+            if all_frames and is_animated(image):
+                animation = map_frames(
+                    image, lambda frame: apply_plan(frame, plan, resample, reducing_gap, orientation),
+                    self.frame_workers
+                )
+                return animation.encode(output_format) if output_format is not None else animation
+            
+            # 不改变图片或可以无损剪裁时，直接使用原始数据（动画只取第一帧，不能沿用整个文件）
+            if orientation == 1 and not is_animated(image):
+                result = self._fast_path(image_path, image, plan, output_format)
+                if result is not None:
+                    return result
+            
+            resized_image = apply_plan(image, plan, resample, reducing_gap, orientation)
+            
+            # 需要时直接返回编码后的字节数据
+            if output_format is not None:
+                return encode_image(resized_image, output_format)
             
             return resized_image
             
         except Exception as e:
             raise RuntimeError(f"处理图片时出错: {str(e)}")
     
-    def resize_to_filesize(self, image_path, target_size_kb, quality=85):
+    def _fast_path(self, image_path, image, plan, output_format):
+        """
+        尝试不经解码和重新编码完成几何变换
+        
+        参数:
+            image_path: 图片输入
+            image (PIL.Image): 已打开（尚未解码）的图片
+            plan (GeometryPlan): 几何变换计划
+            output_format (str): 输出格式，为None时返回图片对象
+            
+        返回:
+            PIL.Image | bytes: 处理结果（图片对象带有原始数据标记）；无法使用快速通道时为None
+        """
+        if output_format is not None:
+            output_format = output_format.upper()
+            if output_format == "JPG":
+                output_format = "JPEG"
+        
+        if is_identity_plan(plan, image.size) and output_format in (None, image.format):
+            # 图片尺寸已经符合要求，原样返回
+            data = read_source_bytes(image_path)
+            if data is None:
+                return None
+            return data if output_format else mark_passthrough(image, data, image.format)
+        
+        if output_format in (None, "JPEG"):
+            # 按MCU对齐的纯剪裁在DCT域中完成
+            data = lossless_jpeg_crop(image_path, image, plan)
+            if data is None:
+                return None
+            return data if output_format else mark_passthrough(Image.open(io.BytesIO(data)), data, "JPEG")
+        
+        return None
+    
+    def resize_to_filesize(self, image_path, target_size_kb, quality=85, return_bytes=False,
+                           profile=DEFAULT_PROFILE):
         """
         将图片缩放到指定文件大小
         
         参数:
-            image_path (str): 输入图片路径
+            image_path (str | bytes | file | PIL.Image | numpy.ndarray): 输入图片路径，
+                也可以是字节数据、memoryview、mmap、文件对象或已解码的图片
             target_size_kb (int): 目标文件大小（KB）
             quality (int): 初始质量设置（1-100）
+            return_bytes (bool): 是否返回编码后的字节数据（即满足大小要求的那次编码结果，无需重新编码）
+            profile (str): 编码配置（fast、balanced、smallest）。压缩率更高的配置在同样质量下文件更小，
+                可以少降质量、少缩小尺寸，但编码更慢；各配置的编码耗时见encoder.encode_stats
             
         返回:
-            PIL.Image: 处理后的图片对象
+            PIL.Image | bytes: 处理后的图片对象；return_bytes为True时为编码后的字节数据
         """
         # 检查图片是否存在
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"图片文件不存在: {image_path}")
+        check_source(image_path)
         
         # 检查目标大小是否有效
         if target_size_kb <= 0:
@@ -142,9 +247,19 @@ class ImageProcessor:
         if not 1 <= quality <= 100:
             raise ValueError(f"质量设置必须在1-100之间，当前值: {quality}")
         
+        # 检查编码配置是否有效
+        profile_params(profile, "JPEG")
+        
         try:
+            # 源文件已经满足大小和格式要求时，直接沿用原始数据
+            passthrough = passthrough_for_filesize(image_path, target_size_kb)
+            if passthrough is not None:
+                if return_bytes:
+                    return passthrough[0]
+                return mark_passthrough(load_image(image_path), *passthrough)
+            
             # 加载图片
-            image = Image.open(image_path)
+            image = load_image(image_path)
             original_format = image.format
             
             # 如果是PNG且有透明通道，保持PNG格式
@@ -160,14 +275,13 @@ class ImageProcessor:
             # 目标大小（字节）
             target_size_bytes = target_size_kb * 1024
             
-            # 获取原始图片大小
-            buffer = io.BytesIO()
-            image.save(buffer, format=output_format, quality=quality)
-            current_size = buffer.getbuffer().nbytes
+            # 获取原始图片大小（编码时保留的元数据也计入文件大小）
+            data = encode_image(image, output_format, profile, quality=quality)
+            current_size = len(data)
             
             # 如果原始图片已经小于目标大小，直接返回
             if current_size <= target_size_bytes:
-                return image
+                return data if return_bytes else image
             
             # 二分查找合适的尺寸和质量
             min_dimension = 100  # 最小尺寸限制
@@ -180,9 +294,8 @@ class ImageProcessor:
             # 首先尝试降低质量
             while current_size > target_size_bytes and current_quality > min_quality:
                 current_quality -= 5
-                buffer = io.BytesIO()
-                image.save(buffer, format=output_format, quality=current_quality)
-                current_size = buffer.getbuffer().nbytes
+                data = encode_image(image, output_format, profile, quality=current_quality)
+                current_size = len(data)
             
             # 如果降低质量后仍然超过目标大小，开始降低尺寸
             while current_size > target_size_bytes and current_dimension > min_dimension:
@@ -201,20 +314,26 @@ class ImageProcessor:
                 resized_image = image.resize((new_width, new_height), Image.LANCZOS)
                 
                 # 检查新大小
-                buffer = io.BytesIO()
-                resized_image.save(buffer, format=output_format, quality=current_quality)
-                current_size = buffer.getbuffer().nbytes
+                data = encode_image(resized_image, output_format, profile, quality=current_quality)
+                current_size = len(data)
                 
                 # 更新当前尺寸和图片
                 current_dimension = new_dimension
                 image = resized_image
             
+            # 最后一次编码的结果即为返回图片的编码数据
+            if return_bytes:
+                return data
+            
             return image
             
         except Exception as e:
             raise RuntimeError(f"处理图片时出错: {str(e)}")
     
-    def batch_process(self, input_dir, output_dir, process_func, **kwargs):
+    def batch_process(self, input_dir, output_dir, process_func, max_workers=1,
+                      progress_callback=None, control=None, scheduler=None,
+                      prefetch=0, prefetch_bytes=64 * 1024 * 1024, write_workers=0,
+                      processes=0, frame_bytes=96 * 1024 * 1024, **kwargs):
         """
         批量处理图片
         
@@ -222,52 +341,110 @@ class ImageProcessor:
             input_dir (str): 输入图片目录
             output_dir (str): 输出图片目录
             process_func (callable): 处理函数
-            **kwargs: 传递给处理函数的参数
+            max_workers (int): 并行线程数
+            progress_callback (callable): 进度回调函数，参数为BatchProgress
+            control (BatchControl): 暂停、继续和取消控制
+            scheduler (CostScheduler): 调度器，设置后大图片优先处理并受内存上限限制
+            prefetch (int): 提前读取的文件数，为0时不预读。预读时处理函数收到的是文件的字节数据
+                （crop_image、resize_image、resize_to_filesize均支持）
+            prefetch_bytes (int): 已读取但尚未处理的数据上限（字节）
+            write_workers (int): 后台写出线程数，为0时在处理线程中直接保存。后台写出时结果先编码为
+                字节数据，写入临时文件后再改名为输出文件，写出完成才计为处理成功
+            processes (int): 子进程数，为0时在本进程的线程中处理。多进程处理时解码和处理在子进程中
+                进行，结果经共享内存环形缓冲区（每个子进程两个槽位）交给主进程编码和保存，
+                处理函数和参数需要可以pickle（如本实例的方法）
+            frame_bytes (int): 环形缓冲区每个槽位的字节数，超过该大小的结果经pickle传递
+            **kwargs: 传递给处理函数的参数（如all_frames=True处理动画的所有帧）
             
         返回:
-            int: 成功处理的图片数量
+            int: 成功处理的图片数量（每个文件的状态和耗时见self.last_report）
         """
-        # 检查输入目录是否存在
-        if not os.path.exists(input_dir) or not os.path.isdir(input_dir):
-            raise FileNotFoundError(f"输入目录不存在: {input_dir}")
+        # 获取所有图片文件
+        image_files = list_image_files(input_dir, self.supported_formats)
         
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
-        # 获取所有图片文件
-        image_files = [
-            f for f in os.listdir(input_dir) 
-            if os.path.isfile(os.path.join(input_dir, f)) and 
-            any(f.lower().endswith(ext) for ext in self.supported_formats)
-        ]
+        # 处理函数包括读取图片，只分处理和保存两个阶段计时
+        report = JobReport(image_files, stages=("process", "save"))
+        self.last_report = report
         
-        # 如果没有图片文件
-        if not image_files:
-            raise ValueError(f"输入目录中没有支持的图片文件: {input_dir}")
+        # 预读和后台写出，读写存储与处理重叠进行
+        prefetcher = Prefetcher(prefetch, prefetch_bytes, max_workers=min(prefetch, 8)) if prefetch else None
+        writer = WriteBehind(write_workers, max_pending=max(write_workers, max_workers) * 4) if write_workers else None
         
-        # 处理计数
-        processed_count = 0
+        # 多进程处理：子进程解码和处理，结果帧经共享内存传回；每个子进程由一个线程提交任务
+        ring = pool = None
+        if processes:
+            context = multiprocessing.get_context("spawn")
+            ring = FrameRing(slot_count=processes * 2, slot_bytes=frame_bytes, context=context)
+            pool = ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker, initargs=(ring,))
+            max_workers = max(max_workers, processes)
         
-        # 批量处理图片
-        for image_file in image_files:
+        def process_file(image_file):
+            # 构建完整路径
+            input_path = os.path.join(input_dir, image_file)
+            
+            # 构建输出路径
+            output_base = os.path.join(output_dir, os.path.splitext(image_file)[0])
+            
+            # 处理图片
+            with report.stage(image_file, "process"):
+                source = prefetcher.get(input_path) if prefetcher is not None else input_path
+                if pool is None:
+                    processed_image = process_func(source, **kwargs)
+                else:
+                    processed_image = pool.submit(_process_in_worker, process_func, source, kwargs).result()
+            
+            if not isinstance(processed_image, FrameHandle):
+                return save_file(image_file, output_base, processed_image)
+            
+            # 直接使用共享内存中的帧编码，保存后释放槽位
             try:
-                # 构建完整路径
-                input_path = os.path.join(input_dir, image_file)
-                
-                # 构建输出路径
-                output_filename = os.path.splitext(image_file)[0] + ".png"
-                output_path = os.path.join(output_dir, output_filename)
-                
-                # 处理图片
-                processed_image = process_func(input_path, **kwargs)
-                
-                # 保存结果
-                processed_image.save(output_path)
-                
-                # 增加计数
-                processed_count += 1
-                
-            except Exception as e:
-                print(f"处理图片 {image_file} 时出错: {str(e)}")
+                return save_file(image_file, output_base, ring.image(processed_image))
+            finally:
+                ring.release(processed_image)
         
-        return processed_count
\ No newline at end of file
+        def save_file(image_file, output_base, processed_image):
+            # 编码后交给写出线程，写出完成时由run_batch计为完成
+            if writer is not None:
+                with report.stage(image_file, "save"):
+                    data, extension = encode_result(processed_image)
+                report.set_output(image_file, len(data), getattr(processed_image, "size", None))
+                return writer.submit(data, output_base + extension)
+            
+            with report.stage(image_file, "save"):
+                # 沿用原始数据的结果和已编码的结果直接写出，保持原格式
+                output_path = write_result(processed_image, output_base)
+                if output_path is None:
+                    if isinstance(processed_image, AnimatedImage):
+                        # 动画按源格式保存所有帧
+                        output_path = output_base + processed_image.extension
+                        processed_image.save(output_path)
+                    else:
+                        # 保存结果（保留ICC色彩配置和选定的EXIF标签）
+                        output_path = output_base + ".png"
+                        save_image(processed_image, output_path)
+            
+            report.set_output(image_file, os.path.getsize(output_path), getattr(processed_image, "size", None))
+        
+        def encode_result(processed_image):
+            # 与直接保存时相同的格式：沿用原始数据、动画按源格式、其他保存为PNG
+            prepared = result_data(processed_image)
+            if prepared is not None:
+                return prepared
+            if isinstance(processed_image, AnimatedImage):
+                return processed_image.encode(), processed_image.extension
+            return encode_image(processed_image, "PNG"), ".png"
+        
+        # 批量处理图片
+        try:
+            return run_batch(image_files, process_file, max_workers, progress_callback, control,
+                             scheduler=scheduler, item_path=lambda f: os.path.join(input_dir, f),
+                             job_report=report, prefetcher=prefetcher)
+        finally:
+            if writer is not None:
+                writer.close()
+            if pool is not None:
+                pool.shutdown()
+                ring.close()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 读写重叠模块
+
+网络存储（如NFS）上每次打开、读取和写入文件都有几十毫秒的延迟。
+预读在I/O线程中提前读取后续文件的字节数据（按文件数量和字节数限制缓存），
+后台写出把编码好的结果交给I/O线程写入临时文件，完成后原子地改名为目标文件，
+处理线程不再等待存储，读写与解码、编码重叠进行。
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def atomic_write(data, path, fsync=False):
+    """
+    原子地写出文件：先写同目录下的临时文件，完成后改名为目标文件，
+    读取方不会看到写了一半的文件
+
+    参数:
+        data (bytes): 文件内容
+        path (str): 目标路径
+        fsync (bool): 改名前是否将数据同步到磁盘
+    """
+    # 临时文件名按进程和线程区分；用open创建，权限与直接写出的文件一致
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class Prefetcher:
+    """文件预读类"""
+
+    def __init__(self, max_items=8, max_bytes=64 * 1024 * 1024, max_workers=4):
+        """
+        初始化预读
+
+        参数:
+            max_items (int): 最多提前读取（包括正在读取）的文件数
+            max_bytes (int): 已读取但尚未使用的数据达到该字节数时暂停预读
+            max_workers (int): 读取线程数
+        """
+        if max_items < 1:
+            raise ValueError(f"预读文件数必须大于0，当前值: {max_items}")
+        if max_bytes <= 0:
+            raise ValueError(f"预读字节数必须大于0，当前值: {max_bytes}")
+
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+
+        self._paths = []
+        self._next = 0
+        self._futures = {}          # 路径 -> 读取任务
+        self._remaining = set()     # 尚未开始预读的路径
+        self._buffered = 0          # 已读取但尚未使用的字节数
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self, paths):
+        """
+        开始按顺序预读
+
+        参数:
+            paths (list): 按处理顺序排列的文件路径
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._paths = list(paths)
+            self._remaining = set(self._paths)
+            self._next = 0
+            self._fill()
+
+    def _fill(self):
+        """补充预读任务（调用时已持有锁）"""
+        while (self._next < len(self._paths) and len(self._futures) < self.max_items and
+               (self._buffered < self.max_bytes or not self._futures)):
+            path = self._paths[self._next]
+            self._next += 1
+            if path not in self._remaining:
+                # 已被直接读取
+                continue
+            self._remaining.discard(path)
+            self._futures[path] = self._executor.submit(self._read, path)
+
+    def _read(self, path):
+        """在读取线程中读取文件"""
+        with open(path, "rb") as f:
+            data = f.read()
+        with self._lock:
+            self._buffered += len(data)
+        return data
+
+    def get(self, path):
+        """
+        获取文件内容：已预读时直接返回，正在读取时等待，未预读时直接读取
+
+        参数:
+            path (str): 文件路径
+
+        返回:
+            bytes: 文件内容
+        """
+        with self._lock:
+            future = self._futures.pop(path, None)
+            # 之后不再预读该文件
+            self._remaining.discard(path)
+
+        if future is None:
+            with open(path, "rb") as f:
+                return f.read()
+
+        try:
+            data = future.result()
+        finally:
+            with self._lock:
+                if future.exception() is None:
+                    self._buffered -= len(future.result())
+                if self._executor is not None:
+                    self._fill()
+        return data
+
+    def close(self):
+        """停止预读并丢弃尚未使用的数据"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._paths = []
+            self._remaining = set()
+            self._buffered = 0
+        # 取消尚未开始的读取（shutdown的cancel_futures参数需要Python 3.9）
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class WriteBehind:
+    """后台写出类"""
+
+    def __init__(self, max_workers=2, max_pending=16, fsync=False):
+        """
+        初始化后台写出
+
+        参数:
+            max_workers (int): 写出线程数
+            max_pending (int): 等待写出的文件数上限，达到上限时提交会等待（限制缓存的编码结果）
+            fsync (bool): 改名前是否将数据同步到磁盘
+        """
+        if max_workers < 1:
+            raise ValueError(f"写出线程数必须大于0，当前值: {max_workers}")
+        if max_pending < 1:
+            raise ValueError(f"等待写出的文件数上限必须大于0，当前值: {max_pending}")
+
+        self.fsync = fsync
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, data, path):
+        """
+        提交写出任务
+
+        参数:
+            data (bytes): 文件内容
+            path (str): 目标路径
+
+        返回:
+            concurrent.futures.Future: 写出任务，写出失败时包含异常
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(atomic_write, data, path, self.fsync)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self):
+        """等待所有写出任务完成"""
+        self._executor.shutdown(wait=True)
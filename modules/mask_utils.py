@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 蒙版处理模块
+
+提供蒙版相关的通用函数，包括推理前的降采样以及基于引导滤波的边缘感知蒙版上采样。
+"""
+
+import numpy as np
+from PIL import Image
+
+from .image_io import copy_metadata
+
+
+def downscale_for_inference(image, working_size):
+    """
+    将图片缩小到工作分辨率，用于低分辨率推理
+
+    参数:
+        image (PIL.Image): 原始图片
+        working_size (int): 工作分辨率（长边像素数）
+
+    返回:
+        PIL.Image: 缩小后的图片；如果原图长边不超过工作分辨率，则返回原图
+    """
+    # 检查工作分辨率是否有效
+    if working_size <= 0:
+        raise ValueError(f"工作分辨率必须大于0，当前值: {working_size}")
+
+    long_side = max(image.width, image.height)
+    if long_side <= working_size:
+        return image
+
+    # 按长边等比缩放
+    scale = working_size / long_side
+    new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+
+    # 使用reducing_gap先做整数倍降采样，再精细缩放，速度更快
+    return image.resize(new_size, Image.BILINEAR, reducing_gap=3.0)
+
+
+def _box_filter(array, radius):
+    """
+    均值滤波（使用积分图实现，边缘按实际窗口大小归一化）
+
+    参数:
+        array (numpy.ndarray): 二维浮点数组
+        radius (int): 滤波半径
+
+    返回:
+        numpy.ndarray: 滤波后的数组
+    """
+    height, width = array.shape
+
+    # 积分图（首行首列补零）
+    integral = np.zeros((height + 1, width + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(array, axis=0), axis=1, out=integral[1:, 1:])
+
+    # 每个像素窗口的上下左右边界
+    rows = np.arange(height)
+    cols = np.arange(width)
+    top = np.clip(rows - radius, 0, height)
+    bottom = np.clip(rows + radius + 1, 0, height)
+    left = np.clip(cols - radius, 0, width)
+    right = np.clip(cols + radius + 1, 0, width)
+
+    total = (
+        integral[bottom][:, right]
+        - integral[top][:, right]
+        - integral[bottom][:, left]
+        + integral[top][:, left]
+    )
+    count = np.outer(bottom - top, right - left)
+
+    return (total / count).astype(np.float32)
+
+
+def guided_upsample_mask(mask, guide, radius=4, eps=1e-3, strip_height=512):
+    """
+    边缘感知的蒙版上采样（快速引导滤波）
+
+    在低分辨率下计算引导滤波的线性系数，将系数上采样到原图尺寸后，
+    结合全分辨率的灰度引导图得到贴合原图边缘的蒙版。
+
+    参数:
+        mask (PIL.Image): 低分辨率蒙版（L模式）
+        guide (PIL.Image): 全分辨率引导图（原图）
+        radius (int): 低分辨率下的滤波半径
+        eps (float): 正则化系数，越大蒙版越平滑
+        strip_height (int): 全分辨率合成时每次处理的行数，用于限制内存占用
+
+    返回:
+        PIL.Image: 与引导图同尺寸的蒙版（L模式）
+    """
+    full_size = guide.size
+    guide_gray = guide.convert("L")
+
+    # 蒙版尺寸与原图一致时无需上采样
+    if mask.size == full_size:
+        return mask.convert("L")
+
+    # 低分辨率下的引导图和蒙版（0-1浮点）
+    guide_small = np.asarray(guide_gray.resize(mask.size, Image.BILINEAR), dtype=np.float32) / 255.0
+    mask_small = np.asarray(mask.convert("L"), dtype=np.float32) / 255.0
+
+    # 计算引导滤波系数
+    mean_i = _box_filter(guide_small, radius)
+    mean_p = _box_filter(mask_small, radius)
+    corr_ip = _box_filter(guide_small * mask_small, radius)
+    var_i = _box_filter(guide_small * guide_small, radius) - mean_i * mean_i
+
+    a = (corr_ip - mean_i * mean_p) / (var_i + eps)
+    b = mean_p - a * mean_i
+
+    mean_a = _box_filter(a, radius)
+    mean_b = _box_filter(b, radius)
+
+    # 系数图（F模式，在C层完成插值）；合成在0-255范围内进行，b预先乘以255
+    a_image = Image.fromarray(mean_a)
+    b_image = Image.fromarray(mean_b * np.float32(255.0))
+
+    # 按行分块将系数上采样到全分辨率并合成，全分辨率浮点数组只存在一个行块大小
+    # （resize的box参数指定行块在低分辨率系数图中对应的区域，插值结果与整幅上采样相同）
+    width, height = full_size
+    scale_y = mask.size[1] / height
+    output = np.empty((height, width), dtype=np.uint8)
+    for top in range(0, height, strip_height):
+        bottom = min(top + strip_height, height)
+        box = (0, top * scale_y, mask.size[0], bottom * scale_y)
+        strip_size = (width, bottom - top)
+        strip = np.asarray(guide_gray.crop((0, top, width, bottom)), dtype=np.float32)
+        strip *= np.asarray(a_image.resize(strip_size, Image.BILINEAR, box=box))
+        strip += np.asarray(b_image.resize(strip_size, Image.BILINEAR, box=box))
+        strip += 0.5
+        np.clip(strip, 0, 255, out=strip)
+        output[top:bottom] = strip
+
+    return Image.fromarray(output)
+
+
+def threshold_mask(mask, threshold):
+    """
+    按透明度阈值将蒙版二值化（用于快速预览，近似透明度抠图的前景/背景划分）
+
+    参数:
+        mask (PIL.Image): 蒙版（L模式）
+        threshold (int): 透明度阈值，0-255之间，为0时不做处理
+
+    返回:
+        PIL.Image: 处理后的蒙版
+    """
+    if threshold <= 0:
+        return mask
+    return mask.point(lambda value: 255 if value > threshold else 0)
+
+
+def apply_mask(image, mask):
+    """
+    按蒙版将图片合成到透明背景上（与rembg的合成方式相同，保留原图自身的透明度和元数据）
+
+    参数:
+        image (PIL.Image): 原始图片
+        mask (PIL.Image): 与原图同尺寸的蒙版（L模式）
+
+    返回:
+        PIL.Image: RGBA模式的合成结果（带有原图的ICC色彩配置和EXIF信息）
+    """
+    rgba = image.convert("RGBA")
+    output_image = Image.composite(rgba, Image.new("RGBA", rgba.size, 0), mask)
+    return copy_metadata(image, output_image)
+
+
+def frame_signature(image, size=64):
+    """
+    计算用于比较相邻帧的缩略灰度图
+
+    参数:
+        image (PIL.Image): 帧图片
+        size (int): 缩略图长边像素数
+
+    返回:
+        numpy.ndarray: float32灰度数组
+    """
+    small = image.convert("L")
+    small.thumbnail((size, size), Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(small, dtype=np.float32)
+
+
+def estimate_shift(reference, current):
+    """
+    用相位相关估计当前帧相对参考帧的平移
+
+    参数:
+        reference (numpy.ndarray): 参考帧的缩略灰度图
+        current (numpy.ndarray): 当前帧的缩略灰度图（与参考帧同尺寸）
+
+    返回:
+        tuple: 平移量 (dx, dy)，以缩略图像素为单位，当前帧内容相对参考帧向右、向下移动为正
+    """
+    # 加窗减少边界对频谱的影响
+    window = np.outer(np.hanning(reference.shape[0]), np.hanning(reference.shape[1]))
+    spectrum = np.fft.fft2(current * window) * np.conj(np.fft.fft2(reference * window))
+    spectrum /= np.abs(spectrum) + 1e-9
+    correlation = np.fft.ifft2(spectrum).real
+
+    dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+    height, width = correlation.shape
+    # 超过一半的位移对应反方向的平移
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+    return int(dx), int(dy)
+
+
+def frame_difference(reference, current, shift=(0, 0)):
+    """
+    计算两帧缩略图在对齐后的平均差异
+
+    参数:
+        reference (numpy.ndarray): 参考帧的缩略灰度图
+        current (numpy.ndarray): 当前帧的缩略灰度图
+        shift (tuple): 当前帧相对参考帧的平移 (dx, dy)
+
+    返回:
+        float: 重叠区域内的平均绝对差（0-255）
+    """
+    if reference.shape != current.shape:
+        return float("inf")
+
+    dx, dy = shift
+    height, width = reference.shape
+    if abs(dx) >= width or abs(dy) >= height:
+        return float("inf")
+
+    # 只比较平移后重叠的区域
+    ref = reference[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+    cur = current[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return float(np.mean(np.abs(cur - ref)))
+
+
+def shift_mask(mask, dx, dy):
+    """
+    平移蒙版（移出画面的部分丢弃，移入的部分为透明）
+
+    参数:
+        mask (PIL.Image): 蒙版（L模式）
+        dx (float): 向右平移的像素数
+        dy (float): 向下平移的像素数
+
+    返回:
+        PIL.Image: 平移后的蒙版
+    """
+    if dx == 0 and dy == 0:
+        return mask
+    return mask.transform(mask.size, Image.AFFINE, (1, 0, -dx, 0, 1, -dy), resample=Image.BILINEAR)
+
+
+def blend_masks(previous, current, weight):
+    """
+    时间域平滑：将当前蒙版与上一帧平滑后的蒙版加权混合，减少闪烁
+
+    参数:
+        previous (PIL.Image): 上一帧平滑后的蒙版，为None或尺寸不同时不混合
+        current (PIL.Image): 当前帧的蒙版
+        weight (float): 上一帧的权重，0-1之间，为0时不平滑
+
+    返回:
+        PIL.Image: 平滑后的蒙版
+    """
+    if weight <= 0 or previous is None or previous.size != current.size:
+        return current
+    return Image.blend(current, previous, weight)
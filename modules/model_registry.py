@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 模型注册模块
+
+管理去背景使用的分割模型：rembg自带的五个模型，以及本地提供的ONNX变体，
+如INT8量化模型（onnxruntime.quantization量化得到）和缩小输入尺寸重新导出的模型。
+本地模型按文件名登记，例如 u2net-int8.onnx、u2netp-256.onnx、isnet-general-use-int8-512.onnx：
+文件名以基础模型名开头，含int8表示量化模型，末尾的数字表示输入边长。
+
+自动选择模式在本地验证集（图片与人工蒙版）上测试各模型的速度和蒙版IoU，
+选出达到质量下限的最快模型。
+"""
+
+import os
+import re
+import time
+
+import numpy as np
+from PIL import Image
+
+
+# 预处理的均值和标准差
+_IMAGENET_NORMALIZE = ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225))
+_ISNET_NORMALIZE = ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0))
+
+# rembg自带的模型: 名称 -> (均值, 标准差, 输入尺寸, 说明)
+BUILTIN_MODELS = {
+    "u2net": _IMAGENET_NORMALIZE + ((320, 320), "通用模型"),
+    "u2netp": _IMAGENET_NORMALIZE + ((320, 320), "轻量级模型"),
+    "u2net_human_seg": _IMAGENET_NORMALIZE + ((320, 320), "人像分割模型"),
+    "silueta": _IMAGENET_NORMALIZE + ((320, 320), "轮廓模型"),
+    "isnet-general-use": _ISNET_NORMALIZE + ((1024, 1024), "高精度通用模型"),
+}
+
+# 自动选择模型时使用的名称
+AUTO_MODEL = "auto"
+
+# 验证集中的图片扩展名
+_VALIDATION_FORMATS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ModelVariant:
+    """模型信息类"""
+
+    def __init__(self, name, base, mean, std, input_size, path=None, precision="fp32", description=""):
+        """
+        初始化模型信息
+
+        参数:
+            name (str): 模型名称
+            base (str): 基础模型名称（决定预处理方式）
+            mean (tuple): 预处理均值
+            std (tuple): 预处理标准差
+            input_size (tuple): 模型输入尺寸 (宽, 高)
+            path (str): 本地ONNX文件路径，rembg自带的模型为None
+            precision (str): 权重精度，'fp32'或'int8'
+            description (str): 说明
+        """
+        self.name = name
+        self.base = base
+        self.mean = mean
+        self.std = std
+        self.input_size = input_size
+        self.path = path
+        self.precision = precision
+        self.description = description
+
+    def __repr__(self):
+        return (f"ModelVariant(name={self.name!r}, base={self.base!r}, precision={self.precision}, "
+                f"input_size={self.input_size})")
+
+    @property
+    def builtin(self):
+        """是否为rembg自带的模型"""
+        return self.path is None
+
+
+class OnnxModelSession:
+    """
+    本地ONNX模型会话类
+
+    提供与rembg会话相同的predict、normalize和inner_session接口，
+    可以直接传给rembg.remove，也支持多张图片合并推理。
+    """
+
+    def __init__(self, variant, providers=None):
+        """
+        初始化会话
+
+        参数:
+            variant (ModelVariant): 模型信息
+            providers (list): ONNX Runtime执行提供者，为None时使用所有可用的提供者
+        """
+        import onnxruntime as ort
+
+        self.model_name = variant.name
+        self.variant = variant
+        self.inner_session = ort.InferenceSession(
+            variant.path, providers=providers or ort.get_available_providers()
+        )
+
+        # 模型输入尺寸固定时以模型为准
+        shape = self.inner_session.get_inputs()[0].shape
+        if len(shape) == 4 and all(isinstance(side, int) for side in shape[2:]):
+            variant.input_size = (shape[3], shape[2])
+
+    def normalize(self, img, mean, std, size):
+        """
+        预处理图片（与rembg相同）
+
+        参数:
+            img (PIL.Image): 输入图片
+            mean (tuple): 均值
+            std (tuple): 标准差
+            size (tuple): 模型输入尺寸 (宽, 高)
+
+        返回:
+            dict: 模型输入 {输入名称: NCHW数组}
+        """
+        pixels = np.asarray(img.convert("RGB").resize(size, Image.LANCZOS), dtype=np.float32)
+        pixels = pixels / max(float(pixels.max()), 1e-8)
+        pixels = (pixels - np.array(mean, dtype=np.float32)) / np.array(std, dtype=np.float32)
+        return {self.inner_session.get_inputs()[0].name: pixels.transpose(2, 0, 1)[np.newaxis].astype(np.float32)}
+
+    def predict(self, img, *args, **kwargs):
+        """
+        预测蒙版
+
+        参数:
+            img (PIL.Image): 输入图片
+
+        返回:
+            list: 只含一个与原图同尺寸蒙版（L模式）的列表
+        """
+        variant = self.variant
+        prediction = self.inner_session.run(
+            None, self.normalize(img, variant.mean, variant.std, variant.input_size)
+        )[0][0, 0]
+        low, high = prediction.min(), prediction.max()
+        prediction = (prediction - low) / max(high - low, 1e-8)
+        mask = Image.fromarray((prediction * 255).astype(np.uint8))
+        return [mask.resize(img.size, Image.LANCZOS)]
+
+
+class BenchmarkResult:
+    """模型测试结果类"""
+
+    def __init__(self, model, iou, seconds):
+        """
+        初始化测试结果
+
+        参数:
+            model (str): 模型名称
+            iou (float): 验证集上的平均蒙版IoU
+            seconds (float): 每张图片的平均推理时间（秒）
+        """
+        self.model = model
+        self.iou = iou
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f"BenchmarkResult(model={self.model!r}, iou={self.iou:.3f}, ms={self.seconds * 1000:.1f})"
+
+
+def load_validation_set(directory):
+    """
+    读取验证集：images子目录中的图片与masks子目录中同名（扩展名可以不同）的蒙版一一对应
+
+    参数:
+        directory (str): 验证集目录
+
+    返回:
+        list: (图片, L模式蒙版) 列表
+    """
+    image_dir = os.path.join(directory, "images")
+    mask_dir = os.path.join(directory, "masks")
+    if not os.path.isdir(image_dir) or not os.path.isdir(mask_dir):
+        raise FileNotFoundError(f"验证集目录需要包含images和masks子目录: {directory}")
+
+    masks = {os.path.splitext(name)[0]: name for name in os.listdir(mask_dir)}
+    pairs = []
+    for name in sorted(os.listdir(image_dir)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in _VALIDATION_FORMATS or stem not in masks:
+            continue
+        with Image.open(os.path.join(image_dir, name)) as image:
+            image = image.convert("RGB")
+        with Image.open(os.path.join(mask_dir, masks[stem])) as mask:
+            mask = mask.convert("L")
+        if mask.size != image.size:
+            mask = mask.resize(image.size, Image.NEAREST)
+        pairs.append((image, mask))
+
+    if not pairs:
+        raise ValueError(f"验证集中没有图片与蒙版对: {directory}")
+    return pairs
+
+
+def mask_iou(predicted, expected, threshold=128):
+    """
+    计算两个蒙版前景区域的交并比
+
+    参数:
+        predicted (PIL.Image): 预测的蒙版
+        expected (PIL.Image): 人工标注的蒙版
+        threshold (int): 前景阈值
+
+    返回:
+        float: 交并比，两个蒙版都没有前景时为1
+    """
+    a = np.asarray(predicted.convert("L")) >= threshold
+    b = np.asarray(expected.convert("L")) >= threshold
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+
+class ModelRegistry:
+    """模型注册表类"""
+
+    def __init__(self, model_dir=None):
+        """
+        初始化注册表
+
+        参数:
+            model_dir (str): 本地ONNX模型目录，为None时只有rembg自带的模型
+        """
+        self._variants = {}
+        for name, (mean, std, input_size, description) in BUILTIN_MODELS.items():
+            self._variants[name] = ModelVariant(name, name, mean, std, input_size, description=description)
+
+        if model_dir is not None:
+            self.discover(model_dir)
+
+    def __contains__(self, name):
+        return name in self._variants
+
+    def names(self):
+        """
+        获取所有模型名称
+
+        返回:
+            list: 模型名称列表（自带的模型在前）
+        """
+        return list(self._variants)
+
+    def get(self, name):
+        """
+        获取模型信息
+
+        参数:
+            name (str): 模型名称
+
+        返回:
+            ModelVariant: 模型信息
+        """
+        if name not in self._variants:
+            raise ValueError(f"不支持的模型: {name}，可用模型: {', '.join(self._variants)}")
+        return self._variants[name]
+
+    def register(self, name, path, base=None, input_size=None, precision=None):
+        """
+        登记本地ONNX模型
+
+        参数:
+            name (str): 模型名称
+            path (str): ONNX文件路径
+            base (str): 基础模型名称，为None时由模型名称的前缀推断
+            input_size (int | tuple): 输入边长或 (宽, 高)，为None时使用基础模型的输入尺寸
+                （模型输入尺寸固定时加载后以模型为准）
+            precision (str): 权重精度，为None时名称含int8为'int8'，否则为'fp32'
+
+        返回:
+            ModelVariant: 登记的模型信息
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"模型文件不存在: {path}")
+
+        if base is None:
+            # 取最长的匹配前缀（u2netp优先于u2net）
+            candidates = [builtin for builtin in BUILTIN_MODELS if name.startswith(builtin)]
+            if not candidates:
+                raise ValueError(f"无法从模型名称推断基础模型: {name}，可用基础模型: {', '.join(BUILTIN_MODELS)}")
+            base = max(candidates, key=len)
+        if base not in BUILTIN_MODELS:
+            raise ValueError(f"不支持的基础模型: {base}，可用基础模型: {', '.join(BUILTIN_MODELS)}")
+
+        mean, std, base_size, description = BUILTIN_MODELS[base]
+        if input_size is None:
+            input_size = base_size
+        elif isinstance(input_size, int):
+            input_size = (input_size, input_size)
+        if precision is None:
+            precision = "int8" if "int8" in name.lower() else "fp32"
+
+        variant = ModelVariant(name, base, mean, std, tuple(input_size), os.path.abspath(path), precision,
+                               f"{description}（{precision}，输入{input_size[0]}x{input_size[1]}）")
+        self._variants[name] = variant
+        return variant
+
+    def discover(self, model_dir):
+        """
+        登记目录中的所有ONNX模型（按文件名推断基础模型、精度和输入尺寸）
+
+        参数:
+            model_dir (str): 模型目录
+
+        返回:
+            list: 登记的模型信息列表
+        """
+        if not os.path.isdir(model_dir):
+            raise FileNotFoundError(f"模型目录不存在: {model_dir}")
+
+        variants = []
+        for filename in sorted(os.listdir(model_dir)):
+            name, extension = os.path.splitext(filename)
+            if extension.lower() != ".onnx" or name in BUILTIN_MODELS:
+                continue
+            match = re.search(r"[-_](\d+)$", name)
+            input_size = int(match.group(1)) if match else None
+            try:
+                variants.append(self.register(name, os.path.join(model_dir, filename), input_size=input_size))
+            except ValueError as e:
+                print(f"跳过模型文件 {filename}: {str(e)}")
+        return variants
+
+    def create_session(self, name):
+        """
+        创建模型会话
+
+        参数:
+            name (str): 模型名称
+
+        返回:
+            rembg会话或OnnxModelSession
+        """
+        variant = self.get(name)
+        if variant.builtin:
+            from rembg import new_session
+            return new_session(name)
+        return OnnxModelSession(variant)
+
+    def model_inputs(self, name):
+        """
+        获取模型的预处理参数（用于多张图片合并推理）
+
+        参数:
+            name (str): 模型名称
+
+        返回:
+            tuple: (均值, 标准差, 输入尺寸)
+        """
+        variant = self.get(name)
+        return variant.mean, variant.std, variant.input_size
+
+    def benchmark(self, predict, pairs, models=None):
+        """
+        在验证集上测试模型的速度和质量
+
+        参数:
+            predict (callable): 预测蒙版的函数，调用方式为 predict(图片, 模型名称)
+            pairs (list): 验证集 (图片, 蒙版) 列表
+            models (list): 参与测试的模型名称，为None时测试所有模型
+
+        返回:
+            list: BenchmarkResult列表，按推理时间从快到慢排序
+        """
+        results = []
+        for name in models or self.names():
+            # 先推理一次，排除加载模型的时间
+            predict(pairs[0][0], name)
+
+            ious = []
+            start = time.perf_counter()
+            for image, expected in pairs:
+                ious.append(mask_iou(predict(image, name), expected))
+            seconds = (time.perf_counter() - start) / len(pairs)
+            results.append(BenchmarkResult(name, float(np.mean(ious)), seconds))
+
+        return sorted(results, key=lambda result: result.seconds)
+
+    def select(self, predict, pairs, quality_floor=0.9, models=None):
+        """
+        选出达到质量下限的最快模型
+
+        参数:
+            predict (callable): 预测蒙版的函数，调用方式为 predict(图片, 模型名称)
+            pairs (list): 验证集 (图片, 蒙版) 列表
+            quality_floor (float): 平均蒙版IoU的下限（0-1）
+            models (list): 候选模型名称，为None时为所有模型
+
+        返回:
+            tuple: (选出的模型名称, BenchmarkResult列表)；没有模型达到下限时选IoU最高的模型
+        """
+        if not 0 <= quality_floor <= 1:
+            raise ValueError(f"质量下限必须在0-1之间，当前值: {quality_floor}")
+
+        results = self.benchmark(predict, pairs, models)
+        for result in results:
+            if result.iou >= quality_floor:
+                return result.model, results
+        return max(results, key=lambda result: result.iou).model, results
+
+
+def quantize_model(input_path, output_path):
+    """
+    将ONNX模型动态量化为INT8（需要onnxruntime的量化工具）
+
+    参数:
+        input_path (str): 原始ONNX模型路径
+        output_path (str): 量化后的模型路径，文件名建议包含int8，如u2net-int8.onnx
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QUInt8)
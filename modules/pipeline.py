@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 处理流水线模块
+
+将去背景、剪裁、缩放和编码等操作组合成一条延迟执行的流水线。
+流水线在内存中运行，相邻的几何操作（剪裁、缩放）会合并为一次重采样，
+整条流水线只在最后编码一次，可以处理单个文件，也可以处理整个目录。
+带EXIF方向的图片在第一个几何操作缩小之后才摆正。
+"""
+
+import os
+from PIL import Image
+
+from .batch import list_image_files, run_batch
+from .encoder import DEFAULT_PROFILE, profile_params
+from .geometry import plan_crop, plan_resize, apply_plan, get_resample_filter
+from .image_io import (
+    check_source, load_image, encode_image, save_image, get_orientation, oriented_size,
+    normalize_orientation,
+)
+from .report import JobReport
+
+
+# 各输出格式对应的文件扩展名
+_FORMAT_EXTENSIONS = {
+    "PNG": ".png",
+    "JPEG": ".jpg",
+    "WEBP": ".webp",
+    "BMP": ".bmp",
+    "GIF": ".gif",
+}
+
+
+class Pipeline:
+    """图片处理流水线类"""
+
+    def __init__(self, background_remover=None, image_processor=None):
+        """
+        初始化流水线
+
+        参数:
+            background_remover (BackgroundRemover): 去背景使用的实例，为None时首次使用时创建
+            image_processor (ImageProcessor): 按文件大小缩放使用的实例，为None时自动创建
+        """
+        self.background_remover = background_remover
+        self.image_processor = image_processor
+
+        # 已添加的操作列表，每项为 (操作名称, 参数字典)
+        self.steps = []
+
+        # 最近一次目录处理的报告（JobReport）
+        self.last_report = None
+
+    def remove_background(self, model="u2net", alpha_threshold=0, working_size=None):
+        """
+        添加去背景操作
+
+        参数:
+            model (str): 使用的模型名称
+            alpha_threshold (int): 透明度阈值，0-255之间
+            working_size (int): 工作分辨率（长边像素数），为None时使用原图分辨率
+
+        返回:
+            Pipeline: 流水线本身，便于链式调用
+        """
+        return self._add("remove_background", model=model, alpha_threshold=alpha_threshold,
+                         working_size=working_size)
+
+    def crop(self, width, height, keep_aspect_ratio=True, resample="lanczos", reducing_gap=None):
+        """
+        添加剪裁操作
+
+        参数:
+            width (int): 目标宽度
+            height (int): 目标高度
+            keep_aspect_ratio (bool): 是否保持宽高比
+            resample (str): 重采样滤波器（相邻几何操作合并时使用最后一个操作的设置）
+            reducing_gap (float): 预缩小系数
+
+        返回:
+            Pipeline: 流水线本身
+        """
+        self._check_size(width, height)
+        get_resample_filter(resample)
+        return self._add("crop", width=width, height=height, keep_aspect_ratio=keep_aspect_ratio,
+                         resample=resample, reducing_gap=reducing_gap)
+
+    def resize(self, width, height, keep_aspect_ratio=True, resample="lanczos", reducing_gap=None):
+        """
+        添加缩放操作
+
+        参数:
+            width (int): 目标宽度
+            height (int): 目标高度
+            keep_aspect_ratio (bool): 是否保持宽高比
+            resample (str): 重采样滤波器（相邻几何操作合并时使用最后一个操作的设置）
+            reducing_gap (float): 预缩小系数
+
+        返回:
+            Pipeline: 流水线本身
+        """
+        self._check_size(width, height)
+        get_resample_filter(resample)
+        return self._add("resize", width=width, height=height, keep_aspect_ratio=keep_aspect_ratio,
+                         resample=resample, reducing_gap=reducing_gap)
+
+    def resize_to_filesize(self, target_size_kb, quality=85, profile=DEFAULT_PROFILE):
+        """
+        添加按文件大小缩放操作（该操作会完成编码，必须是最后一步）
+
+        参数:
+            target_size_kb (int): 目标文件大小（KB）
+            quality (int): 初始质量设置（1-100）
+            profile (str): 编码配置（fast、balanced、smallest）
+
+        返回:
+            Pipeline: 流水线本身
+        """
+        # 检查编码配置是否有效
+        profile_params(profile, "JPEG")
+        return self._add("resize_to_filesize", target_size_kb=target_size_kb, quality=quality, profile=profile)
+
+    def encode(self, format="PNG", **params):
+        """
+        添加编码操作（必须是最后一步）
+
+        参数:
+            format (str): 输出格式，如'PNG'、'JPEG'等
+            **params: 传递给编码器的参数，如quality
+
+        返回:
+            Pipeline: 流水线本身
+        """
+        return self._add("encode", format=format, params=params)
+
+    def _check_size(self, width, height):
+        """
+        检查宽高是否有效
+
+        参数:
+            width (int): 目标宽度
+            height (int): 目标高度
+        """
+        if width <= 0 or height <= 0:
+            raise ValueError(f"宽度和高度必须大于0，当前值: 宽度={width}, 高度={height}")
+
+    def _add(self, name, **params):
+        """
+        添加一个操作
+
+        参数:
+            name (str): 操作名称
+            **params: 操作参数
+
+        返回:
+            Pipeline: 流水线本身
+        """
+        # 编码类操作之后不能再添加其他操作
+        if self.steps and self.steps[-1][0] in ("encode", "resize_to_filesize"):
+            raise ValueError(f"流水线已经以编码操作结束，不能再添加操作: {name}")
+
+        self.steps.append((name, params))
+        return self
+
+    def run(self, source):
+        """
+        对单张图片运行流水线
+
+        参数:
+            source: 图片输入，可以是文件路径、字节数据、文件对象、PIL.Image等
+
+        返回:
+            PIL.Image | bytes: 流水线以编码操作结束时返回编码后的字节数据，否则返回图片对象
+        """
+        # 检查图片是否存在
+        check_source(source)
+
+        try:
+            # 按EXIF方向摆正推迟到第一次几何操作缩小之后
+            image = original = load_image(source, apply_orientation=False)
+            orientation = get_orientation(image)
+
+            # 待执行的几何操作：(合并后的几何变换计划, 最后一个几何操作的参数)
+            geometry = None
+
+            for name, params in self.steps:
+                if name in ("crop", "resize"):
+                    # 以当前（合并后的）输出尺寸为基准计算本次操作，再换算回原图坐标
+                    current_size = geometry[0].size if geometry else oriented_size(image, orientation)
+                    plan_func = plan_crop if name == "crop" else plan_resize
+                    plan = plan_func(current_size, params["width"], params["height"],
+                                     params["keep_aspect_ratio"])
+                    if geometry:
+                        plan = geometry[0].then(plan)
+                    geometry = (plan, params)
+                    continue
+
+                # 图片是否未经修改（文件对象已被读取过，不能再次传入）
+                pristine = geometry is None and image is original and not hasattr(source, "read")
+
+                # 非几何操作之前，先执行合并后的几何操作（只重采样一次）
+                image = self._apply_geometry(image, geometry, orientation)
+                geometry = None
+                orientation = 1
+
+                if name == "remove_background":
+                    image = self._get_background_remover().remove_background(image, **params)
+                elif name == "resize_to_filesize":
+                    # 图片未经修改时传入原始输入，源文件已满足要求时直接沿用原始数据
+                    return self._get_image_processor().resize_to_filesize(
+                        source if pristine else image, params["target_size_kb"], params["quality"],
+                        return_bytes=True, profile=params["profile"]
+                    )
+                elif name == "encode":
+                    return encode_image(image, params["format"], **params["params"])
+
+            return self._apply_geometry(image, geometry, orientation)
+
+        except (ValueError, RuntimeError):
+            raise
+        except Exception as e:
+            raise RuntimeError(f"处理图片时出错: {str(e)}")
+
+    def _apply_geometry(self, image, geometry, orientation=1):
+        """
+        执行合并后的几何操作
+
+        参数:
+            image (PIL.Image): 输入图片
+            geometry (tuple): (几何变换计划, 最后一个几何操作的参数)，为None时不做处理
+            orientation (int): 输入图片尚未应用的EXIF方向值
+
+        返回:
+            PIL.Image: 处理后（已摆正）的图片
+        """
+        if geometry is None:
+            return normalize_orientation(image) if orientation != 1 else image
+
+        plan, params = geometry
+        return apply_plan(image, plan, params["resample"], params["reducing_gap"], orientation)
+
+    def _get_background_remover(self):
+        """获取去背景实例（延迟创建，未使用去背景时无需加载模型库）"""
+        if self.background_remover is None:
+            from .background_remover import BackgroundRemover
+            self.background_remover = BackgroundRemover()
+        return self.background_remover
+
+    def _get_image_processor(self):
+        """获取图像处理实例"""
+        if self.image_processor is None:
+            from .image_processor import ImageProcessor
+            self.image_processor = ImageProcessor()
+        return self.image_processor
+
+    def _output_extension(self, result):
+        """
+        根据流水线结果确定输出文件扩展名
+
+        参数:
+            result (PIL.Image | bytes): 流水线结果
+
+        返回:
+            str: 文件扩展名
+        """
+        if isinstance(result, Image.Image):
+            return ".png"
+
+        # 根据文件头识别编码格式
+        if result.startswith(b"\xff\xd8"):
+            return ".jpg"
+        if result.startswith(b"\x89PNG"):
+            return ".png"
+        name, params = self.steps[-1]
+        if name == "encode":
+            return _FORMAT_EXTENSIONS.get(params["format"].upper(), "." + params["format"].lower())
+        return ".bin"
+
+    def run_dir(self, input_dir, output_dir, max_workers=1, progress_callback=None, control=None):
+        """
+        对目录中的所有图片运行流水线
+
+        参数:
+            input_dir (str): 输入图片目录
+            output_dir (str): 输出图片目录
+            max_workers (int): 并行线程数
+            progress_callback (callable): 进度回调函数，参数为BatchProgress
+            control (BatchControl): 暂停、继续和取消控制
+
+        返回:
+            int: 成功处理的图片数量（每个文件的状态和耗时见self.last_report）
+        """
+        # 获取所有图片文件
+        image_files = list_image_files(input_dir, self._get_image_processor().supported_formats)
+
+        # 确保输出目录存在
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 流水线在内存中一次完成读取和处理，分处理和保存两个阶段计时
+        report = JobReport(image_files, stages=("process", "save"))
+        self.last_report = report
+
+        def process_file(image_file):
+            # 运行流水线
+            with report.stage(image_file, "process"):
+                result = self.run(os.path.join(input_dir, image_file))
+
+            # 构建输出路径
+            output_filename = os.path.splitext(image_file)[0] + self._output_extension(result)
+            output_path = os.path.join(output_dir, output_filename)
+
+            # 保存结果（未以编码操作结束时保存为PNG）
+            with report.stage(image_file, "save"):
+                if isinstance(result, Image.Image):
+                    save_image(result, output_path, format="PNG")
+                else:
+                    with open(output_path, "wb") as f:
+                        f.write(result)
+            report.set_output(image_file, os.path.getsize(output_path), getattr(result, "size", None))
+
+        # 批量处理图片
+        return run_batch(image_files, process_file, max_workers, progress_callback, control,
+                         item_path=lambda f: os.path.join(input_dir, f), job_report=report)
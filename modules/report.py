@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 批量处理报告模块
+
+批量处理时逐个文件记录状态、总耗时、各阶段耗时、输入输出字节数和输出尺寸。
+记录保存在一个NumPy结构化数组中（每个文件一行定长记录），只有失败文件的错误信息单独保存，
+百万级文件的任务也不需要为每个文件创建Python对象。报告可以导出为CSV或JSON Lines，
+并汇总吞吐量、延迟分位数和失败率。
+"""
+
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# 文件状态
+STATUS_PENDING = 0      # 未处理（如任务被取消）
+STATUS_OK = 1           # 成功
+STATUS_FAILED = 2       # 失败
+
+STATUS_NAMES = ("pending", "ok", "failed")
+
+
+class JobReport:
+    """批量处理报告类"""
+
+    def __init__(self, items, stages=("load", "process", "save")):
+        """
+        初始化报告
+
+        参数:
+            items (list): 文件项列表（通常是文件名），报告中的行与其一一对应
+            stages (tuple): 记录耗时的处理阶段名称
+        """
+        self.items = list(items)
+        self.stages = tuple(stages)
+
+        dtype = [
+            ("status", np.uint8),
+            ("start", np.float64),          # 开始时间（相对报告创建时间，秒）
+            ("seconds", np.float32),        # 总耗时（秒）
+        ]
+        dtype += [("stage_" + name, np.float32) for name in self.stages]
+        dtype += [
+            ("input_bytes", np.int64),
+            ("output_bytes", np.int64),
+            ("width", np.uint32),
+            ("height", np.uint32),
+        ]
+        self.records = np.zeros(len(self.items), dtype=dtype)
+
+        self.errors = {}                    # 行号 -> 错误信息（只保存失败的文件）
+        self._positions = {item: index for index, item in enumerate(self.items)}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        counts = np.bincount(self.records["status"], minlength=len(STATUS_NAMES))
+        return f"JobReport(total={len(self)}, ok={counts[STATUS_OK]}, failed={counts[STATUS_FAILED]})"
+
+    def index(self, item):
+        """
+        获取文件项在报告中的行号
+
+        参数:
+            item: 文件项
+
+        返回:
+            int: 行号
+        """
+        return self._positions[item]
+
+    def add_time(self, item, stage, seconds):
+        """
+        累加文件在某个阶段的耗时
+
+        参数:
+            item: 文件项
+            stage (str): 阶段名称
+            seconds (float): 耗时（秒）
+        """
+        if stage not in self.stages:
+            raise ValueError(f"未知的处理阶段: {stage}，可用阶段: {', '.join(self.stages)}")
+        row = self._positions[item]
+        with self._lock:
+            self.records["stage_" + stage][row] += seconds
+
+    @contextmanager
+    def stage(self, item, stage):
+        """
+        计时上下文：将代码块的耗时累加到文件的某个阶段
+
+        参数:
+            item: 文件项
+            stage (str): 阶段名称
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(item, stage, time.perf_counter() - start)
+
+    def set_input(self, item, size):
+        """
+        记录输入字节数
+
+        参数:
+            item: 文件项
+            size (int): 输入文件大小（字节）
+        """
+        self.records["input_bytes"][self._positions[item]] = size
+
+    def set_output(self, item, size=None, dimensions=None):
+        """
+        记录输出字节数和尺寸
+
+        参数:
+            item: 文件项
+            size (int): 输出文件大小（字节），为None时不记录
+            dimensions (tuple): 输出尺寸 (宽, 高)，为None时不记录
+        """
+        row = self._positions[item]
+        if size is not None:
+            self.records["output_bytes"][row] = size
+        if dimensions is not None:
+            self.records["width"][row], self.records["height"][row] = dimensions
+
+    def finish(self, item, error, started, ended):
+        """
+        记录文件处理完成
+
+        参数:
+            item: 文件项
+            error (str): 错误信息，成功时为None
+            started (float): 开始时间（time.perf_counter()）
+            ended (float): 结束时间（time.perf_counter()）
+        """
+        row = self._positions[item]
+        record = self.records[row]
+        record["status"] = STATUS_OK if error is None else STATUS_FAILED
+        record["start"] = started - self._origin
+        record["seconds"] = ended - started
+        if error is None:
+            self.errors.pop(row, None)
+        else:
+            self.errors[row] = error
+
+    def failures(self):
+        """
+        获取失败的文件
+
+        返回:
+            list: (文件项, 错误信息) 列表
+        """
+        return [(self.items[row], error) for row, error in sorted(self.errors.items())]
+
+    def summary(self):
+        """
+        汇总统计
+
+        返回:
+            dict: 文件数量、失败率、吞吐量（张/秒）、延迟（毫秒，均值、中位数、p95、最大值）、
+                各阶段平均耗时（毫秒）和输入输出总字节数
+        """
+        records = self.records
+        finished = records[records["status"] != STATUS_PENDING]
+        counts = np.bincount(records["status"], minlength=len(STATUS_NAMES))
+
+        summary = {
+            "total": len(records),
+            "completed": int(counts[STATUS_OK]),
+            "failed": int(counts[STATUS_FAILED]),
+            "pending": int(counts[STATUS_PENDING]),
+            "failure_rate": round(float(counts[STATUS_FAILED]) / len(finished), 4) if len(finished) else 0.0,
+            "throughput": 0.0,
+            "latency_ms": None,
+            "stages_ms": {},
+            "input_bytes": int(records["input_bytes"].sum()),
+            "output_bytes": int(records["output_bytes"].sum()),
+        }
+        if not len(finished):
+            return summary
+
+        # 吞吐量按第一个文件开始到最后一个文件完成的时间计算
+        wall = float((finished["start"] + finished["seconds"]).max() - finished["start"].min())
+        if wall > 0:
+            summary["throughput"] = round(len(finished) / wall, 2)
+
+        latency = finished["seconds"].astype(np.float64) * 1000
+        summary["latency_ms"] = {
+            "mean": round(float(latency.mean()), 2),
+            "p50": round(float(np.percentile(latency, 50)), 2),
+            "p95": round(float(np.percentile(latency, 95)), 2),
+            "max": round(float(latency.max()), 2),
+        }
+        summary["stages_ms"] = {
+            name: round(float(finished["stage_" + name].mean()) * 1000, 2) for name in self.stages
+        }
+        return summary
+
+    @property
+    def fieldnames(self):
+        """导出的列名"""
+        return (["path", "status", "start", "seconds"] + ["stage_" + name for name in self.stages] +
+                ["input_bytes", "output_bytes", "width", "height", "error"])
+
+    def _rows(self):
+        """逐行产生导出用的字典（列顺序与fieldnames一致）"""
+        stage_fields = ["stage_" + name for name in self.stages]
+        for row, record in enumerate(self.records):
+            values = {
+                "path": str(self.items[row]),
+                "status": STATUS_NAMES[record["status"]],
+                "start": round(float(record["start"]), 6),
+                "seconds": round(float(record["seconds"]), 6),
+            }
+            for field in stage_fields:
+                values[field] = round(float(record[field]), 6)
+            values.update(
+                input_bytes=int(record["input_bytes"]),
+                output_bytes=int(record["output_bytes"]),
+                width=int(record["width"]),
+                height=int(record["height"]),
+                error=self.errors.get(row, ""),
+            )
+            yield values
+
+    def to_csv(self, path):
+        """
+        导出为CSV文件
+
+        参数:
+            path (str): 输出路径
+        """
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            writer.writeheader()
+            writer.writerows(self._rows())
+
+    def to_jsonl(self, path):
+        """
+        导出为JSON Lines文件（每行一个文件的记录）
+
+        参数:
+            path (str): 输出路径
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for values in self._rows():
+                f.write(json.dumps(values, ensure_ascii=False) + "\n")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 批量调度模块
+
+根据文件头信息（像素数、格式）估算每张图片的处理代价，不解码像素。
+批量处理时先处理代价大的图片，避免几个大文件在最后拖慢整个任务；
+可以按像素预算把小图片打包成批合并推理，并按内存上限限制同时处理的大图片数量。
+"""
+
+import os
+from PIL import Image
+
+
+# 各格式的相对解码代价（以JPEG为基准）
+_FORMAT_COST = {
+    "JPEG": 1.0,
+    "PNG": 1.6,
+    "TIFF": 1.4,
+    "WEBP": 1.3,
+    "GIF": 1.2,
+    "BMP": 0.6,
+}
+
+
+class ItemCost:
+    """单张图片的代价估算结果类"""
+
+    def __init__(self, item, pixels, format, memory, cost):
+        """
+        初始化代价估算结果
+
+        参数:
+            item: 批量处理中的文件项（通常是文件名）
+            pixels (int): 像素数
+            format (str): 图片格式，无法识别时为None
+            memory (int): 处理时预计占用的内存（字节）
+            cost (float): 相对处理代价
+        """
+        self.item = item
+        self.pixels = pixels
+        self.format = format
+        self.memory = memory
+        self.cost = cost
+
+    def __repr__(self):
+        return f"ItemCost(item={self.item!r}, pixels={self.pixels}, format={self.format}, cost={self.cost:.0f})"
+
+
+class WorkUnit:
+    """调度单元类（一次提交给工作线程的一张或一批图片）"""
+
+    def __init__(self, costs):
+        """
+        初始化调度单元
+
+        参数:
+            costs (list): 单元中各图片的代价估算结果
+        """
+        self.costs = costs
+
+    @property
+    def items(self):
+        """单元中的文件项列表"""
+        return [cost.item for cost in self.costs]
+
+    @property
+    def pixels(self):
+        """单元的总像素数"""
+        return sum(cost.pixels for cost in self.costs)
+
+    @property
+    def memory(self):
+        """单元处理时预计占用的内存（字节）"""
+        return sum(cost.memory for cost in self.costs)
+
+
+class CostScheduler:
+    """按图片代价调度批量处理的类"""
+
+    def __init__(self, memory_limit=None, pixel_budget=None, bytes_per_pixel=16):
+        """
+        初始化调度器
+
+        参数:
+            memory_limit (int): 同时处理的图片预计占用内存的上限（字节），为None时不限制。
+                单张图片超过上限时仍会处理，但不与其他图片同时处理
+            pixel_budget (int): 合并处理时每批的总像素上限，为None时不打包（每张单独处理）
+            bytes_per_pixel (int): 处理时每个像素预计占用的内存（字节），
+                包括解码结果、RGBA输出和中间数据
+        """
+        if memory_limit is not None and memory_limit <= 0:
+            raise ValueError(f"内存上限必须大于0，当前值: {memory_limit}")
+        if pixel_budget is not None and pixel_budget <= 0:
+            raise ValueError(f"像素预算必须大于0，当前值: {pixel_budget}")
+
+        self.memory_limit = memory_limit
+        self.pixel_budget = pixel_budget
+        self.bytes_per_pixel = bytes_per_pixel
+
+    def estimate(self, item, path):
+        """
+        估算单张图片的处理代价（只读取文件头）
+
+        参数:
+            item: 文件项
+            path (str): 图片路径
+
+        返回:
+            ItemCost: 代价估算结果
+        """
+        try:
+            with Image.open(path) as image:
+                width, height = image.size
+                format = image.format
+                frames = getattr(image, "n_frames", 1)
+        except Exception:
+            # 无法读取文件头时按文件大小粗略估算，处理时再报告错误
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            return ItemCost(item, 0, None, size, float(size))
+
+        pixels = width * height * frames
+        cost = pixels * _FORMAT_COST.get(format, 1.0)
+        return ItemCost(item, pixels, format, pixels * self.bytes_per_pixel, cost)
+
+    def schedule(self, items, item_path, batched=False):
+        """
+        生成调度单元：按代价从大到小排序，需要时按像素预算打包
+
+        参数:
+            items (list): 文件项列表
+            item_path (callable): 由文件项得到图片路径的函数
+            batched (bool): 是否按像素预算把多张图片打包为一个单元（处理函数需要支持批处理）
+
+        返回:
+            list: 调度单元列表，代价大的单元在前
+        """
+        costs = sorted(
+            (self.estimate(item, item_path(item)) for item in items),
+            key=lambda cost: cost.cost, reverse=True
+        )
+
+        if not batched or self.pixel_budget is None:
+            return [WorkUnit([cost]) for cost in costs]
+
+        # 首次适应递减：按代价从大到小，放入第一个放得下的批
+        batches = []
+        for cost in costs:
+            for batch in batches:
+                if batch.pixels + cost.pixels <= self.pixel_budget:
+                    batch.costs.append(cost)
+                    break
+            else:
+                batches.append(WorkUnit([cost]))
+        return batches
+
+    def admits(self, unit, memory_in_flight, has_pending):
+        """
+        判断内存上限是否允许现在开始处理一个单元
+
+        参数:
+            unit (WorkUnit): 待处理的单元
+            memory_in_flight (int): 正在处理的单元预计占用的内存（字节）
+            has_pending (bool): 是否有正在处理的单元
+
+        返回:
+            bool: 可以开始处理时返回True
+        """
+        if self.memory_limit is None or not has_pending:
+            return True
+        return memory_in_flight + unit.memory <= self.memory_limit
@@ -0,0 +1,596 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 本地HTTP处理服务
+
+基于asyncio实现的轻量HTTP服务（不依赖第三方Web框架），默认只监听本机地址。
+提供去背景、剪裁、缩放和按文件大小缩放接口：
+    POST /remove-bg            参数: model, alpha_threshold, working_size, format
+    POST /crop                 参数: width, height, keep_aspect_ratio, format
+    POST /resize               参数: width, height, keep_aspect_ratio, format
+    POST /resize-to-filesize   参数: target_size_kb, quality, profile
+    GET  /metrics              队列深度、请求计数、延迟分位数和各编码配置的耗时
+    GET  /health               健康检查
+请求体为图片数据，响应体为处理后的图片数据。
+
+并发的去背景请求会在很短的时间窗口内合并为一次推理；Pillow处理在线程池中运行。
+所有队列都有上限，超过上限时立即返回503，由调用方稍后重试。
+
+运行方式:
+    python -m modules.service --port 8765
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .encoder import DEFAULT_PROFILE, encode_stats
+
+
+# HTTP状态码对应的原因短语
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+# 输出格式对应的Content-Type
+_CONTENT_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "JPG": "image/jpeg",
+    "WEBP": "image/webp",
+    "BMP": "image/bmp",
+    "GIF": "image/gif",
+}
+
+
+class ServiceError(Exception):
+    """服务请求错误类（携带HTTP状态码）"""
+
+    def __init__(self, status, message):
+        """
+        初始化请求错误
+
+        参数:
+            status (int): HTTP状态码
+            message (str): 错误信息
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class _LatencyStats:
+    """请求延迟统计类（保留最近的若干次请求）"""
+
+    def __init__(self, window=1000):
+        """
+        初始化延迟统计
+
+        参数:
+            window (int): 参与统计的最近请求数量
+        """
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+
+    def record(self, seconds, ok):
+        """
+        记录一次请求
+
+        参数:
+            seconds (float): 请求耗时（秒）
+            ok (bool): 是否成功
+        """
+        self.latencies.append(seconds)
+        self.count += 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self):
+        """
+        获取统计摘要
+
+        返回:
+            dict: 请求数、错误数和延迟分位数（毫秒）
+        """
+        summary = {"count": self.count, "errors": self.errors}
+        if self.latencies:
+            p50, p90, p99 = np.percentile(np.fromiter(self.latencies, dtype=float), [50, 90, 99])
+            summary.update({
+                "p50_ms": round(p50 * 1000, 2),
+                "p90_ms": round(p90 * 1000, 2),
+                "p99_ms": round(p99 * 1000, 2),
+            })
+        return summary
+
+
+class ProcessingService:
+    """本地HTTP处理服务类"""
+
+    def __init__(self, background_remover=None, image_processor=None, max_workers=4,
+                 batch_window=0.01, max_batch_size=8, max_queue_size=64,
+                 max_body_bytes=64 * 1024 * 1024):
+        """
+        初始化处理服务
+
+        参数:
+            background_remover (BackgroundRemover): 去背景实例，为None时首次使用时创建
+            image_processor (ImageProcessor): 图像处理实例，为None时自动创建
+            max_workers (int): Pillow处理线程数
+            batch_window (float): 去背景请求的合并时间窗口（秒）
+            max_batch_size (int): 一次合并推理的最大图片数
+            max_queue_size (int): 去背景队列和Pillow处理队列的上限
+            max_body_bytes (int): 请求体大小上限（字节）
+        """
+        self.background_remover = background_remover
+        if image_processor is None:
+            from .image_processor import ImageProcessor
+            image_processor = ImageProcessor()
+        self.image_processor = image_processor
+
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.max_body_bytes = max_body_bytes
+
+        # Pillow处理线程池；推理使用单独的线程，避免与Pillow任务互相阻塞
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._inference_executor = ThreadPoolExecutor(max_workers=1)
+
+        # 去背景请求队列在事件循环中创建
+        self._remove_queue = None
+        self._batcher_task = None
+        self._pillow_pending = 0
+
+        # 统计信息
+        self._stats = {}
+        self._batch_sizes = deque(maxlen=1000)
+        self._rejected = 0
+
+        # 路由表：(方法, 路径) -> 处理函数
+        self._routes = {
+            ("POST", "/remove-bg"): self._handle_remove_bg,
+            ("POST", "/crop"): self._handle_crop,
+            ("POST", "/resize"): self._handle_resize,
+            ("POST", "/resize-to-filesize"): self._handle_resize_to_filesize,
+            ("GET", "/metrics"): self._handle_metrics,
+            ("GET", "/health"): self._handle_health,
+        }
+
+    # ------------------------------------------------------------------
+    # 请求处理（与网络无关，可以直接调用测试）
+    # ------------------------------------------------------------------
+
+    async def handle(self, method, target, body=b""):
+        """
+        处理一个请求
+
+        参数:
+            method (str): 请求方法，如'GET'、'POST'
+            target (str): 请求路径（可带查询参数），如'/crop?width=100&height=100'
+            body (bytes): 请求体
+
+        返回:
+            tuple: (状态码, Content-Type, 响应体)
+        """
+        start_time = time.perf_counter()
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = dict(parse_qsl(url.query))
+
+        handler = self._routes.get((method.upper(), path))
+        try:
+            if handler is None:
+                if any(route_path == path for _, route_path in self._routes):
+                    raise ServiceError(405, f"不支持的请求方法: {method}")
+                raise ServiceError(404, f"接口不存在: {path}")
+            status, content_type, payload = 200, *await handler(query, body)
+        except ServiceError as e:
+            status, content_type, payload = e.status, *self._error_payload(e)
+        except (ValueError, TypeError) as e:
+            status, content_type, payload = 400, *self._error_payload(e)
+        except RuntimeError as e:
+            status, content_type, payload = 422, *self._error_payload(e)
+        except Exception as e:
+            status, content_type, payload = 500, *self._error_payload(e)
+
+        # 记录延迟（不统计未知接口）
+        if handler is not None:
+            stats = self._stats.setdefault(path, _LatencyStats())
+            stats.record(time.perf_counter() - start_time, status == 200)
+
+        return status, content_type, payload
+
+    def _error_payload(self, error):
+        """
+        构建错误响应体
+
+        参数:
+            error (Exception): 错误
+
+        返回:
+            tuple: (Content-Type, 响应体)
+        """
+        return "application/json", json.dumps({"error": str(error)}, ensure_ascii=False).encode("utf-8")
+
+    def _require_body(self, body):
+        """
+        检查请求体
+
+        参数:
+            body (bytes): 请求体
+        """
+        if not body:
+            raise ServiceError(400, "请求体为空，请上传图片数据")
+
+    def _int_param(self, query, name, default=None):
+        """
+        读取整数参数
+
+        参数:
+            query (dict): 查询参数
+            name (str): 参数名
+            default (int): 默认值，为None时该参数必填
+
+        返回:
+            int: 参数值
+        """
+        value = query.get(name)
+        if value is None:
+            if default is None:
+                raise ServiceError(400, f"缺少参数: {name}")
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ServiceError(400, f"参数必须是整数: {name}={value}")
+
+    def _bool_param(self, query, name, default):
+        """
+        读取布尔参数
+
+        参数:
+            query (dict): 查询参数
+            name (str): 参数名
+            default (bool): 默认值
+
+        返回:
+            bool: 参数值
+        """
+        value = query.get(name)
+        if value is None:
+            return default
+        return value.lower() in ("1", "true", "yes", "on")
+
+    def _format_param(self, query, default="PNG"):
+        """
+        读取输出格式参数
+
+        参数:
+            query (dict): 查询参数
+            default (str): 默认格式
+
+        返回:
+            str: 输出格式（大写）
+        """
+        output_format = query.get("format", default).upper()
+        if output_format not in _CONTENT_TYPES:
+            raise ServiceError(400, f"不支持的输出格式: {output_format}")
+        return output_format
+
+    async def _run_pillow(self, func, *args, **kwargs):
+        """
+        在线程池中运行Pillow处理（超过队列上限时拒绝）
+
+        参数:
+            func (callable): 处理函数
+            *args, **kwargs: 传递给处理函数的参数
+
+        返回:
+            处理函数的返回值
+        """
+        if self._pillow_pending >= self.max_queue_size:
+            self._rejected += 1
+            raise ServiceError(503, "服务繁忙，请稍后重试")
+
+        self._pillow_pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+        finally:
+            self._pillow_pending -= 1
+
+    async def _handle_crop(self, query, body):
+        """剪裁接口"""
+        self._require_body(body)
+        output_format = self._format_param(query)
+        data = await self._run_pillow(
+            self.image_processor.crop_image, body,
+            self._int_param(query, "width"), self._int_param(query, "height"),
+            self._bool_param(query, "keep_aspect_ratio", True), output_format=output_format
+        )
+        return _CONTENT_TYPES[output_format], data
+
+    async def _handle_resize(self, query, body):
+        """缩放接口"""
+        self._require_body(body)
+        output_format = self._format_param(query)
+        data = await self._run_pillow(
+            self.image_processor.resize_image, body,
+            self._int_param(query, "width"), self._int_param(query, "height"),
+            self._bool_param(query, "keep_aspect_ratio", True), output_format=output_format
+        )
+        return _CONTENT_TYPES[output_format], data
+
+    async def _handle_resize_to_filesize(self, query, body):
+        """按文件大小缩放接口"""
+        self._require_body(body)
+        data = await self._run_pillow(
+            self.image_processor.resize_to_filesize, body,
+            self._int_param(query, "target_size_kb"), self._int_param(query, "quality", 85),
+            return_bytes=True, profile=query.get("profile", DEFAULT_PROFILE)
+        )
+        content_type = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+        return content_type, data
+
+    async def _handle_remove_bg(self, query, body):
+        """去背景接口（请求进入合并队列）"""
+        self._require_body(body)
+        output_format = self._format_param(query)
+        working_size = query.get("working_size")
+        key = (
+            query.get("model", "u2net"),
+            self._int_param(query, "alpha_threshold", 0),
+            self._int_param(query, "working_size") if working_size else None,
+            output_format,
+        )
+
+        self._ensure_batcher()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._remove_queue.put_nowait((key, body, future))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise ServiceError(503, "服务繁忙，请稍后重试")
+
+        result = await future
+        if isinstance(result, Exception):
+            raise result
+        return _CONTENT_TYPES[output_format], result
+
+    async def _handle_metrics(self, query, body):
+        """统计信息接口"""
+        metrics = {
+            "queue_depth": {
+                "remove_bg": self._remove_queue.qsize() if self._remove_queue else 0,
+                "pillow": self._pillow_pending,
+            },
+            "queue_limit": self.max_queue_size,
+            "rejected": self._rejected,
+            "batch_size_mean": round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0,
+            "endpoints": {path: stats.summary() for path, stats in self._stats.items()},
+            "encoders": encode_stats.summary(),
+        }
+        return "application/json", json.dumps(metrics, ensure_ascii=False).encode("utf-8")
+
+    async def _handle_health(self, query, body):
+        """健康检查接口"""
+        return "application/json", b'{"status": "ok"}'
+
+    # ------------------------------------------------------------------
+    # 去背景请求合并
+    # ------------------------------------------------------------------
+
+    def _ensure_batcher(self):
+        """确保去背景队列和合并任务已在当前事件循环中启动"""
+        if self._remove_queue is None:
+            self._remove_queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._batcher_task is None or self._batcher_task.done():
+            self._batcher_task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    async def _batch_loop(self):
+        """不断从队列中取出请求，在时间窗口内合并后一次推理"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._remove_queue.get()]
+
+            # 在时间窗口内继续收集请求
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._remove_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # 参数相同的请求才能合并推理
+                groups = {}
+                for key, body, future in batch:
+                    groups.setdefault(key, []).append((body, future))
+
+                for key, items in groups.items():
+                    self._batch_sizes.append(len(items))
+                    await self._run_remove_group(key, items)
+            except Exception as e:
+                # 意外错误时本批尚未完成的请求都返回错误，合并任务继续运行
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(e)
+
+    async def _run_remove_group(self, key, items):
+        """
+        对一组参数相同的去背景请求执行一次合并推理
+
+        参数:
+            key (tuple): (模型, 透明度阈值, 工作分辨率, 输出格式)
+            items (list): [(请求体, future), ...]
+        """
+        model, alpha_threshold, working_size, output_format = key
+        loop = asyncio.get_running_loop()
+
+        try:
+            # 首次使用时导入模型库，导入或初始化失败时整组返回错误
+            remover = self._get_background_remover()
+            results = await loop.run_in_executor(
+                self._inference_executor,
+                lambda: remover.remove_background_many(
+                    [body for body, _ in items], model, alpha_threshold, working_size, output_format
+                )
+            )
+        except Exception as e:
+            # 模型库不可用、参数错误等导致整组失败
+            results = [e] * len(items)
+
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _get_background_remover(self):
+        """获取去背景实例（延迟创建，未使用去背景时无需加载模型库）"""
+        if self.background_remover is None:
+            from .background_remover import BackgroundRemover
+            self.background_remover = BackgroundRemover()
+        return self.background_remover
+
+    # ------------------------------------------------------------------
+    # HTTP协议
+    # ------------------------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        """
+        处理一个HTTP连接（每个连接处理一个请求）
+
+        参数:
+            reader (asyncio.StreamReader): 读取流
+            writer (asyncio.StreamWriter): 写入流
+        """
+        try:
+            try:
+                method, target, body = await self._read_request(reader)
+                status, content_type, payload = await self.handle(method, target, body)
+            except ServiceError as e:
+                status, content_type, payload = e.status, *self._error_payload(e)
+
+            headers = (
+                f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(headers.encode("latin-1") + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        读取HTTP请求
+
+        参数:
+            reader (asyncio.StreamReader): 读取流
+
+        返回:
+            tuple: (方法, 请求路径, 请求体)
+        """
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ServiceError(400, "无效的HTTP请求")
+        method, target, _ = parts
+
+        # 读取请求头
+        content_length = 0
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    raise ServiceError(400, "无效的Content-Length")
+
+        if content_length > self.max_body_bytes:
+            raise ServiceError(413, f"请求体过大，上限为 {self.max_body_bytes} 字节")
+
+        body = await reader.readexactly(content_length) if content_length else b""
+        return method, target, body
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """
+        启动服务
+
+        参数:
+            host (str): 监听地址，默认只监听本机
+            port (int): 监听端口，为0时自动分配
+
+        返回:
+            asyncio.Server: 服务器对象
+        """
+        self._ensure_batcher()
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def close(self):
+        """停止合并任务并关闭线程池"""
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+            try:
+                await self._batcher_task
+            except asyncio.CancelledError:
+                pass
+            self._batcher_task = None
+        self._executor.shutdown(wait=False)
+        self._inference_executor.shutdown(wait=False)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="刘东升的图片处理工具 - 本地HTTP处理服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认只监听本机）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--workers", type=int, default=4, help="Pillow处理线程数")
+    parser.add_argument("--batch-window", type=float, default=0.01, help="去背景请求合并时间窗口（秒）")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="一次合并推理的最大图片数")
+    parser.add_argument("--max-queue-size", type=int, default=64, help="队列上限")
+    args = parser.parse_args()
+
+    async def serve():
+        service = ProcessingService(
+            max_workers=args.workers, batch_window=args.batch_window,
+            max_batch_size=args.max_batch_size, max_queue_size=args.max_queue_size
+        )
+        server = await service.start(args.host, args.port)
+        print(f"服务已启动: http://{args.host}:{args.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
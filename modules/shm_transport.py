@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 共享内存帧传输模块
+
+多进程处理（解码、推理、编码分在不同进程）时，用共享内存环形缓冲区传递解码后的帧，
+进程之间只传递很小的帧句柄，像素数据不经过pickle序列化和复制。
+缓冲区由固定数量、固定大小的槽位组成，总内存有上限；每个槽位带引用计数，
+所有使用者释放后槽位才会被复用，没有空闲槽位时写入方等待。
+
+用法示例（环形缓冲区需要在创建子进程时传入，例如作为Process参数或进程池的initializer参数）::
+
+    ring = FrameRing(slot_count=4, slot_bytes=6000 * 4000 * 4)
+    handle = ring.put_image(image, refs=2)      # 解码进程写入，两个下游各持有一个引用
+    queue.put(handle)                           # 只传递句柄
+    ...
+    image = ring.image(handle)                  # 下游进程直接读取共享内存，不复制
+    ring.release(handle)                        # 用完后释放引用
+
+进程池中使用时，把环形缓冲区作为initializer参数传入（ProcessPoolExecutor(initializer=init_worker,
+initargs=(ring,))），子进程中用worker_ring()取得。ImageProcessor.batch_process(processes=N)
+即以这种方式在子进程中解码和处理，处理结果经共享内存交给主进程编码和保存。
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+
+# 槽位头部（引用计数数组）对齐到缓存行
+_HEADER_ALIGN = 64
+
+# 各图片模式对应的NumPy数据类型和通道数
+_MODE_LAYOUTS = {
+    "L": (np.uint8, 1),
+    "RGB": (np.uint8, 3),
+    "RGBA": (np.uint8, 4),
+    "F": (np.float32, 1),
+}
+
+
+class FrameHandle:
+    """帧句柄类（记录帧所在的槽位和形状，可以在进程之间传递）"""
+
+    __slots__ = ("slot", "shape", "dtype", "mode", "info")
+
+    def __init__(self, slot, shape, dtype, mode=None, info=None):
+        """
+        初始化帧句柄
+
+        参数:
+            slot (int): 槽位编号
+            shape (tuple): 数组形状
+            dtype (str): 数组数据类型
+            mode (str): 图片模式，帧不是由图片写入时为None
+            info (dict): 图片的附加信息（如ICC色彩配置、EXIF），随句柄传递
+        """
+        self.slot = slot
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.mode = mode
+        self.info = info or {}
+
+    def __getstate__(self):
+        return self.slot, self.shape, self.dtype, self.mode, self.info
+
+    def __setstate__(self, state):
+        self.slot, self.shape, self.dtype, self.mode, self.info = state
+
+    def __repr__(self):
+        return f"FrameHandle(slot={self.slot}, shape={self.shape}, dtype={self.dtype}, mode={self.mode})"
+
+    @property
+    def nbytes(self):
+        """帧数据的字节数"""
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+
+def _attach(name):
+    """
+    连接已存在的共享内存（共享内存的删除由创建者负责）
+
+    参数:
+        name (str): 共享内存名称
+
+    返回:
+        SharedMemory: 共享内存对象
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13之前没有track参数；子进程与创建者共用资源跟踪器，重复登记不会误删
+        return shared_memory.SharedMemory(name=name)
+
+
+# 子进程中使用的环形缓冲区（由init_worker设置）
+_worker_ring = None
+
+
+def init_worker(ring):
+    """
+    进程池的initializer：记录子进程中使用的环形缓冲区
+
+    参数:
+        ring (FrameRing): 环形缓冲区
+    """
+    global _worker_ring
+    _worker_ring = ring
+
+
+def worker_ring():
+    """
+    获取子进程中使用的环形缓冲区
+
+    返回:
+        FrameRing: 环形缓冲区，未设置时为None
+    """
+    return _worker_ring
+
+
+class FrameRing:
+    """共享内存帧环形缓冲区类"""
+
+    def __init__(self, slot_count=4, slot_bytes=96 * 1024 * 1024, context=None):
+        """
+        创建环形缓冲区
+
+        参数:
+            slot_count (int): 槽位数量，总内存约为 slot_count * slot_bytes
+            slot_bytes (int): 每个槽位的字节数，需要能容纳最大的一帧
+                （如2400万像素的RGBA帧约96MB）
+            context: multiprocessing上下文，为None时使用默认上下文
+        """
+        if slot_count <= 0:
+            raise ValueError(f"槽位数量必须大于0，当前值: {slot_count}")
+        if slot_bytes <= 0:
+            raise ValueError(f"槽位大小必须大于0，当前值: {slot_bytes}")
+
+        context = context or multiprocessing.get_context()
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        self._header_bytes = -(-slot_count * 4 // _HEADER_ALIGN) * _HEADER_ALIGN
+        self._condition = context.Condition()
+        self._owner = True
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=self._header_bytes + slot_count * slot_bytes
+        )
+        self._init_views()
+        self._refcounts[:] = 0
+
+    def __getstate__(self):
+        # 传给子进程时只传递共享内存名称和同步对象
+        return {
+            "name": self._memory.name,
+            "slot_count": self.slot_count,
+            "slot_bytes": self.slot_bytes,
+            "header_bytes": self._header_bytes,
+            "condition": self._condition,
+        }
+
+    def __setstate__(self, state):
+        self.slot_count = state["slot_count"]
+        self.slot_bytes = state["slot_bytes"]
+        self._header_bytes = state["header_bytes"]
+        self._condition = state["condition"]
+        self._owner = False
+        self._memory = _attach(state["name"])
+        self._init_views()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _init_views(self):
+        """建立引用计数数组的视图"""
+        self._refcounts = np.ndarray((self.slot_count,), dtype=np.int32, buffer=self._memory.buf)
+
+    @property
+    def name(self):
+        """共享内存名称"""
+        return self._memory.name
+
+    @property
+    def total_bytes(self):
+        """缓冲区占用的总字节数"""
+        return self._memory.size
+
+    def free_slots(self):
+        """
+        获取当前空闲的槽位数量
+
+        返回:
+            int: 空闲槽位数量
+        """
+        with self._condition:
+            return int(np.count_nonzero(self._refcounts == 0))
+
+    def _acquire_slot(self, refs, timeout):
+        """
+        获取一个空闲槽位并设置引用计数，没有空闲槽位时等待
+
+        参数:
+            refs (int): 初始引用计数
+            timeout (float): 最长等待时间（秒），为None时一直等待
+
+        返回:
+            int: 槽位编号
+        """
+        if refs <= 0:
+            raise ValueError(f"引用计数必须大于0，当前值: {refs}")
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: (self._refcounts == 0).any(), timeout):
+                raise TimeoutError(f"等待空闲槽位超时（{timeout}秒）")
+            slot = int(np.flatnonzero(self._refcounts == 0)[0])
+            self._refcounts[slot] = refs
+            return slot
+
+    def allocate(self, shape, dtype=np.uint8, refs=1, mode=None, timeout=None):
+        """
+        分配一帧，返回句柄和可写的数组视图（解码结果可以直接写入共享内存）
+
+        参数:
+            shape (tuple): 数组形状
+            dtype: 数组数据类型
+            refs (int): 初始引用计数（下游使用者的数量）
+            mode (str): 图片模式，用于读取时重建图片
+            timeout (float): 等待空闲槽位的最长时间（秒）
+
+        返回:
+            tuple: (帧句柄, 共享内存中的数组视图)
+        """
+        handle = FrameHandle(-1, shape, np.dtype(dtype).str, mode)
+        if handle.nbytes > self.slot_bytes:
+            raise ValueError(f"帧大小 {handle.nbytes} 字节超过槽位大小 {self.slot_bytes} 字节")
+
+        handle.slot = self._acquire_slot(refs, timeout)
+        return handle, self.view(handle)
+
+    def put(self, array, refs=1, mode=None, timeout=None):
+        """
+        将数组写入一个槽位
+
+        参数:
+            array (numpy.ndarray): 帧数据
+            refs (int): 初始引用计数
+            mode (str): 图片模式
+            timeout (float): 等待空闲槽位的最长时间（秒）
+
+        返回:
+            FrameHandle: 帧句柄
+        """
+        array = np.asarray(array)
+        handle, view = self.allocate(array.shape, array.dtype, refs, mode, timeout)
+        view[...] = array
+        return handle
+
+    def fits_image(self, image):
+        """
+        判断图片能否不经模式转换放入一个槽位
+
+        参数:
+            image (PIL.Image): 图片对象
+
+        返回:
+            bool: 图片模式受支持且大小不超过槽位大小时为True
+        """
+        layout = _MODE_LAYOUTS.get(image.mode)
+        if layout is None:
+            return False
+        dtype, channels = layout
+        return image.width * image.height * channels * np.dtype(dtype).itemsize <= self.slot_bytes
+
+    def put_image(self, image, refs=1, timeout=None):
+        """
+        将图片写入一个槽位
+
+        参数:
+            image (PIL.Image): 图片对象（L、RGB、RGBA或F模式，其他模式转换为RGBA）
+            refs (int): 初始引用计数
+            timeout (float): 等待空闲槽位的最长时间（秒）
+
+        返回:
+            FrameHandle: 帧句柄
+        """
+        if image.mode not in _MODE_LAYOUTS:
+            image = image.convert("RGBA")
+
+        dtype, channels = _MODE_LAYOUTS[image.mode]
+        shape = (image.height, image.width) if channels == 1 else (image.height, image.width, channels)
+        handle, view = self.allocate(shape, dtype, refs, image.mode, timeout)
+        view[...] = np.asarray(image)
+        handle.info = dict(image.info)
+        return handle
+
+    def view(self, handle):
+        """
+        获取帧在共享内存中的数组视图（不复制）
+
+        参数:
+            handle (FrameHandle): 帧句柄
+
+        返回:
+            numpy.ndarray: 数组视图，释放引用后不能再使用
+        """
+        self._check_handle(handle)
+        offset = self._header_bytes + handle.slot * self.slot_bytes
+        return np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=self._memory.buf, offset=offset)
+
+    def image(self, handle):
+        """
+        获取帧对应的图片（与共享内存共用像素数据，不复制）
+
+        参数:
+            handle (FrameHandle): 由put_image写入的帧句柄
+
+        返回:
+            PIL.Image: 图片对象，释放引用后不能再使用（需要保留时先调用copy）
+        """
+        if handle.mode is None:
+            raise ValueError("帧不是由图片写入的，无法重建图片")
+
+        view = self.view(handle)
+        size = (handle.shape[1], handle.shape[0])
+        image = Image.frombuffer(handle.mode, size, view, "raw", handle.mode, 0, 1)
+        image.info.update(handle.info)
+        return image
+
+    def retain(self, handle, count=1):
+        """
+        增加帧的引用计数（把帧交给更多的使用者时调用）
+
+        参数:
+            handle (FrameHandle): 帧句柄
+            count (int): 增加的数量
+        """
+        self._check_handle(handle)
+        with self._condition:
+            if self._refcounts[handle.slot] <= 0:
+                raise ValueError(f"帧已经释放: {handle}")
+            self._refcounts[handle.slot] += count
+
+    def release(self, handle):
+        """
+        释放一个引用，引用计数归零时槽位可以被复用
+
+        参数:
+            handle (FrameHandle): 帧句柄
+
+        返回:
+            int: 剩余的引用计数
+        """
+        self._check_handle(handle)
+        with self._condition:
+            if self._refcounts[handle.slot] <= 0:
+                raise ValueError(f"帧已经释放: {handle}")
+            self._refcounts[handle.slot] -= 1
+            remaining = int(self._refcounts[handle.slot])
+            if remaining == 0:
+                self._condition.notify_all()
+            return remaining
+
+    def _check_handle(self, handle):
+        """
+        检查句柄是否属于本缓冲区的有效槽位
+
+        参数:
+            handle (FrameHandle): 帧句柄
+        """
+        if not 0 <= handle.slot < self.slot_count:
+            raise ValueError(f"无效的帧句柄: {handle}")
+
+    def close(self):
+        """关闭缓冲区（创建者关闭时同时删除共享内存）"""
+        if self._memory is None:
+            return
+
+        # 先释放本进程内的视图，共享内存才能关闭
+        self._refcounts = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+        self._memory = None
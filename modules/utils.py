@@ -11,6 +11,9 @@ import os
 import sys
 from PIL import Image
 
+from .encoder import DEFAULT_PROFILE
+from .image_io import load_image, save_image
+
 
 def get_supported_formats():
     """
@@ -97,7 +100,7 @@ def ensure_dir(directory):
         return False
 
 
-def convert_image_format(image_path, output_path, format="PNG"):
+def convert_image_format(image_path, output_path, format="PNG", profile=DEFAULT_PROFILE, **params):
     """
     转换图片格式
     
@@ -105,6 +108,8 @@ def convert_image_format(image_path, output_path, format="PNG"):
         image_path (str): 输入图片路径
         output_path (str): 输出图片路径
         format (str): 目标格式，如'PNG'、'JPEG'等
+        profile (str): 编码配置（fast、balanced、smallest）
+        **params: 传递给编码器的其他参数，如quality
         
     返回:
         bool: 如果转换成功则返回True，否则返回False
@@ -113,14 +118,11 @@ def convert_image_format(image_path, output_path, format="PNG"):
         return False
     
     try:
-        img = Image.open(image_path)
-        
-        # 如果目标格式是JPEG且图片有透明通道，需要转换为RGB模式
-        if format.upper() == "JPEG" and img.mode == "RGBA":
-            img = img.convert("RGB")
+        # 加载时按EXIF方向摆正
+        img = load_image(image_path)
         
-        # 保存为目标格式
-        img.save(output_path, format=format)
+        # 保存为目标格式（JPEG自动去除透明通道，保留ICC色彩配置和选定的EXIF标签）
+        save_image(img, output_path, format=format, profile=profile, **params)
         return True
     except Exception:
         return False
\ No newline at end of file
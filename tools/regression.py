@@ -0,0 +1,679 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+刘东升的图片处理工具 - 回归检查（开发用脚本，不属于modules包）
+
+在合成的测试图片集上，用各种执行方式（文件路径、字节数据、已解码图片、流水线、
+多线程批量处理、预读与后台写出、多进程处理、调度器打包、合并推理、多线程共用实例、预缩小等）
+运行剪裁、缩放、按文件大小缩放和去背景，与参考结果逐像素比较（PSNR和最大差值），
+检查按文件大小缩放的结果不超过目标大小，并检查各操作的单张耗时和内存峰值不超过预算。
+内存峰值在独立的子进程中测量（常驻内存峰值的增量），不受本进程已分配内存的影响。
+去背景使用按亮度分割的替身模型，不需要下载模型，可以离线运行。
+
+用法（在项目根目录运行）:
+    python -m tools.regression                          # 使用默认预算
+    python -m tools.regression --save-baseline b.json   # 记录当前耗时和内存（加上余量）作为基线
+    python -m tools.regression --baseline b.json        # 按基线检查，变慢或内存增加时失败
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from modules.animation import AnimatedImage
+from modules.image_io import load_image
+from modules.image_processor import ImageProcessor
+from modules.model_registry import ModelRegistry, OnnxModelSession
+from modules.pipeline import Pipeline
+from modules.scheduler import CostScheduler
+
+
+# 默认预算：每张图片的耗时中位数（毫秒）和处理整个测试图片集的内存峰值增量（MB）
+DEFAULT_BUDGETS = {
+    "crop_image": {"latency_ms": 150, "memory_mb": 64},
+    "resize_image": {"latency_ms": 150, "memory_mb": 64},
+    "resize_to_filesize": {"latency_ms": 800, "memory_mb": 96},
+    "remove_background": {"latency_ms": 500, "memory_mb": 192},
+}
+
+# 记录基线时在测量值上增加的余量
+BASELINE_HEADROOM = 0.5
+
+# 测试参数
+_CROP_SIZE = (300, 200)
+_RESIZE_SIZE = (400, 300)
+_TARGET_SIZE_KB = 40
+
+# 预缩小检查：缩小倍数不低于2倍预缩小系数时，JPEG草稿解码和整数倍缩小才会生效
+_THUMBNAIL_SIZE = (160, 120)
+_REDUCING_GAP = 2.0
+
+# 合成图片: (文件名, 宽, 高, EXIF方向)
+_CORPUS = [
+    ("landscape.jpg", 640, 480, 1),
+    ("rotated.jpg", 1203, 797, 6),
+    ("large.jpg", 1600, 1200, 1),
+    ("alpha.png", 800, 600, 1),
+    ("odd.png", 321, 199, 1),
+    ("palette.gif", 256, 256, 1),
+]
+
+
+class CheckResult:
+    """检查结果类"""
+
+    def __init__(self, operation, engine, passed, detail=""):
+        """
+        初始化检查结果
+
+        参数:
+            operation (str): 操作名称
+            engine (str): 执行方式或检查项
+            passed (bool): 是否通过
+            detail (str): 说明
+        """
+        self.operation = operation
+        self.engine = engine
+        self.passed = passed
+        self.detail = detail
+
+    def __repr__(self):
+        return f"CheckResult({self.operation!r}, {self.engine!r}, passed={self.passed})"
+
+
+class _StubInference:
+    """替身模型的推理会话：按亮度输出前景概率"""
+
+    class _Input:
+        name = "input.1"
+        shape = ["batch", 3, "height", "width"]
+
+    def get_inputs(self):
+        return [self._Input()]
+
+    def run(self, output_names, feeds):
+        batch = next(iter(feeds.values()))
+        brightness = batch.mean(axis=1, keepdims=True)
+        return [1.0 / (1.0 + np.exp(-4.0 * brightness))]
+
+
+class StubSegmentationSession(OnnxModelSession):
+    """替身分割模型会话（接口与本地ONNX模型会话相同，不需要模型文件和ONNX Runtime）"""
+
+    def __init__(self, variant):
+        """
+        初始化会话
+
+        参数:
+            variant (ModelVariant): 模型信息
+        """
+        self.model_name = variant.name
+        self.variant = variant
+        self.inner_session = _StubInference()
+
+
+class StubRegistry(ModelRegistry):
+    """所有模型都使用替身会话的注册表"""
+
+    def create_session(self, name):
+        return StubSegmentationSession(self.get(name))
+
+
+def build_corpus(directory, seed=0, scale=1.0):
+    """
+    生成合成测试图片：渐变背景、明亮的前景形状和噪声
+
+    参数:
+        directory (str): 输出目录
+        seed (int): 随机种子
+        scale (float): 尺寸缩放比例
+
+    返回:
+        list: 图片路径列表
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for filename, width, height, orientation in _CORPUS:
+        width, height = max(16, round(width * scale)), max(16, round(height * scale))
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+
+        # 暗色渐变背景
+        pixels = np.stack([
+            20 + 60 * x / width, 30 + 40 * y / height, 50 + 30 * (x + y) / (width + height)
+        ], axis=2)
+
+        # 明亮的椭圆前景和矩形前景
+        ellipse = ((x - width * 0.4) / (width * 0.25)) ** 2 + ((y - height * 0.5) / (height * 0.3)) ** 2 <= 1
+        pixels[ellipse] = (230, 200, 120)
+        pixels[int(height * 0.15):int(height * 0.35), int(width * 0.65):int(width * 0.9)] = (210, 230, 240)
+
+        pixels += rng.normal(0, 6, pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+        path = os.path.join(directory, filename)
+        if filename.endswith(".jpg"):
+            exif = Image.Exif()
+            if orientation != 1:
+                exif[0x0112] = orientation
+            image.save(path, quality=92, exif=exif.tobytes())
+        elif filename.endswith(".gif"):
+            image.quantize(64).save(path)
+        elif filename == "alpha.png":
+            alpha = Image.fromarray((255 * (0.5 + 0.5 * x / width)).astype(np.uint8))
+            image.putalpha(alpha)
+            image.save(path)
+        else:
+            image.save(path)
+        paths.append(path)
+    return paths
+
+
+def _read_bytes(path):
+    """读取文件内容"""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _map_threads(func, items, max_workers):
+    """多线程处理，结果顺序与输入一致"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items))
+
+
+def _as_array(result, channel=None):
+    """将处理结果（图片、编码数据）转换为RGBA数组，指定channel时只取该通道"""
+    if isinstance(result, (bytes, bytearray)):
+        result = Image.open(io.BytesIO(result))
+    if isinstance(result, AnimatedImage):
+        result = result.frames[0]
+    result = result.convert("RGBA")
+    if channel is not None:
+        result = result.getchannel(channel)
+    return np.asarray(result, dtype=np.int16)
+
+
+def psnr(reference, candidate):
+    """
+    计算峰值信噪比
+
+    参数:
+        reference (numpy.ndarray): 参考结果
+        candidate (numpy.ndarray): 待比较结果
+
+    返回:
+        float: PSNR（dB），完全相同时为inf
+    """
+    mse = np.mean((reference.astype(np.float64) - candidate.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def compare_results(references, candidates, min_psnr=None, max_diff=0, channel=None):
+    """
+    逐张比较处理结果
+
+    参数:
+        references (list): 参考结果列表
+        candidates (list): 待比较结果列表
+        min_psnr (float): PSNR下限，为None时要求最大差值不超过max_diff
+        max_diff (int): 允许的最大像素差值（min_psnr为None时使用）
+        channel (str): 只比较该通道（如"A"），为None时比较RGBA
+
+    返回:
+        tuple: (是否通过, 说明)
+    """
+    worst_psnr = float("inf")
+    worst_diff = 0
+    if len(references) != len(candidates):
+        return False, f"结果数量不一致: {len(references)} != {len(candidates)}"
+    for reference, candidate in zip(references, candidates):
+        a, b = _as_array(reference, channel), _as_array(candidate, channel)
+        if a.shape != b.shape:
+            return False, f"尺寸不一致: {a.shape[1]}x{a.shape[0]} != {b.shape[1]}x{b.shape[0]}"
+        worst_psnr = min(worst_psnr, psnr(a, b))
+        worst_diff = max(worst_diff, int(np.abs(a - b).max()))
+
+    detail = f"最低PSNR={worst_psnr:.1f}dB，最大差值={worst_diff}"
+    if min_psnr is not None:
+        return worst_psnr >= min_psnr, detail
+    return worst_diff <= max_diff, detail
+
+
+def _stub_remover(max_concurrency=2):
+    """创建使用替身模型的去背景实例"""
+    from modules.background_remover import BackgroundRemover
+    remover = BackgroundRemover(max_concurrency=max_concurrency)
+    remover.registry = StubRegistry()
+    return remover
+
+
+def reference_operation(operation, processor=None, remover=None):
+    """
+    获取操作的参考实现
+
+    参数:
+        operation (str): 操作名称（crop_image、resize_image、resize_to_filesize、remove_background）
+        processor (ImageProcessor): 图片处理实例，为None时新建
+        remover (BackgroundRemover): 去背景实例，为None时新建使用替身模型的实例
+
+    返回:
+        callable: 处理单张图片的函数，参数为图片路径
+    """
+    processor = processor or ImageProcessor()
+    if operation == "crop_image":
+        return lambda path: processor.crop_image(path, *_CROP_SIZE)
+    if operation == "resize_image":
+        return lambda path: processor.resize_image(path, *_RESIZE_SIZE)
+    if operation == "resize_to_filesize":
+        return lambda path: processor.resize_to_filesize(path, _TARGET_SIZE_KB, return_bytes=True)
+    if operation == "remove_background":
+        remover = remover or _stub_remover()
+        return lambda path: remover.remove_background(path)
+    raise ValueError(f"未知的操作: {operation}")
+
+
+def _rss_bytes():
+    """当前进程的常驻内存（字节），无法获取时为None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _reset_peak_rss():
+    """重置本进程的常驻内存峰值（Linux的VmHWM），成功时返回True"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes():
+    """本进程的常驻内存峰值（字节）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss单位：Linux为KB，macOS为字节
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+
+def _peak_memory_worker(operation, paths):
+    """子进程中逐张运行参考实现，返回常驻内存峰值相对处理前常驻内存的增量（字节）"""
+    func = reference_operation(operation)
+    # 导入模块时的临时分配已推高峰值，先重置峰值；不支持重置时以当时的峰值为起点（结果偏小）
+    if _reset_peak_rss():
+        before = _rss_bytes()
+    else:
+        before = _peak_rss_bytes()
+    for path in paths:
+        func(path)
+    return max(0, _peak_rss_bytes() - before)
+
+
+def measure_peak_memory(operation, paths):
+    """
+    在新的子进程中测量操作的内存峰值
+
+    本进程中先前分配又释放的内存会被分配器复用，在本进程中采样常驻内存无法反映单个操作的峰值，
+    因此在spawn方式启动的子进程中运行（模块导入和实例创建不计入峰值）
+
+    参数:
+        operation (str): 操作名称
+        paths (list): 图片路径列表
+
+    返回:
+        int: 常驻内存峰值的增量（字节），平台不支持时为None
+    """
+    try:
+        import resource  # noqa: F401  (Windows没有resource模块)
+    except ImportError:
+        return None
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_peak_memory_worker, operation, paths).result()
+
+
+class RegressionSuite:
+    """回归检查类"""
+
+    def __init__(self, work_dir, seed=0, scale=1.0, budgets=None, max_workers=4):
+        """
+        初始化回归检查
+
+        参数:
+            work_dir (str): 工作目录（生成测试图片和批量处理的输出）
+            seed (int): 生成测试图片的随机种子
+            scale (float): 测试图片尺寸的缩放比例
+            budgets (dict): 各操作的预算 {操作: {latency_ms, memory_mb}}，为None时使用默认预算
+            max_workers (int): 并行执行方式使用的线程数
+        """
+        self.work_dir = work_dir
+        self.seed = seed
+        self.scale = scale
+        self.budgets = budgets or DEFAULT_BUDGETS
+        self.max_workers = max_workers
+
+        self.corpus_dir = os.path.join(work_dir, "corpus")
+        self.paths = []
+        self.measurements = {}      # 操作 -> {latency_ms, memory_mb}
+        self.results = []
+
+        self.processor = ImageProcessor()
+        self._remover = None
+
+    @property
+    def remover(self):
+        """使用替身模型的去背景实例（延迟创建）"""
+        if self._remover is None:
+            self._remover = _stub_remover(self.max_workers)
+        return self._remover
+
+    def run(self):
+        """
+        运行所有检查
+
+        返回:
+            list: CheckResult列表
+        """
+        self.paths = build_corpus(self.corpus_dir, self.seed, self.scale)
+        self.results = []
+        self.measurements = {}
+
+        self._check_geometry("crop_image", self.processor.crop_image, Pipeline.crop, _CROP_SIZE)
+        self._check_geometry("resize_image", self.processor.resize_image, Pipeline.resize, _RESIZE_SIZE)
+        self._check_filesize()
+        self._check_remove_background()
+        self._check_budgets()
+        return self.results
+
+    def _record(self, operation, engine, passed, detail=""):
+        self.results.append(CheckResult(operation, engine, passed, detail))
+
+    def _compare(self, operation, engine, references, produce, min_psnr=None, channel=None):
+        """运行一种执行方式并与参考结果比较，异常记为失败"""
+        try:
+            passed, detail = compare_results(references, produce(), min_psnr, channel=channel)
+        except Exception as e:
+            passed, detail = False, f"{type(e).__name__}: {str(e)}"
+        self._record(operation, engine, passed, detail)
+
+    def _measure(self, operation):
+        """
+        逐张运行参考实现，记录耗时中位数和内存峰值
+
+        参数:
+            operation (str): 操作名称
+
+        返回:
+            list: 参考结果列表
+        """
+        remover = self.remover if operation == "remove_background" else None
+        func = reference_operation(operation, self.processor, remover)
+        # 预热（加载编解码器和模型）
+        func(self.paths[0])
+
+        results, latencies = [], []
+        for path in self.paths:
+            start = time.perf_counter()
+            results.append(func(path))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        measured = {"latency_ms": round(statistics.median(latencies), 2)}
+        peak = measure_peak_memory(operation, self.paths)
+        if peak is not None:
+            measured["memory_mb"] = round(peak / (1024 * 1024), 2)
+        self.measurements[operation] = measured
+        return results
+
+    def _read_outputs(self, output_dir):
+        """按输入顺序读取批量处理的输出文件"""
+        outputs = {os.path.splitext(name)[0]: name for name in os.listdir(output_dir)}
+        results = []
+        for path in self.paths:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            with open(os.path.join(output_dir, outputs[stem]), "rb") as f:
+                results.append(f.read())
+        return results
+
+    def _output_dir(self, name):
+        """创建空的批量处理输出目录"""
+        return tempfile.mkdtemp(prefix=name + "-", dir=self.work_dir)
+
+    def _batch(self, process_func, **kwargs):
+        """运行ImageProcessor.batch_process并读取输出"""
+        output_dir = self._output_dir("batch")
+        count = self.processor.batch_process(self.corpus_dir, output_dir, process_func, **kwargs)
+        if count != len(self.paths):
+            raise RuntimeError(f"批量处理成功{count}张，应为{len(self.paths)}张")
+        return self._read_outputs(output_dir)
+
+    def _check_geometry(self, operation, method, pipeline_method, size):
+        """剪裁或缩放：各种执行方式的结果应与文件路径输入完全一致（已解码输入和预缩小除外）"""
+        width, height = size
+        references = self._measure(operation)
+
+        engines = {
+            "bytes": lambda: [method(_read_bytes(path), width, height) for path in self.paths],
+            "memoryview": lambda: [method(memoryview(_read_bytes(path)), width, height) for path in self.paths],
+            "pipeline": lambda: [
+                pipeline_method(Pipeline(image_processor=self.processor), width, height).run(path)
+                for path in self.paths
+            ],
+            "threads": lambda: _map_threads(lambda path: method(path, width, height), self.paths, self.max_workers),
+            "batch": lambda: self._batch(method, max_workers=self.max_workers, width=width, height=height),
+            "batch_overlap": lambda: self._batch(
+                method, max_workers=self.max_workers, prefetch=4, write_workers=2, width=width, height=height
+            ),
+            "batch_scheduled": lambda: self._batch(
+                method, max_workers=self.max_workers, scheduler=CostScheduler(memory_limit=64 * 1024 * 1024),
+                width=width, height=height
+            ),
+            "batch_processes": lambda: self._batch(method, processes=2, width=width, height=height),
+        }
+        for engine, produce in engines.items():
+            self._compare(operation, engine, references, produce)
+
+        # 已解码的图片已按EXIF方向旋转，旋转与重采样的先后不同，允许取整误差
+        self._compare(operation, "decoded", references, lambda: [
+            method(load_image(path), width, height) for path in self.paths
+        ], min_psnr=45)
+
+        self._check_reducing_gap(operation, method)
+
+    def _check_reducing_gap(self, operation, method):
+        """
+        预缩小（JPEG草稿解码、整数倍缩小）：缩小到缩略图尺寸，与不预缩小的结果比较，允许细微差别
+
+        目标尺寸较大时预缩小不会生效，比较的是同一条执行路径，因此使用缩略图尺寸，
+        并要求至少一张图片的缩小倍数达到生效条件
+        """
+        width, height = _THUMBNAIL_SIZE
+        ratios = []
+        for path in self.paths:
+            with Image.open(path) as image:
+                ratios.append(min(image.width / width, image.height / height))
+        applied = sum(ratio >= 2 * _REDUCING_GAP for ratio in ratios)
+        if not applied:
+            self._record(operation, "reducing_gap", False,
+                         f"没有图片的缩小倍数达到{2 * _REDUCING_GAP:g}倍，预缩小未生效")
+            return
+
+        references = [method(path, width, height) for path in self.paths]
+        try:
+            passed, detail = compare_results(references, [
+                method(path, width, height, reducing_gap=_REDUCING_GAP) for path in self.paths
+            ], min_psnr=35)
+        except Exception as e:
+            passed, detail = False, f"{type(e).__name__}: {str(e)}"
+        self._record(operation, "reducing_gap", passed, f"{detail}（{applied}张预缩小生效）")
+
+    def _check_filesize(self):
+        """按文件大小缩放：各种执行方式结果一致，且都不超过目标大小"""
+        operation = "resize_to_filesize"
+        target_bytes = _TARGET_SIZE_KB * 1024
+        resize = self.processor.resize_to_filesize
+
+        references = self._measure(operation)
+
+        engines = {
+            "bytes": lambda: [resize(_read_bytes(path), _TARGET_SIZE_KB, return_bytes=True)
+                              for path in self.paths],
+            "pipeline": lambda: [Pipeline(image_processor=self.processor).resize_to_filesize(_TARGET_SIZE_KB).run(path)
+                                 for path in self.paths],
+            "threads": lambda: _map_threads(
+                lambda path: resize(path, _TARGET_SIZE_KB, return_bytes=True), self.paths, self.max_workers
+            ),
+        }
+        outputs = {"reference": references}
+        for engine, produce in engines.items():
+            try:
+                outputs[engine] = produce()
+            except Exception as e:
+                self._record(operation, engine, False, f"{type(e).__name__}: {str(e)}")
+                continue
+            self._compare(operation, engine, references, lambda: outputs[engine])
+
+        # 各编码配置的结果也必须满足目标大小
+        for profile in ("fast", "smallest"):
+            try:
+                outputs[profile] = [resize(path, _TARGET_SIZE_KB, return_bytes=True, profile=profile)
+                                    for path in self.paths]
+            except Exception as e:
+                self._record(operation, profile, False, f"{type(e).__name__}: {str(e)}")
+
+        for engine, results in outputs.items():
+            largest = max(len(data) for data in results)
+            self._record(operation, f"size_target[{engine}]", largest <= target_bytes,
+                         f"最大{largest / 1024:.1f}KB，目标{_TARGET_SIZE_KB}KB")
+
+    def _check_remove_background(self):
+        """去背景：单张、合并推理、批量和多线程的结果应一致（低分辨率推理除外）"""
+        operation = "remove_background"
+        remover = self.remover
+        references = self._measure(operation)
+
+        def batch(**kwargs):
+            output_dir = self._output_dir("remove")
+            count = remover.remove_background_batch(self.corpus_dir, output_dir, **kwargs)
+            if count != len(self.paths):
+                raise RuntimeError(f"批量处理成功{count}张，应为{len(self.paths)}张")
+            return self._read_outputs(output_dir)
+
+        engines = {
+            "bytes": lambda: [remover.remove_background(_read_bytes(path)) for path in self.paths],
+            "many": lambda: remover.remove_background_many(self.paths),
+            "threads": lambda: _map_threads(remover.remove_background, self.paths, self.max_workers),
+            "batch": lambda: batch(max_workers=self.max_workers),
+            "batch_packed": lambda: batch(
+                max_workers=self.max_workers, scheduler=CostScheduler(pixel_budget=4 * 1024 * 1024)
+            ),
+        }
+        for engine, produce in engines.items():
+            self._compare(operation, engine, references, produce)
+
+        # 低分辨率推理后上采样蒙版，边缘允许差别
+        self._compare(operation, "working_size", references, lambda: [
+            remover.remove_background(path, working_size=256) for path in self.paths
+        ], min_psnr=25, channel="A")
+
+    def _check_budgets(self):
+        """检查各操作的耗时和内存峰值是否超过预算"""
+        for operation, measured in self.measurements.items():
+            budget = self.budgets.get(operation)
+            if budget is None:
+                continue
+            for key, unit in (("latency_ms", "ms"), ("memory_mb", "MB")):
+                if key not in budget or key not in measured:
+                    continue
+                self._record(operation, f"budget[{key}]", measured[key] <= budget[key],
+                             f"实测{measured[key]}{unit}，预算{budget[key]}{unit}")
+
+    def baseline(self, headroom=BASELINE_HEADROOM):
+        """
+        根据本次测量生成基线预算
+
+        参数:
+            headroom (float): 在测量值上增加的余量比例
+
+        返回:
+            dict: 预算 {操作: {latency_ms, memory_mb}}
+        """
+        return {
+            operation: {key: round(value * (1 + headroom), 2) for key, value in measured.items()}
+            for operation, measured in self.measurements.items()
+        }
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="刘东升的图片处理工具 - 回归检查（结果一致性与性能预算）")
+    parser.add_argument("--baseline", help="预算基线文件（JSON），不指定时使用默认预算")
+    parser.add_argument("--save-baseline", help="将本次测量值加上余量保存为基线文件")
+    parser.add_argument("--seed", type=int, default=0, help="生成测试图片的随机种子")
+    parser.add_argument("--scale", type=float, default=1.0, help="测试图片尺寸的缩放比例")
+    parser.add_argument("--workers", type=int, default=4, help="并行执行方式使用的线程数")
+    parser.add_argument("--work-dir", help="工作目录，不指定时使用临时目录并在结束后删除")
+    args = parser.parse_args(argv)
+
+    budgets = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            budgets = json.load(f)
+
+    temp_dir = None
+    work_dir = args.work_dir
+    if work_dir is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        work_dir = temp_dir.name
+
+    try:
+        suite = RegressionSuite(work_dir, args.seed, args.scale, budgets, args.workers)
+        results = suite.run()
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    for result in results:
+        status = "通过" if result.passed else "失败"
+        print(f"[{status}] {result.operation:<20} {result.engine:<28} {result.detail}")
+
+    failed = [result for result in results if not result.passed]
+    print(f"共{len(results)}项检查，失败{len(failed)}项")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(suite.baseline(), f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.save_baseline}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())